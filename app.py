@@ -9,17 +9,32 @@ from front.user import usuario_bp
 from front.producer import producer_bp
 from resources.index import Index
 from models.models import DataBase
-from flasgger import Swagger
+from services.analytics import analytics_cli
+from services.docs import PrebuiltSwagger, docs_cli
+from services.engine import engine_options, init_engine
+from services.follow_graph import init_follow_graph
+from services.impressions import impressions_cli
+from services.metrics import init_metrics
+from services.query_stats import init_query_stats
+from services.replicas import REPLICA_BIND, init_replicas
+from services.ratings import ratings_cli
+from services.recommendations import recommendations_cli
+from services.search import init_search
+from services.sessions import sessions_cli
 
 try:
     from config import DB_URI, TOKEN_KEY
 except ModuleNotFoundError:
     DB_URI = os.getenv('DB_URI', "sqlite:///database.db")
     TOKEN_KEY = os.getenv('TOKEN_KEY', "please-set-up-a-proper-key")
+try:
+    from config import DB_REPLICA_URI
+except ImportError:
+    DB_REPLICA_URI = os.getenv('DB_REPLICA_URI')
 
 db = DataBase().db
 
-def create_app(local=False, local_path=''):
+def create_app(local=False, local_path='', replica_path=''):
     """
     Crea y configura una instancia de la aplicación Flask.
 
@@ -31,6 +46,9 @@ def create_app(local=False, local_path=''):
     testing : bool, opcional
         Indica si la aplicación debe ser configurada para pruebas (por defecto es False).
         Si se establece en `True`, se utiliza una base de datos SQLite temporal para las pruebas.
+    replica_path : str, opcional
+        Con `local`, archivo SQLite que se usa como réplica de lectura. Sin `local` la réplica
+        se toma de `DB_REPLICA_URI`, si está definida.
 
     Retorna
     -------
@@ -39,7 +57,7 @@ def create_app(local=False, local_path=''):
     """
     app = Flask(__name__)
     api = Api(app)
-    swagger = Swagger(app)
+    swagger = PrebuiltSwagger(app)
 
     app.register_blueprint(usuario_bp, url_prefix='/user')
     app.register_blueprint(producer_bp, url_prefix='/producer')
@@ -47,18 +65,78 @@ def create_app(local=False, local_path=''):
     app.register_blueprint(productoraAPI_bp, url_prefix='/api/producer')
     app.register_blueprint(titulo_bp, url_prefix='/api/titulo')
     api.add_resource(Index, '/')
+    app.cli.add_command(ratings_cli)
+    app.cli.add_command(impressions_cli)
+    app.cli.add_command(sessions_cli)
+    app.cli.add_command(docs_cli)
+    app.cli.add_command(recommendations_cli)
+    app.cli.add_command(analytics_cli)
 
     if not local:
         URI = DB_URI
+        REPLICA_URI = DB_REPLICA_URI
     else:
         URI = f'sqlite:///{local_path}'
+        REPLICA_URI = f'sqlite:///{replica_path}' if replica_path else None
         
     app.config['SQLALCHEMY_DATABASE_URI'] = URI
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['SECRET_KEY'] = TOKEN_KEY
+    app.config['IDENTITY_CACHE_SIZE'] = 1024
+    app.config['IDENTITY_CACHE_TTL'] = 300
+    app.config['PAGE_SIZE'] = 50
+    app.config['MAX_PAGE_SIZE'] = 200
+    app.config['MAX_BULK_EPISODES'] = 1000
+    app.config['CATALOG_IMPORT_CHUNK'] = 200
+    app.config['EXPORT_BATCH_SIZE'] = 500
+    app.config['QUERY_BUDGET'] = 20
+    app.config['QUERY_REPEAT_THRESHOLD'] = 5
+    app.config['QUERY_STATS_HEADERS'] = False
+    app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    app.config['PASSWORD_POOL_WORKERS'] = 4
+    app.config['PASSWORD_POOL_QUEUE_DEPTH'] = 16
+    app.config['PASSWORD_POOL_TIMEOUT'] = 10
+    app.config['TOKEN_REVOCATION_STORE'] = os.getenv('TOKEN_REVOCATION_STORE', 'sql')
+    app.config['TOKEN_REVOCATION_SYNC_INTERVAL'] = 5
+    app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 10))
+    app.config['DB_MAX_OVERFLOW'] = int(os.getenv('DB_MAX_OVERFLOW', 20))
+    app.config['DB_POOL_TIMEOUT'] = int(os.getenv('DB_POOL_TIMEOUT', 30))
+    app.config['DB_POOL_RECYCLE'] = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    app.config['DB_POOL_PRE_PING'] = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+    app.config['DB_STATEMENT_TIMEOUT_MS'] = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 5000))
+    app.config['SQLITE_PROFILE'] = os.getenv('SQLITE_PROFILE', 'wal')
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    app.config['SQLITE_MMAP_SIZE'] = int(os.getenv('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(URI, app.config)
+    app.config['DB_READ_YOUR_WRITES_SECONDS'] = 5
+    app.config['SWAGGER_SPEC_FILE'] = os.getenv('SWAGGER_SPEC_FILE')
+    app.config['FEED_FANOUT_LIMIT'] = 1000
+    app.config['FEED_BACKFILL'] = 20
+    app.config['FOLLOW_GRAPH_REFRESH_INTERVAL'] = 60
+    app.config['RECOMMENDATIONS_TOP_K'] = 20
+    app.config['RECOMMENDATIONS_BLOCK_CELLS'] = 4_000_000
+    app.config['TRENDING_HALF_LIFE_HOURS'] = 48
+    app.config['TRENDING_REFRESH_INTERVAL'] = 60
+    app.config['TRENDING_CAPACITY'] = 1000
+    app.config['TRENDING_SIZE'] = 100
+    app.config['ANALYTICS_MAX_DAYS'] = 366
+    app.config['ANALYTICS_SAFETY_LAG'] = 300
+    if REPLICA_URI:
+        app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: {'url': REPLICA_URI, **engine_options(REPLICA_URI, app.config)}}
 
     db.init_app(app)
+    init_query_stats(app)
+    init_metrics(app)
+    init_replicas(app)
     with app.app_context():
-        db.create_all()
+        for engine in db.engines.values():
+            init_engine(engine, app.config)
+        db.create_all(bind_key=None)
+        init_search(db.engine)
+        if local and REPLICA_URI:
+            # Una réplica local no se replica sola: se le crea el esquema para poder probar el ruteo.
+            db.metadata.create_all(db.engines[REPLICA_BIND])
+            init_search(db.engines[REPLICA_BIND])
+        init_follow_graph(app)
 
     return app
@@ -1,14 +1,179 @@
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
+from threading import Lock
 from typing import Literal
 import os
+import time
+import uuid
 
-from flask import jsonify, make_response, session
+from flask import current_app, g, has_app_context, jsonify, make_response, session
+from sqlalchemy import event, inspect
 import jwt
+
+from models.models import DataBase, Productora, Usuario
+from services.metrics import record_jwt_decode
+from services.sessions import is_revoked
 try:
     from config import TOKEN_KEY
 except ModuleNotFoundError:
     TOKEN_KEY = os.getenv('TOKEN_KEY', "please-set-up-a-proper-key")
 
+db = DataBase().db
+
+ROLE_MODELS = {'user': Usuario, 'producer': Productora}
+
+@dataclass(frozen=True)
+class Identity:
+    """
+    Resolved identity of the account that owns a token.
+
+    Attributes:
+    -----------
+    id : int
+        The ID of the account in its table (`Usuarios` or `Productoras`).
+    username : str
+        The account's `nombre_usuario`.
+    role : str
+        Either 'user' or 'producer'.
+    """
+    id: int
+    username: str
+    role: str
+
+class IdentityCache:
+    """
+    Bounded LRU cache of `Identity` objects with a time to live.
+
+    Entries are keyed by `(role, username)`. Once `maxsize` entries are stored the
+    least recently used one is evicted, and entries older than `ttl` seconds are
+    treated as missing.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, role: str, username: str):
+        key = (role, username)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            identity, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return identity
+
+    def put(self, identity: Identity):
+        key = (identity.role, identity.username)
+        with self._lock:
+            self._entries[key] = (identity, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, role: str, username: str):
+        with self._lock:
+            self._entries.pop((role, username), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+def get_identity_cache() -> IdentityCache:
+    """
+    Returns the identity cache of the current app, creating it on first use from
+    the `IDENTITY_CACHE_SIZE` and `IDENTITY_CACHE_TTL` settings.
+    """
+    cache = current_app.extensions.get('identity_cache')
+    if cache is None:
+        cache = IdentityCache(current_app.config.get('IDENTITY_CACHE_SIZE', 1024),
+                              current_app.config.get('IDENTITY_CACHE_TTL', 300))
+        current_app.extensions['identity_cache'] = cache
+    return cache
+
+def resolve_identity(username: str, user_type: Literal['user', 'producer']):
+    """
+    Resolves a username to an `Identity`, or None if the account does not exist.
+
+    The result is memoized for the rest of the request and shared between requests
+    through the app's `IdentityCache`, so the account lookup only reaches the
+    database on a cache miss.
+    """
+    resolved = g.setdefault('identities', {})
+    key = (user_type, username)
+    if key in resolved:
+        return resolved[key]
+
+    cache = get_identity_cache()
+    identity = cache.get(user_type, username)
+    if identity is None:
+        model = ROLE_MODELS[user_type]
+        account_id = db.session.query(model.id).filter_by(nombre_usuario=username).scalar()
+        if account_id is not None:
+            identity = Identity(account_id, username, user_type)
+            cache.put(identity)
+
+    resolved[key] = identity
+    return identity
+
+def decode_token(token):
+    """
+    Decodes and verifies a JWT generated by `generate_token`, recording the time spent
+    in the app's metrics.
+
+    Raises
+    ------
+    jwt.InvalidTokenError
+        If the token is invalid or has expired.
+    """
+    start = time.perf_counter()
+    try:
+        return jwt.decode(token, TOKEN_KEY, algorithms=['HS256'])
+    finally:
+        record_jwt_decode(time.perf_counter() - start)
+
+def session_identity(user_type: Literal['user', 'producer']):
+    """
+    Returns the identity of the caller if the session holds a valid token for
+    `user_type`, or None otherwise.
+
+    Unlike `token_required` it never rejects the request, so it can be used on routes
+    where authentication is optional.
+    """
+    token = session.get('auth_token')
+    if not token:
+        return None
+    try:
+        data = decode_token(token)
+    except jwt.InvalidTokenError:
+        return None
+    if data.get('user_type') != user_type or is_revoked(data):
+        return None
+    return resolve_identity(data['username'], user_type)
+
+def _invalidate_identity(mapper, connection, target):
+    if not has_app_context() or 'identity_cache' not in current_app.extensions:
+        return
+    role = 'user' if isinstance(target, Usuario) else 'producer'
+    cache = current_app.extensions['identity_cache']
+    history = inspect(target).attrs.nombre_usuario.history
+    for username in (target.nombre_usuario, *history.deleted):
+        cache.invalidate(role, username)
+    g.pop('identities', None)
+
+for _model in ROLE_MODELS.values():
+    event.listen(_model, 'after_update', _invalidate_identity)
+    event.listen(_model, 'after_delete', _invalidate_identity)
+
 def generate_token(username, user_type: Literal['user', 'producer']):
     """
     Generate a JWT token for a given user.
@@ -16,7 +181,7 @@ def generate_token(username, user_type: Literal['user', 'producer']):
     tags:
       - Authentication
     summary: Generate JWT token
-    description: Creates a JSON Web Token (JWT) for a user, signed using the HS256 algorithm, with an expiration time of 15 minutes. The token contains the username, user type, and expiration date.
+    description: Creates a JSON Web Token (JWT) for a user, signed using the HS256 algorithm, with an expiration time of 15 minutes. The token contains the username, user type, expiration date and a unique ID (`jti`) used to revoke it.
     parameters:
       - in: query
         name: username
@@ -49,19 +214,20 @@ def generate_token(username, user_type: Literal['user', 'producer']):
     token = jwt.encode({
             'username': username,
             'user_type': user_type,
-            'exp': expiration
+            'exp': expiration,
+            'jti': uuid.uuid4().hex
         }, TOKEN_KEY, algorithm='HS256')
     return token
 
 # Decorador para proteger rutas
-def token_required(user_type: Literal['user', 'producer']):
+def token_required(user_type: Literal['user', 'producer'], identity: bool = False):
     """
     Decorator to protect routes requiring JWT authentication with role validation.
     ---
     tags:
       - Authentication
     summary: Protect route with JWT authentication and user role validation
-    description: Ensures that the route is protected by checking that a valid JWT token is present in the session. The token is verified for the correct user type (either 'user' or 'producer'). If the token is missing, expired, invalid, or the role does not match, an appropriate error is returned. If the token is valid and the role is correct, the original function is executed, passing the username from the token as an argument.
+    description: Ensures that the route is protected by checking that a valid JWT token is present in the session. The token is verified for the correct user type (either 'user' or 'producer'). If the token is missing, expired, invalid, revoked, or the role does not match, an appropriate error is returned. If the token is valid and the role is correct, the original function is executed, passing the username from the token as an argument.
     parameters:
       - in: header
         name: Authorization
@@ -69,11 +235,19 @@ def token_required(user_type: Literal['user', 'producer']):
         schema:
           type: string
         description: Bearer token required for authentication.
+      - in: query
+        name: identity
+        required: false
+        schema:
+          type: boolean
+        description: If True, the account is resolved through the identity cache and passed to the route as an `identity` keyword argument.
     responses:
       401:
         description: Token is missing or the user role is incorrect.
       403:
-        description: Token has expired or is invalid.
+        description: Token has expired, is invalid or has been revoked.
+      404:
+        description: The account the token was issued for no longer exists (only when `identity` is True).
       200:
         description: The original function is executed after successful token validation and user role check.
     """
@@ -83,14 +257,21 @@ def token_required(user_type: Literal['user', 'producer']):
                 return make_response(jsonify({'message': 'Token is missing!'}), 401)
             token = session['auth_token']
             try:
-                data = jwt.decode(token, TOKEN_KEY, algorithms=['HS256'])
+                data = decode_token(token)
                 if data['user_type'] != user_type:
                     return make_response(jsonify({'message': 'Incorrect role'}), 401)
+                if is_revoked(data):
+                    return make_response(jsonify({'message': 'Token has been revoked!'}), 403)
                 user = data['username']
             except jwt.ExpiredSignatureError:
                 return make_response(jsonify({'message': 'Token has expired!'}), 403)
             except jwt.InvalidTokenError:
                 return make_response(jsonify({'message': 'Invalid token!'}), 403)
+            if identity:
+                resolved = resolve_identity(user, user_type)
+                if resolved is None:
+                    return make_response(jsonify({'message': 'Usuario no encontrado'}), 404)
+                kwargs['identity'] = resolved
             return func(*args, current_user=user, **kwargs)
         return decorated
     return decorator
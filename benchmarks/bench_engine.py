@@ -0,0 +1,103 @@
+"""
+Compara los perfiles de SQLite de services/engine.py bajo carga concurrente.
+
+Uso
+---
+    python benchmarks/bench_engine.py --scale small --requests 4000 --workers 8
+
+Para cada perfil (`default`: journal DELETE y synchronous FULL; `wal`: WAL,
+synchronous NORMAL y mmap) se genera el mismo dataset en una base temporal y se
+reproduce la mezcla de benchmarks/load_test.py con varios workers. Se informa el
+throughput, los percentiles globales y cuantas requests fallaron (por ejemplo
+con "database is locked").
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from dataset import PASSWORD_HASH_METHOD, SCALES, build_database
+from load_test import Workload, load_ids, percentile, run_worker, summarize
+
+from app import create_app
+from models.models import DataBase
+from services.engine import SQLITE_PROFILES
+
+db = DataBase().db
+
+def run_profile(profile: str, args):
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    os.environ['SQLITE_PROFILE'] = profile
+    os.environ['SQLITE_BUSY_TIMEOUT_MS'] = str(args.busy_timeout)
+    try:
+        app = create_app(local=True, local_path=db_path)
+        app.config['PASSWORD_HASH_METHOD'] = PASSWORD_HASH_METHOD
+        # Los 'database is locked' se cuentan como errores; no hace falta el traceback de cada uno.
+        app.logger.setLevel(logging.CRITICAL)
+        config = SCALES[args.scale]
+        build_database(app, config, args.seed)
+        titulo_ids, resenias, usuarios = load_ids(app)
+        workload = Workload(titulo_ids, resenias, usuarios, config.zipf, random.Random(args.seed))
+        lock = threading.Lock()
+        samples = defaultdict(list)
+        per_worker = max(args.requests // args.workers, 1)
+        threads = [threading.Thread(target=run_worker,
+                                    args=(app, workload, usuarios[i % len(usuarios)][1], per_worker, samples, lock))
+                   for i in range(args.workers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        summary = summarize(samples, time.perf_counter() - start)
+        with app.app_context():
+            db.engine.dispose()
+    finally:
+        os.environ.pop('SQLITE_PROFILE', None)
+        os.environ.pop('SQLITE_BUSY_TIMEOUT_MS', None)
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.unlink(db_path + suffix)
+
+    latencies = sorted(latency for values in samples.values() for latency, _ in values)
+    summary['p50_ms'] = percentile(latencies, 50) * 1000
+    summary['p95_ms'] = percentile(latencies, 95) * 1000
+    summary['p99_ms'] = percentile(latencies, 99) * 1000
+    summary['errors'] = sum(result['errors'] for result in summary['endpoints'].values())
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=4_000)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--busy-timeout', type=int, default=5000, help='SQLITE_BUSY_TIMEOUT_MS para todos los perfiles.')
+    parser.add_argument('--profiles', nargs='+', choices=SQLITE_PROFILES, default=list(SQLITE_PROFILES))
+    parser.add_argument('--output', help='Archivo JSON donde guardar los resultados.')
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'perfil':10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errores':>8}")
+    for profile in args.profiles:
+        summary = run_profile(profile, args)
+        results[profile] = summary
+        print(f"{profile:10} {summary['throughput_rps']:8.1f} {summary['p50_ms']:8.2f} "
+              f"{summary['p95_ms']:8.2f} {summary['p99_ms']:8.2f} {summary['errors']:8}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'args': vars(args), 'profiles': results}, file, indent=2, ensure_ascii=False)
+        print(f'Resultados guardados en {args.output}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""
+Compara los planes de consulta de los lookups mas usados por la API con y sin
+los indices declarados en models.models.
+
+Uso
+---
+    python benchmarks/bench_indexes.py --rows 200000
+
+Se crea una base SQLite temporal con el esquema de la aplicacion, se la llena
+con datos sinteticos y, para cada lookup, se muestra el plan (EXPLAIN QUERY PLAN)
+y el tiempo medio de la consulta forzando un full scan (`NOT INDEXED`) y
+dejando que SQLite use los indices.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from app import create_app
+from models.models import DataBase
+
+LOOKUPS = [
+    ('Episodio(titulo_id, orden)',
+     'SELECT * FROM "Episodios" {hint} WHERE titulo_id = ? AND orden = ?', 2),
+    ('Reseña(titulo_id)',
+     'SELECT * FROM "Reseñas" {hint} WHERE titulo_id = ?', 1),
+    ('Comentario(resenia_id)',
+     'SELECT * FROM "Comentarios" {hint} WHERE resenia_id = ?', 1),
+    ('Impresion(usuario_id, resenia_id)',
+     'SELECT * FROM "Impresiones" {hint} WHERE usuario_id = ? AND resenia_id = ?', 2),
+    ('Impresion(resenia_id)',
+     'SELECT * FROM "Impresiones" {hint} WHERE resenia_id = ?', 1),
+    ('Seguimiento(usuario_id, titulo_id)',
+     'SELECT * FROM "Seguimientos" {hint} WHERE usuario_id = ? AND titulo_id = ?', 2),
+    ('Relacion(seguido)',
+     'SELECT * FROM "Relaciones" {hint} WHERE seguido = ?', 1),
+    ('Usuario(nombre_usuario)',
+     'SELECT * FROM "Usuarios" {hint} WHERE nombre_usuario = ?', 'user'),
+    ('Productora(nombre_usuario)',
+     'SELECT * FROM "Productoras" {hint} WHERE nombre_usuario = ?', 'prod'),
+]
+
+def seed(conn, rows: int, rng: random.Random):
+    n_users = max(rows // 10, 1)
+    n_titles = max(rows // 20, 1)
+    cur = conn.cursor()
+    cur.executemany('INSERT INTO "Usuarios" (nombre_usuario, email, contraseña) VALUES (?, ?, ?)',
+                    ((f'user{i}', f'user{i}@mail', 'x') for i in range(n_users)))
+    cur.executemany('INSERT INTO "Productoras" (nombre_usuario, email, contraseña) VALUES (?, ?, ?)',
+                    ((f'prod{i}', f'prod{i}@mail', 'x') for i in range(n_users)))
+    cur.executemany('INSERT INTO "Titulos" (productora_id, fecha_inicio, fecha_fin, titulo, tipo) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    ((rng.randint(1, n_users), '2000-01-01', '2000-01-01', f'titulo {i}', 'SERIE')
+                     for i in range(n_titles)))
+    cur.executemany('INSERT INTO "Episodios" (titulo, duracion, orden, fecha_emision, titulo_id) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    ((f'ep {i}', 30, i // n_titles + 1, '2000-01-01', i % n_titles + 1)
+                     for i in range(rows)))
+    cur.executemany('INSERT INTO "Reseñas" (puntuacion, texto, usuario_id, titulo_id, fecha_publicacion) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    ((rng.randint(1, 10), 'texto', rng.randint(1, n_users), rng.randint(1, n_titles),
+                      '2000-01-01') for _ in range(rows)))
+    cur.executemany('INSERT INTO "Comentarios" (texto, usuario_id, resenia_id, fecha_publicacion) '
+                    'VALUES (?, ?, ?, ?)',
+                    (('texto', rng.randint(1, n_users), rng.randint(1, rows), '2000-01-01')
+                     for _ in range(rows)))
+    cur.executemany('INSERT OR IGNORE INTO "Impresiones" (usuario_id, resenia_id, valor) VALUES (?, ?, ?)',
+                    ((rng.randint(1, n_users), rng.randint(1, rows), rng.choice((1, -1)))
+                     for _ in range(rows)))
+    cur.executemany('INSERT OR IGNORE INTO "Seguimientos" '
+                    '(usuario_id, estado, resenia_id, cantidad_visto, titulo_id) VALUES (?, ?, ?, ?, ?)',
+                    ((rng.randint(1, n_users), 'ACTIVO', None, 0, rng.randint(1, n_titles))
+                     for _ in range(rows)))
+    cur.executemany('INSERT OR IGNORE INTO "Relaciones" (seguidor, seguido) VALUES (?, ?)',
+                    ((rng.randint(1, n_users), rng.randint(1, n_users)) for _ in range(rows)))
+    conn.commit()
+    cur.execute('ANALYZE')
+    return n_users, n_titles
+
+def params_for(kind, rng: random.Random, n_users: int, n_titles: int):
+    if isinstance(kind, str):
+        return (f'{kind}{rng.randrange(n_users)}',)
+    return tuple(rng.randint(1, n_titles) for _ in range(kind))
+
+def measure(conn, sql: str, params, repeat: int):
+    cur = conn.cursor()
+    plan = ' | '.join(row[-1] for row in cur.execute('EXPLAIN QUERY PLAN ' + sql, params))
+    start = time.perf_counter()
+    for _ in range(repeat):
+        cur.execute(sql, params).fetchall()
+    elapsed = (time.perf_counter() - start) / repeat
+    return plan, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100_000, help='Filas por tabla de actividad.')
+    parser.add_argument('--repeat', type=int, default=20, help='Repeticiones por consulta.')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    try:
+        app = create_app(local=True, local_path=db_path)
+        db = DataBase().db
+        with app.app_context():
+            db.engine.dispose()
+
+        import sqlite3
+        conn = sqlite3.connect(db_path)
+        n_users, n_titles = seed(conn, args.rows, rng)
+
+        for name, sql, kind in LOOKUPS:
+            params = params_for(kind, rng, n_users, n_titles)
+            scan_plan, scan_time = measure(conn, sql.format(hint='NOT INDEXED'), params, args.repeat)
+            idx_plan, idx_time = measure(conn, sql.format(hint=''), params, args.repeat)
+            print(name)
+            print(f'  sin indice: {scan_time * 1000:9.3f} ms  {scan_plan}')
+            print(f'  con indice: {idx_time * 1000:9.3f} ms  {idx_plan}')
+        conn.close()
+    finally:
+        os.unlink(db_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Mide el arranque de la aplicacion y la primera carga de la documentacion.
+
+Uso
+---
+    python benchmarks/bench_startup.py --repeat 10
+
+Cada medicion corre en un interprete nuevo y toma: el import de `app`, el
+`create_app`, el primer request (import-to-ready) y el primer y segundo GET a
+/apispec_1.json. Se compara el spec construido desde los docstrings YAML con el
+spec precompilado por `flask docs build` (SWAGGER_SPEC_FILE) y se informa la
+mediana de cada etapa en milisegundos.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+
+PROBE = '''
+import json, logging, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app(local=True)
+created = time.perf_counter()
+client = app.test_client()
+client.get('/')
+ready = time.perf_counter()
+assert client.get('/apispec_1.json').status_code == 200
+first_spec = time.perf_counter()
+client.get('/apispec_1.json')
+second_spec = time.perf_counter()
+print(json.dumps({
+    'import': imported - start,
+    'create_app': created - imported,
+    'import_to_ready': ready - start,
+    'first_spec': first_spec - ready,
+    'cached_spec': second_spec - first_spec,
+}))
+'''
+
+STAGES = ('import', 'create_app', 'import_to_ready', 'first_spec', 'cached_spec')
+
+def measure(env, repeat: int):
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-W', 'ignore', '-c', PROBE], cwd=ROOT, env=env,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {stage: statistics.median(run[stage] for run in runs) * 1000 for stage in STAGES}
+
+def build_spec_file(path):
+    from app import create_app
+    from services.docs import build_specs
+
+    app = create_app(local=True)
+    with app.app_context():
+        specs = build_specs(app.swag)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(specs, file)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='Interpretes por modo.')
+    parser.add_argument('--output', help='Archivo JSON donde guardar los resultados.')
+    args = parser.parse_args()
+
+    spec_fd, spec_path = tempfile.mkstemp(suffix='.json')
+    os.close(spec_fd)
+    try:
+        build_spec_file(spec_path)
+        base_env = {key: value for key, value in os.environ.items() if key != 'SWAGGER_SPEC_FILE'}
+        results = {
+            'docstrings': measure(base_env, args.repeat),
+            'prebuilt': measure({**base_env, 'SWAGGER_SPEC_FILE': spec_path}, args.repeat),
+        }
+    finally:
+        os.unlink(spec_path)
+
+    print(f"{'modo':12}" + ''.join(f'{stage:>17}' for stage in STAGES))
+    for mode, stages in results.items():
+        print(f'{mode:12}' + ''.join(f'{stages[stage]:14.2f} ms' for stage in STAGES))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump({'repeat': args.repeat, 'results': results}, file, indent=2)
+        print(f'Resultados guardados en {args.output}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+Generador reproducible de datos sinteticos para WatchNet.
+
+Uso
+---
+    python benchmarks/dataset.py --db /tmp/watchnet.db --scale medium --seed 1
+
+Crea (o completa) una base con usuarios, productoras, titulos, episodios,
+reseñas, comentarios, impresiones, seguimientos y un grafo de seguidores con
+grado de ley de potencias. La popularidad de titulos y usuarios sigue una
+distribucion de Zipf, asi que unos pocos titulos concentran la mayoria de las
+reseñas y unos pocos usuarios la mayoria de los seguidores, como en produccion.
+Con la misma semilla y escala siempre se generan los mismos datos.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from dataclasses import asdict, dataclass, replace
+from datetime import date, timedelta
+from itertools import accumulate
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from werkzeug.security import generate_password_hash
+
+from models.models import (Comentario, DataBase, Episodio, EstadoTitulo, Impresion, Productora, Relacion,
+                           Reseña, Seguimiento, TipoTitulo, Titulo, Usuario)
+
+db = DataBase().db
+
+PASSWORD = 'password'
+# Hash barato para que los logins del load test no midan solo PBKDF2. Los benchmarks configuran
+# PASSWORD_HASH_METHOD con el mismo metodo para que el login no rehashee las contraseñas.
+PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
+
+@dataclass
+class DatasetConfig:
+    usuarios: int = 1_000
+    productoras: int = 20
+    titulos: int = 500
+    episodios_por_serie: int = 10
+    resenias: int = 10_000
+    comentarios: int = 5_000
+    impresiones: int = 20_000
+    seguimientos: int = 5_000
+    seguidores_promedio: int = 15
+    zipf: float = 1.1
+
+SCALES = {
+    'small': DatasetConfig(usuarios=100, productoras=5, titulos=50, episodios_por_serie=5, resenias=500,
+                           comentarios=200, impresiones=1_000, seguimientos=300, seguidores_promedio=5),
+    'medium': DatasetConfig(),
+    'large': DatasetConfig(usuarios=50_000, productoras=500, titulos=50_000, episodios_por_serie=12,
+                           resenias=1_000_000, comentarios=300_000, impresiones=2_000_000,
+                           seguimientos=500_000, seguidores_promedio=30),
+}
+
+class ZipfSampler:
+    """
+    Samples integers in `[1, n]` where the probability of `k` is proportional to `1 / k**s`.
+    """
+
+    def __init__(self, n: int, s: float, rng: random.Random):
+        self.population = range(1, n + 1)
+        self.cum_weights = list(accumulate(1 / k ** s for k in self.population))
+        self.rng = rng
+
+    def sample(self, k: int = 1):
+        return self.rng.choices(self.population, cum_weights=self.cum_weights, k=k)
+
+def _insert(conn, model, rows, chunk_size: int = 5_000):
+    statement = db.insert(model)
+    for start in range(0, len(rows), chunk_size):
+        conn.execute(statement, rows[start:start + chunk_size])
+
+def _unique_pairs(rng, count, first, second, exclude_equal=False):
+    pairs = set()
+    attempts = 0
+    while len(pairs) < count and attempts < count * 10:
+        attempts += 1
+        a, b = first(), second()
+        if exclude_equal and a == b:
+            continue
+        pairs.add((a, b))
+    return sorted(pairs)
+
+def generate_dataset(engine, config: DatasetConfig, seed: int = 0):
+    """
+    Inserts a synthetic dataset into the (empty) database of `engine`.
+
+    Returns
+    -------
+    dict
+        Number of rows inserted per table.
+    """
+    rng = random.Random(seed)
+    titulos_zipf = ZipfSampler(config.titulos, config.zipf, rng)
+    usuarios_zipf = ZipfSampler(config.usuarios, config.zipf, rng)
+    password = generate_password_hash(PASSWORD, method=PASSWORD_HASH_METHOD)
+    inicio = date(2000, 1, 1)
+    counts = {}
+
+    with engine.begin() as conn:
+        usuarios = [{'nombre_usuario': f'user{i}', 'email': f'user{i}@watchnet.test', 'contraseña': password}
+                    for i in range(1, config.usuarios + 1)]
+        _insert(conn, Usuario, usuarios)
+
+        productoras = [{'nombre_usuario': f'prod{i}', 'email': f'prod{i}@watchnet.test', 'contraseña': password}
+                       for i in range(1, config.productoras + 1)]
+        _insert(conn, Productora, productoras)
+
+        titulos = []
+        episodios = []
+        for i in range(1, config.titulos + 1):
+            tipo = TipoTitulo.SERIE if rng.random() < 0.5 else TipoTitulo.PELICULA
+            fecha = inicio + timedelta(days=rng.randrange(8_000))
+            titulos.append({'productora_id': rng.randint(1, config.productoras),
+                            'fecha_inicio': fecha,
+                            'fecha_fin': fecha + timedelta(days=rng.randrange(1_000)),
+                            'titulo': f'{rng.choice(WORDS)} {rng.choice(WORDS)} {i}',
+                            'tipo': tipo})
+            cantidad = config.episodios_por_serie if tipo == TipoTitulo.SERIE else 1
+            episodios.extend({'titulo': f'Episodio {orden}',
+                              'duracion': rng.randint(20, 120),
+                              'orden': orden,
+                              'fecha_emision': fecha + timedelta(days=7 * orden),
+                              'titulo_id': i} for orden in range(1, cantidad + 1))
+        _insert(conn, Titulo, titulos)
+        _insert(conn, Episodio, episodios)
+
+        resenias = [{'puntuacion': rng.randint(1, 10),
+                     'texto': ' '.join(rng.choices(WORDS, k=12)),
+                     'usuario_id': rng.randint(1, config.usuarios),
+                     'titulo_id': titulo_id,
+                     'fecha_publicacion': inicio + timedelta(days=rng.randrange(9_000))}
+                    for titulo_id in titulos_zipf.sample(config.resenias)]
+        _insert(conn, Reseña, resenias)
+
+        resenias_zipf = ZipfSampler(max(config.resenias, 1), config.zipf, rng)
+        comentarios = [{'texto': ' '.join(rng.choices(WORDS, k=6)),
+                        'usuario_id': rng.randint(1, config.usuarios),
+                        'resenia_id': resenia_id,
+                        'fecha_publicacion': inicio + timedelta(days=rng.randrange(9_000))}
+                       for resenia_id in resenias_zipf.sample(config.comentarios)]
+        _insert(conn, Comentario, comentarios)
+
+        impresiones = [{'usuario_id': usuario_id, 'resenia_id': resenia_id, 'valor': rng.choice((1, 1, 1, -1))}
+                       for usuario_id, resenia_id in _unique_pairs(
+                           rng, config.impresiones,
+                           lambda: rng.randint(1, config.usuarios),
+                           lambda: resenias_zipf.sample()[0])]
+        _insert(conn, Impresion, impresiones)
+
+        seguimientos = [{'usuario_id': usuario_id,
+                         'titulo_id': titulo_id,
+                         'estado': rng.choice(list(EstadoTitulo)),
+                         'resenia_id': None,
+                         'cantidad_visto': rng.randint(0, config.episodios_por_serie)}
+                        for usuario_id, titulo_id in _unique_pairs(
+                            rng, config.seguimientos,
+                            lambda: rng.randint(1, config.usuarios),
+                            lambda: titulos_zipf.sample()[0])]
+        _insert(conn, Seguimiento, seguimientos)
+
+        # Grado de salida ~ Pareto y destino elegido por popularidad (Zipf): grado de entrada de ley de potencias.
+        relaciones = set()
+        for seguidor in range(1, config.usuarios + 1):
+            grado = min(int(rng.paretovariate(1.5) * config.seguidores_promedio / 3), config.usuarios - 1)
+            for seguido in usuarios_zipf.sample(grado):
+                if seguido != seguidor:
+                    relaciones.add((seguidor, seguido))
+        _insert(conn, Relacion, [{'seguidor': a, 'seguido': b} for a, b in sorted(relaciones)])
+
+    for name, rows in (('usuarios', usuarios), ('productoras', productoras), ('titulos', titulos),
+                       ('episodios', episodios), ('resenias', resenias), ('comentarios', comentarios),
+                       ('impresiones', impresiones), ('seguimientos', seguimientos), ('relaciones', relaciones)):
+        counts[name] = len(rows)
+    return counts
+
+def build_database(app, config: DatasetConfig, seed: int = 0):
+    """
+    Fills the database of `app` and rebuilds the derived aggregates.
+    """
+    from services.follow_graph import init_follow_graph
+    from services.impressions import reconstruir_contadores
+    from services.ratings import reconstruir_estadisticas
+
+    with app.app_context():
+        counts = generate_dataset(db.engine, config, seed)
+        reconstruir_estadisticas()
+        reconstruir_contadores()
+        init_follow_graph(app)
+    return counts
+
+WORDS = ('amor', 'noche', 'ciudad', 'guerra', 'secreto', 'familia', 'viaje', 'fuego', 'mar', 'sombra',
+         'reino', 'tiempo', 'perdido', 'ultimo', 'rojo', 'oscuro', 'historia', 'casa', 'juego', 'sueño',
+         'break', 'office', 'crown', 'dark', 'lost', 'house', 'game', 'star', 'night', 'city')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', required=True, help='Archivo SQLite a crear o completar.')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--usuarios', type=int, help='Pisa la cantidad de usuarios de la escala.')
+    parser.add_argument('--titulos', type=int, help='Pisa la cantidad de titulos de la escala.')
+    parser.add_argument('--resenias', type=int, help='Pisa la cantidad de reseñas de la escala.')
+    args = parser.parse_args()
+
+    config = SCALES[args.scale]
+    overrides = {key: getattr(args, key) for key in ('usuarios', 'titulos', 'resenias') if getattr(args, key)}
+    config = replace(config, **overrides)
+
+    from app import create_app
+    app = create_app(local=True, local_path=os.path.abspath(args.db))
+    start = time.perf_counter()
+    counts = build_database(app, config, args.seed)
+    print(f'Dataset {asdict(config)} generado en {time.perf_counter() - start:.1f} s')
+    for name, count in counts.items():
+        print(f'  {name}: {count}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""
+Load test reproducible de la API de WatchNet.
+
+Uso
+---
+    python benchmarks/load_test.py --scale small --requests 5000 --workers 4 --output results.json
+
+Genera un dataset sintetico con benchmarks/dataset.py (o reutiliza uno con
+--db), loguea un usuario por worker y reproduce una mezcla de lecturas y
+escrituras sobre la aplicacion Flask en proceso con `app.test_client()`. Los
+titulos y reseñas se eligen con popularidad de Zipf para que el trafico se
+concentre como en produccion. Al final se informa el throughput total y los
+percentiles p50/p95/p99 por endpoint, y se guardan en JSON para comparar entre
+versiones.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import asdict
+from datetime import datetime, timezone
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from dataset import PASSWORD, PASSWORD_HASH_METHOD, SCALES, ZipfSampler, build_database
+
+from app import create_app
+from models.models import DataBase, Reseña, Titulo, Usuario
+
+db = DataBase().db
+
+# (endpoint, peso). El endpoint es la plantilla de la ruta y es la clave de los resultados.
+WORKLOAD = [
+    ('GET /api/titulo/<id>', 20),
+    ('GET /api/titulo/<id>/review', 15),
+    ('GET /api/titulo/<id>/episodes', 10),
+    ('GET /api/titulo/buscar', 10),
+    ('GET /api/titulo/trending', 5),
+    ('GET /api/user/<user>/perfil', 10),
+    ('GET /api/titulo/<id>/review/<id>/impresion', 10),
+    ('GET /api/user/follow', 5),
+    ('GET /api/user/feed', 5),
+    ('POST /api/titulo/<id>/review', 5),
+    ('POST /api/titulo/<id>/review/<id>/impresion', 5),
+    ('POST /api/user/follow', 5),
+    ('POST /api/user/<user>/watchlist', 5),
+]
+
+SEARCH_TERMS = ('amor', 'noche', 'ciudad', 'dark', 'house', 'star', 'reino', 'sueño')
+
+class Workload:
+    """
+    Picks the next request of the mix and builds it from the ids in the database.
+    """
+
+    def __init__(self, titulo_ids, resenias, usuarios, zipf: float, rng: random.Random):
+        self.rng = rng
+        self.titulo_ids = titulo_ids
+        self.resenias = resenias
+        self.usuarios = usuarios
+        self.titulos_zipf = ZipfSampler(len(titulo_ids), zipf, rng)
+        self.resenias_zipf = ZipfSampler(len(resenias), zipf, rng)
+        self.endpoints = [endpoint for endpoint, _ in WORKLOAD]
+        self.weights = [weight for _, weight in WORKLOAD]
+
+    def titulo(self):
+        return self.titulo_ids[self.titulos_zipf.sample()[0] - 1]
+
+    def resenia(self):
+        return self.resenias[self.resenias_zipf.sample()[0] - 1]
+
+    def next(self, username: str):
+        """
+        Returns `(endpoint, method, url, json)` for the next request.
+        """
+        rng = self.rng
+        endpoint = rng.choices(self.endpoints, weights=self.weights)[0]
+        if endpoint == 'GET /api/titulo/<id>':
+            return endpoint, 'GET', f'/api/titulo/{self.titulo()}', None
+        if endpoint == 'GET /api/titulo/<id>/review':
+            return endpoint, 'GET', f'/api/titulo/{self.titulo()}/review', None
+        if endpoint == 'GET /api/titulo/<id>/episodes':
+            return endpoint, 'GET', f'/api/titulo/{self.titulo()}/episodes', None
+        if endpoint == 'GET /api/titulo/buscar':
+            return endpoint, 'GET', f'/api/titulo/buscar?q={rng.choice(SEARCH_TERMS)}', None
+        if endpoint == 'GET /api/titulo/trending':
+            return endpoint, 'GET', '/api/titulo/trending?limit=20', None
+        if endpoint == 'GET /api/user/<user>/perfil':
+            return endpoint, 'GET', f'/api/user/{rng.choice(self.usuarios)[1]}/perfil', None
+        if endpoint == 'GET /api/titulo/<id>/review/<id>/impresion':
+            resenia_id, titulo_id = self.resenia()
+            return endpoint, 'GET', f'/api/titulo/{titulo_id}/review/{resenia_id}/impresion?modo=resumen', None
+        if endpoint == 'GET /api/user/follow':
+            return endpoint, 'GET', '/api/user/follow', {'type': rng.choice(('follower', 'following'))}
+        if endpoint == 'GET /api/user/feed':
+            return endpoint, 'GET', '/api/user/feed', None
+        if endpoint == 'POST /api/titulo/<id>/review':
+            return endpoint, 'POST', f'/api/titulo/{self.titulo()}/review', \
+                {'puntuacion': rng.randint(1, 10), 'texto': 'load test'}
+        if endpoint == 'POST /api/titulo/<id>/review/<id>/impresion':
+            resenia_id, titulo_id = self.resenia()
+            return endpoint, 'POST', f'/api/titulo/{titulo_id}/review/{resenia_id}/impresion', \
+                {'valor': rng.choice((1, -1))}
+        if endpoint == 'POST /api/user/follow':
+            return endpoint, 'POST', '/api/user/follow', {'seguido_id': rng.choice(self.usuarios)[0]}
+        return endpoint, 'POST', f'/api/user/{username}/watchlist', {'titulo_id': self.titulo()}
+
+def percentile(sorted_values, p: float):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(p / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def run_worker(app, workload: Workload, username: str, requests: int, samples, lock):
+    client = app.test_client()
+    client.get('/api/user/', json={'email': f'{username}@watchnet.test', 'password': PASSWORD})
+    local = defaultdict(list)
+    for _ in range(requests):
+        with lock:
+            endpoint, method, url, body = workload.next(username)
+        start = time.perf_counter()
+        try:
+            status = client.open(url, method=method, json=body).status_code
+        except Exception:
+            status = 'exception'
+        local[endpoint].append((time.perf_counter() - start, status))
+    with lock:
+        for endpoint, values in local.items():
+            samples[endpoint].extend(values)
+
+def summarize(samples, elapsed: float):
+    results = {}
+    total = 0
+    for endpoint, values in sorted(samples.items()):
+        latencies = sorted(latency for latency, _ in values)
+        statuses = Counter(str(status) for _, status in values)
+        errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 500)
+        total += len(values)
+        results[endpoint] = {
+            'count': len(values),
+            'errors': errors,
+            'statuses': dict(sorted(statuses.items())),
+            'mean_ms': sum(latencies) / len(latencies) * 1000,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'max_ms': latencies[-1] * 1000,
+        }
+    return {'requests': total, 'elapsed_s': elapsed, 'throughput_rps': total / elapsed if elapsed else 0.0,
+            'endpoints': results}
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_ids(app):
+    with app.app_context():
+        titulo_ids = [row.id for row in db.session.query(Titulo.id).order_by(Titulo.id)]
+        resenias = [tuple(row) for row in db.session.query(Reseña.id, Reseña.titulo_id).order_by(Reseña.id)]
+        usuarios = [tuple(row) for row in db.session.query(Usuario.id, Usuario.nombre_usuario).order_by(Usuario.id)]
+    return titulo_ids, resenias, usuarios
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='Base ya generada con benchmarks/dataset.py. Si no se pasa se crea una temporal.')
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=2_000, help='Requests totales (se reparten entre workers).')
+    parser.add_argument('--warmup', type=int, default=100, help='Requests descartadas antes de medir.')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--output', help='Archivo JSON donde guardar los resultados.')
+    args = parser.parse_args()
+
+    config = SCALES[args.scale]
+    db_path = args.db
+    temporary = db_path is None
+    if temporary:
+        db_fd, db_path = tempfile.mkstemp(suffix='.db')
+        os.close(db_fd)
+    try:
+        app = create_app(local=True, local_path=os.path.abspath(db_path))
+        app.config['PASSWORD_HASH_METHOD'] = PASSWORD_HASH_METHOD
+        if temporary:
+            build_database(app, config, args.seed)
+        titulo_ids, resenias, usuarios = load_ids(app)
+        workload = Workload(titulo_ids, resenias, usuarios, config.zipf, random.Random(args.seed))
+        lock = threading.Lock()
+
+        if args.warmup:
+            run_worker(app, workload, usuarios[0][1], args.warmup, defaultdict(list), lock)
+
+        samples = defaultdict(list)
+        per_worker = max(args.requests // args.workers, 1)
+        threads = [threading.Thread(target=run_worker,
+                                    args=(app, workload, usuarios[i % len(usuarios)][1], per_worker, samples, lock))
+                   for i in range(args.workers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        summary = summarize(samples, time.perf_counter() - start)
+    finally:
+        if temporary:
+            os.unlink(db_path)
+
+    print(f"{summary['requests']} requests en {summary['elapsed_s']:.2f} s "
+          f"({summary['throughput_rps']:.1f} req/s, {args.workers} workers)")
+    print(f"{'endpoint':48} {'n':>6} {'err':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint, result in summary['endpoints'].items():
+        print(f"{endpoint:48} {result['count']:6} {result['errors']:4} "
+              f"{result['p50_ms']:8.2f} {result['p95_ms']:8.2f} {result['p99_ms']:8.2f}")
+
+    if args.output:
+        report = {
+            'meta': {
+                'timestamp': datetime.now(timezone.utc).isoformat(),
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'scale': None if args.db else args.scale,
+                'dataset': None if args.db else asdict(config),
+                'seed': args.seed,
+                'workers': args.workers,
+                'warmup': args.warmup,
+            },
+            **summary,
+        }
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+        print(f'Resultados guardados en {args.output}')
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,21 @@
-from flask import request, make_response, redirect, url_for, session, Blueprint, current_app
+from flask import request, make_response, redirect, url_for, session, Blueprint
 from flask_restful import Resource, Api
 from flask.templating import render_template
 
-from resources.usuario import UserAPI
 from auth import token_required
+from services.auth_service import end_session, login, signup
 
 usuario_bp = Blueprint('usuario', __name__)
 usuario_api = Api(usuario_bp)
 
 class Login(Resource):
     def post(self):
-        data = request.get_json()
-        res = UserAPI()
-
-        with current_app.test_request_context(
-            '/api/user/', json=data, method='GET'
-        ) as client:
-            response = res.get()
-            token = session['auth_token']
-
-        session['auth_token'] = token
+        response = login('user', request.get_json())
 
         if response[1] == 200:
             return redirect(url_for('usuario.home'))
-        
-        else:
-            return response
+
+        return response
 
     def get(self):
         response = make_response(render_template('login.html'))
@@ -34,22 +24,12 @@ class Login(Resource):
     
 class Signup(Resource):
     def post(self):
-        data = request.get_json()
-        res = UserAPI()
-
-        with current_app.test_request_context(
-            '/api/user/', json=data, method='POST'
-        ) as client:
-            response = res.post()
-            token = session['auth_token']
-
-        session['auth_token'] = token
+        response = signup('user', request.get_json())
 
         if response[1] == 200:
             return redirect(url_for('usuario.home'))
-        
-        else:
-            return response
+
+        return response
 
 
     def get(self):
@@ -59,7 +39,7 @@ class Signup(Resource):
 
 class Logout(Resource):
     def post(self):
-        session.pop('auth_token', None)
+        end_session()
         return redirect(url_for('index'))
     
 class Home(Resource):
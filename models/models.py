@@ -1,17 +1,26 @@
 from abc import ABC
 from datetime import date
 from enum import Enum
+from operator import attrgetter
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from services.passwords import hash_password, verify_password
+from services.replicas import RoutingSession
 
 class DataBase:
+    """
+    Singleton holding the `SQLAlchemy` extension shared by the whole app.
+
+    Its session is a `RoutingSession`: when a `replica` bind is configured in
+    `SQLALCHEMY_BINDS`, reads of read-only requests go to the replica and everything
+    else goes to the primary (`SQLALCHEMY_DATABASE_URI`).
+    """
     _instance = None
 
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
             cls._instance = super(DataBase, cls).__new__(cls, *args, **kwargs)
-            cls._instance._db = SQLAlchemy()
+            cls._instance._db = SQLAlchemy(session_options={'class_': RoutingSession})
         return cls._instance
 
     @property
@@ -21,6 +30,15 @@ class DataBase:
 database = DataBase()
 db = database.db
 
+# Subconjuntos de columnas (`fields`) distintos que se guardan por modelo.
+SERIALIZER_SUBSETS_SIZE = 64
+
+def _isoformat(value):
+    return value.isoformat()
+
+def _enum_value(value):
+    return value.value
+
 class Serializable:
     """
     Class used to represent an entity that can be serialized into a dictionary.
@@ -28,36 +46,106 @@ class Serializable:
     tags:
     - Serialization
     summary: Represents a serializable entity that converts its attributes into a dictionary.
-    description: This class provides a method to serialize an object by converting its attributes into a dictionary format. It handles special cases for date and `TipoTitulo` types, converting them to appropriate formats.
+    description: This class provides methods to serialize one or many objects into dictionaries. The list of columns and the converter for each of them (ISO 8601 for dates, the enum value for `TipoTitulo` and `EstadoTitulo`) are computed once per model class by `compile_serializer`, so serializing a row does not inspect the table again.
     """
 
-    def serialize(self):
+    @classmethod
+    def compile_serializer(cls):
+        """
+        Precomputes the serialized columns of the model and their converters.
+
+        Returns:
+        --------
+        tuple
+            Pairs of `(column name, converter)`, where converter is None for values that are serialized as is.
+        """
+        columns = []
+        for column in cls.__table__.columns:
+            if isinstance(column.type, (db.Date, db.DateTime)):
+                converter = _isoformat
+            elif isinstance(column.type, db.Enum):
+                converter = _enum_value
+            else:
+                converter = None
+            columns.append((column.name, converter))
+        cls._serializer = tuple(columns)
+        cls._serializer_names = frozenset(name for name, _ in columns)
+        cls._serializer_subsets = {}
+        return cls._serializer
+
+    @classmethod
+    def _serializer_for(cls, fields=None):
+        if '_serializer' not in cls.__dict__:
+            cls.compile_serializer()
+        if fields is None:
+            columns = cls._serializer
+        else:
+            # `fields` viene del cliente: la clave se reduce a columnas reales y la cache tiene tope.
+            key = frozenset(fields) & cls._serializer_names
+            columns = cls._serializer_subsets.get(key)
+            if columns is None:
+                columns = tuple(column for column in cls._serializer if column[0] in key)
+                if len(cls._serializer_subsets) < SERIALIZER_SUBSETS_SIZE:
+                    cls._serializer_subsets[key] = columns
+        names = tuple(name for name, _ in columns)
+        converters = tuple((i, converter) for i, (_, converter) in enumerate(columns) if converter)
+        return names, converters
+
+    @classmethod
+    def serialize_many(cls, rows, fields=None):
+        """
+        Serializes a whole result set in a single pass.
+
+        Parameters:
+        -----------
+        rows : iterable
+            Instances of the model, e.g. a query.
+        fields : iterable of str, optional
+            Subset of columns to include. Unknown names are ignored. By default every column is included.
+
+        Returns:
+        --------
+        list of dict
+            One dictionary per row, in the same format as `serialize`.
+        """
+        names, converters = cls._serializer_for(fields)
+        if not names:
+            return [{} for _ in rows]
+        getter = attrgetter(*names)
+        single = len(names) == 1
+        data = []
+        for row in rows:
+            values = getter(row)
+            if single:
+                values = (values,)
+            if converters:
+                values = list(values)
+                for i, converter in converters:
+                    if values[i] is not None:
+                        values[i] = converter(values[i])
+            data.append(dict(zip(names, values)))
+        return data
+
+    def serialize(self, fields=None):
         """
         Converts the object's attributes into a dictionary, with special handling for `date` and `TipoTitulo` types.
         ---
         tags:
         - Serialization
         summary: Serializes the object's attributes into a dictionary format.
-        description: This method iterates over all columns of the object and converts their values into a dictionary. Special handling is applied to `date` types, converting them to ISO 8601 format, and `TipoTitulo` types, converting them to their corresponding string values.
+        description: This method converts the values of the model's columns into a dictionary using the converters precomputed by `compile_serializer`. `date` values are converted to ISO 8601 format, and `TipoTitulo` and `EstadoTitulo` values to their corresponding string values.
 
         Parameters:
         -----------
-        None
+        fields : iterable of str, optional
+            Subset of columns to include. By default every column is included.
 
         Returns:
         --------
         dict
             A dictionary where the keys are the attribute names and the values are the corresponding attribute values, with special formatting for `date` and `TipoTitulo`.
         """
-        data = {}
-        for column in self.__table__.columns:
-            value = getattr(self, column.name)
-            if type(value) == date:
-                value = value.isoformat()
-            elif type(value) == TipoTitulo or type(value) == EstadoTitulo:
-                value = value.value
-            data[column.name] = value
-        return data
+        return type(self).serialize_many((self,), fields)[0]
 
 class Comentario(db.Model, Serializable):
     """
@@ -82,6 +170,10 @@ class Comentario(db.Model, Serializable):
         The date when the comment was published.
     """
     __tablename__= 'Comentarios'
+    __table_args__ = (
+        db.Index('ix_Comentarios_resenia_id', 'resenia_id'),
+        db.Index('ix_Comentarios_usuario_id', 'usuario_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     texto = db.Column(db.Text, nullable=False)
     usuario_id = db.Column(db.Integer, nullable=False)
@@ -113,6 +205,9 @@ class Episodio(db.Model, Serializable):
         The ID of the title or series to which the episode belongs.
     """
     __tablename__ = 'Episodios'
+    __table_args__ = (
+        db.UniqueConstraint('titulo_id', 'orden', name='uq_Episodios_titulo_id_orden'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     titulo = db.Column(db.Text, nullable=False)
     duracion = db.Column(db.Integer, nullable=False)
@@ -141,6 +236,10 @@ class Impresion(db.Model, Serializable):
         The value of the impression (1 for 'like', -1 for 'dislike').
     """
     __tablename__ = 'Impresiones'
+    __table_args__ = (
+        db.UniqueConstraint('usuario_id', 'resenia_id', name='uq_Impresiones_usuario_id_resenia_id'),
+        db.Index('ix_Impresiones_resenia_id', 'resenia_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, nullable=False)
     resenia_id = db.Column(db.Integer, nullable=False)
@@ -170,7 +269,7 @@ class Entidad(db.Model, UserMixin, Serializable):
     __abstract__ = True  
 
     id = db.Column(db.Integer, primary_key=True)
-    nombre_usuario = db.Column(db.String(80), nullable=False)
+    nombre_usuario = db.Column(db.String(80), unique=True, index=True, nullable=False)
     email = db.Column(db.String(256), unique=True, nullable=False)
     contraseña = db.Column(db.String(128), nullable=False)
 
@@ -181,7 +280,7 @@ class Entidad(db.Model, UserMixin, Serializable):
         tags:
         - User
         summary: Encrypt and store a user's password securely.
-        description: This method encrypts the provided password using a secure hashing algorithm and stores it in the entity's password field.
+        description: This method encrypts the provided password with the hashing method set in `PASSWORD_HASH_METHOD` and stores it in the entity's password field. The hash is computed in the password worker pool.
 
         parameters:
         - in: body
@@ -195,7 +294,7 @@ class Entidad(db.Model, UserMixin, Serializable):
         200:
             description: Password encrypted and stored successfully.
         """
-        self.contraseña = generate_password_hash(password)
+        self.contraseña = hash_password(password)
 
     def check_password(self, password: str):
         """
@@ -204,7 +303,7 @@ class Entidad(db.Model, UserMixin, Serializable):
         tags:
         - User
         summary: Verify if the provided password matches the stored password.
-        description: This method checks if the given password matches the encrypted password stored in the entity. It is used for authentication purposes.
+        description: This method checks if the given password matches the encrypted password stored in the entity. It is used for authentication purposes. The check runs in the password worker pool.
 
         parameters:
         - in: body
@@ -218,7 +317,7 @@ class Entidad(db.Model, UserMixin, Serializable):
         200:
             description: Password verification successful. Returns True if the password matches, otherwise False.
         """
-        return check_password_hash(self.contraseña, password)
+        return verify_password(self.contraseña, password)
 
 class Productora(Entidad):
     """
@@ -252,7 +351,7 @@ class Reseña(db.Model, Serializable):
     id : int
         The unique identifier of the review.
     puntuacion : int
-        The rating given in the review, typically a value between 1 and 5.
+        The rating given in the review, an integer between 0 and 10.
     texto : str
         The content of the review, where the user shares their opinion on the title.
     usuario_id : int
@@ -263,6 +362,12 @@ class Reseña(db.Model, Serializable):
         The date when the review was published.
     """
     __tablename__ = 'Reseñas'
+    __table_args__ = (
+        db.Index('ix_Reseñas_titulo_id', 'titulo_id'),
+        db.Index('ix_Reseñas_usuario_id', 'usuario_id'),
+        # Los jobs usan el ID como marca de agua: SQLite no debe reutilizar el de una reseña borrada.
+        {'sqlite_autoincrement': True},
+    )
     id = db.Column(db.Integer, primary_key=True)
     puntuacion = db.Column(db.Integer, nullable=False)
     texto = db.Column(db.Text, nullable=False)
@@ -303,6 +408,9 @@ class Seguimiento(db.Model, Serializable):
         The ID of the title (e.g., movie, series, book) that the user is tracking.
     """
     __tablename__ = 'Seguimientos'
+    __table_args__ = (
+        db.UniqueConstraint('usuario_id', 'titulo_id', name='uq_Seguimientos_usuario_id_titulo_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     usuario_id = db.Column(db.Integer, nullable=False)
     estado = db.Column(db.Enum(EstadoTitulo), nullable=False)
@@ -349,6 +457,68 @@ class Titulo(db.Model, Serializable):
     titulo = db.Column(db.Text, nullable=False)
     tipo = db.Column(db.Enum(TipoTitulo), nullable=False)
     
+class ContadorImpresiones(db.Model, Serializable):
+    """
+    Class used to store the number of likes and dislikes of a review.
+    ---
+    tags:
+      - Impressions
+    summary: Represents the like and dislike counters of a review
+    description: This class stores how many likes and dislikes a review has, so they can be read without loading every impression. It is kept up to date when impressions are created or deleted and can be rebuilt from the impressions with `flask impressions rebuild`.
+
+    Attributes:
+    -----------
+    resenia_id : int
+        The ID of the review.
+    likes : int
+        The number of impressions with value 1.
+    dislikes : int
+        The number of impressions with value -1.
+    """
+    __tablename__ = 'ContadoresImpresiones'
+    resenia_id = db.Column(db.Integer, primary_key=True)
+    likes = db.Column(db.Integer, nullable=False, default=0)
+    dislikes = db.Column(db.Integer, nullable=False, default=0)
+
+class EstadisticaTitulo(db.Model, Serializable):
+    """
+    Class used to store the precomputed rating aggregates of a title.
+    ---
+    tags:
+    - Titles
+    summary: Represents the rating aggregates of a title.
+    description: This class stores the number of reviews of a title, the sum of their scores and a histogram of the scores, so the average rating of a title can be read from a single row. It is kept up to date when reviews are created or deleted and can be rebuilt from the reviews with `flask ratings rebuild`.
+
+    Attributes:
+    -----------
+    titulo_id : int
+        The ID of the title.
+    cantidad_resenias : int
+        The number of reviews of the title.
+    suma_puntuaciones : int
+        The sum of the scores of the reviews of the title.
+    histograma : dict
+        The number of reviews for each score, keyed by the score as a string.
+    """
+    __tablename__ = 'EstadisticasTitulos'
+    titulo_id = db.Column(db.Integer, primary_key=True)
+    cantidad_resenias = db.Column(db.Integer, nullable=False, default=0)
+    suma_puntuaciones = db.Column(db.Integer, nullable=False, default=0)
+    histograma = db.Column(db.JSON, nullable=False, default=dict)
+
+    def resumen(self):
+        """
+        Returns the count, average score and histogram of the title's reviews.
+        """
+        promedio = None
+        if self.cantidad_resenias:
+            promedio = round(self.suma_puntuaciones / self.cantidad_resenias, 2)
+        return {
+            'cantidad': self.cantidad_resenias,
+            'promedio': promedio,
+            'histograma': self.histograma
+        }
+
 class Relacion(db.Model, Serializable):
     """
     Class used to represent the following relationship between two users.
@@ -366,5 +536,251 @@ class Relacion(db.Model, Serializable):
         The ID of the user being followed by another user.
     """
     __tablename__ = 'Relaciones'
+    __table_args__ = (
+        db.Index('ix_Relaciones_seguido', 'seguido'),
+    )
     seguidor = db.Column(db.Integer, primary_key=True)
     seguido = db.Column(db.Integer, primary_key=True)
+
+class TokenRevocado(db.Model, Serializable):
+    """
+    Class used to store a revoked session token.
+    ---
+    tags:
+    - Authentication
+    summary: Represents a session token that is no longer accepted.
+    description: This class stores the ID (`jti`) of a token that was revoked before it expired, for example on logout. Rows are only needed until the token expires and can be removed afterwards with `flask sessions purge`.
+
+    Attributes:
+    -----------
+    jti : str
+        The unique ID of the token.
+    expira : datetime
+        When the token expires (UTC).
+    revocado_en : datetime
+        When the token was revoked (UTC).
+    """
+    __tablename__ = 'TokensRevocados'
+    jti = db.Column(db.String(64), primary_key=True)
+    expira = db.Column(db.DateTime, nullable=False, index=True)
+    revocado_en = db.Column(db.DateTime, nullable=False, index=True)
+
+class TipoActividad(Enum):
+    RESENIA = 'RESENIA'
+    SEGUIMIENTO = 'SEGUIMIENTO'
+    COMENTARIO = 'COMENTARIO'
+
+    def __str__(self):
+        return self.value
+
+class Actividad(db.Model, Serializable):
+    """
+    Class used to represent something a user did that is shown in the feed of their followers.
+    ---
+    tags:
+    - Feed
+    summary: Represents an activity of a user (a review, a watchlist change or a comment).
+    description: This class stores one activity of a user. When the author has few followers the activity is copied to the feed of each follower (`EntradaFeed`) as soon as it is created; activities of accounts with many followers are not copied (`difundida` is False) and are merged into the feeds when they are read.
+
+    Attributes:
+    -----------
+    id : int
+        The unique identifier of the activity. Higher IDs are newer activities.
+    usuario_id : int
+        The ID of the user who did the activity.
+    tipo : TipoActividad
+        The kind of activity.
+    titulo_id : int
+        The ID of the title the activity is about.
+    referencia_id : int
+        The ID of the review, watchlist entry or comment of the activity.
+    detalle : dict
+        Extra data shown in the feed, such as the score of a review or the status of a watchlist entry.
+    fecha : datetime
+        When the activity happened (UTC).
+    difundida : bool
+        Whether the activity was copied to the feeds of the author's followers.
+    """
+    __tablename__ = 'Actividades'
+    __table_args__ = (
+        db.Index('ix_Actividades_usuario_id_difundida_id', 'usuario_id', 'difundida', 'id'),
+        db.Index('ix_Actividades_tipo_referencia_id', 'tipo', 'referencia_id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(db.Integer, nullable=False)
+    tipo = db.Column(db.Enum(TipoActividad), nullable=False)
+    titulo_id = db.Column(db.Integer, nullable=False)
+    referencia_id = db.Column(db.Integer, nullable=False)
+    detalle = db.Column(db.JSON, nullable=True)
+    fecha = db.Column(db.DateTime, nullable=False)
+    difundida = db.Column(db.Boolean, nullable=False, default=True)
+
+class EntradaFeed(db.Model, Serializable):
+    """
+    Class used to represent an activity in the feed of a user.
+    ---
+    tags:
+    - Feed
+    summary: Represents an activity copied to the feed of one of the author's followers.
+    description: This class stores which activities are in the feed of each user. The primary key is `(usuario_id, actividad_id)`, so a page of a feed is a single range scan of the primary key index in descending `actividad_id` order.
+
+    Attributes:
+    -----------
+    usuario_id : int
+        The ID of the user who owns the feed.
+    actividad_id : int
+        The ID of the activity.
+    """
+    __tablename__ = 'EntradasFeed'
+    __table_args__ = (
+        db.Index('ix_EntradasFeed_actividad_id', 'actividad_id'),
+    )
+    usuario_id = db.Column(db.Integer, primary_key=True)
+    actividad_id = db.Column(db.Integer, primary_key=True)
+
+class TituloSimilar(db.Model, Serializable):
+    """
+    Class used to store a precomputed recommendation of a title.
+    ---
+    tags:
+    - Titles
+    summary: Represents a title similar to another one ("users who watched X also watched").
+    description: This class stores the most similar titles of each title, computed from the reviews and watchlists of the users with `flask recommendations rebuild` and kept up to date with `flask recommendations refresh`. The primary key is `(titulo_id, posicion)`, so the recommendations of a title are read in order with a single range scan.
+
+    Attributes:
+    -----------
+    titulo_id : int
+        The ID of the title.
+    posicion : int
+        The rank of the recommendation, starting at 0 for the most similar title.
+    similar_id : int
+        The ID of the recommended title.
+    puntaje : float
+        The cosine similarity between both titles, between 0 and 1.
+    """
+    __tablename__ = 'TitulosSimilares'
+    titulo_id = db.Column(db.Integer, primary_key=True)
+    posicion = db.Column(db.Integer, primary_key=True)
+    similar_id = db.Column(db.Integer, nullable=False)
+    puntaje = db.Column(db.Float, nullable=False)
+
+class MarcaAgua(db.Model, Serializable):
+    """
+    Class used to store how far a batch job has processed a table.
+    ---
+    tags:
+    - Jobs
+    summary: Represents the watermark of an incremental job.
+    description: This class stores, for each incremental job, the highest ID of the rows it has already processed, so the next run only reads newer rows.
+
+    Attributes:
+    -----------
+    nombre : str
+        The name of the job and table, e.g. 'recomendaciones.resenias'.
+    valor : int
+        The highest ID already processed.
+    actualizada : datetime
+        When the watermark was last moved (UTC).
+    """
+    __tablename__ = 'MarcasAgua'
+    nombre = db.Column(db.String(100), primary_key=True)
+    valor = db.Column(db.Integer, nullable=False, default=0)
+    actualizada = db.Column(db.DateTime, nullable=False)
+
+class EventoProgreso(db.Model, Serializable):
+    """
+    Class used to record a change in the number of episodes a user watched of a title.
+    ---
+    tags:
+    - Analytics
+    summary: Represents a change of `cantidad_visto` of a watchlist entry.
+    description: This class is an append-only log written together with each change of `Seguimiento.cantidad_visto`. `Seguimiento` rows are updated in place, so the analytics job reads this log instead to add the episodes watched each day to `ResumenDiarioTitulo`.
+
+    Attributes:
+    -----------
+    id : int
+        The unique identifier of the event. Higher IDs are newer events.
+    titulo_id : int
+        The ID of the title.
+    delta : int
+        How many episodes were added to `cantidad_visto`. Decreases are not logged.
+    fecha : date
+        The day of the change (UTC).
+    """
+    __tablename__ = 'EventosProgreso'
+    id = db.Column(db.Integer, primary_key=True)
+    titulo_id = db.Column(db.Integer, nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+    fecha = db.Column(db.Date, nullable=False)
+
+class EventoBajaResenia(db.Model, Serializable):
+    """
+    Class used to record the deletion of a review.
+    ---
+    tags:
+    - Analytics
+    summary: Represents a deleted review.
+    description: This class is an append-only log written together with each deletion of a `Reseña`. The analytics job reads it to subtract reviews it had already added to `ResumenDiarioTitulo`, so the rollups do not need a rebuild after a review is deleted.
+
+    Attributes:
+    -----------
+    id : int
+        The unique identifier of the event. Higher IDs are newer events.
+    resenia_id : int
+        The ID the deleted review had.
+    titulo_id : int
+        The ID of the title of the review.
+    puntuacion : int
+        The score of the review.
+    fecha : date
+        The publication day of the review, which is the day it was counted on.
+    """
+    __tablename__ = 'EventosBajaResenias'
+    id = db.Column(db.Integer, primary_key=True)
+    resenia_id = db.Column(db.Integer, nullable=False)
+    titulo_id = db.Column(db.Integer, nullable=False)
+    puntuacion = db.Column(db.Integer, nullable=False)
+    fecha = db.Column(db.Date, nullable=False)
+
+class ResumenDiarioTitulo(db.Model, Serializable):
+    """
+    Class used to store the daily activity of a title for its producer.
+    ---
+    tags:
+    - Analytics
+    summary: Represents the pre-aggregated activity of a title on one day.
+    description: This class stores, for each title and day, the number of reviews and the sum of their scores, the new watchlist entries and the episodes watched. It is filled incrementally by `flask analytics refresh` and can be rebuilt with `flask analytics rebuild`. The `(productora_id, dia)` index lets a producer's analytics be read without touching the reviews or watchlists.
+
+    Attributes:
+    -----------
+    titulo_id : int
+        The ID of the title.
+    dia : date
+        The day (UTC).
+    productora_id : int
+        The ID of the producer of the title.
+    resenias : int
+        The number of reviews published that day.
+    suma_puntuaciones : int
+        The sum of the scores of those reviews.
+    nuevos_seguimientos : int
+        The number of users who added the title to their watchlist that day.
+    episodios_vistos : int
+        The number of episodes of the title marked as watched that day.
+    """
+    __tablename__ = 'ResumenesDiariosTitulos'
+    __table_args__ = (
+        db.Index('ix_ResumenesDiariosTitulos_productora_id_dia', 'productora_id', 'dia'),
+    )
+    titulo_id = db.Column(db.Integer, primary_key=True)
+    dia = db.Column(db.Date, primary_key=True)
+    productora_id = db.Column(db.Integer, nullable=False)
+    resenias = db.Column(db.Integer, nullable=False, default=0)
+    suma_puntuaciones = db.Column(db.Integer, nullable=False, default=0)
+    nuevos_seguimientos = db.Column(db.Integer, nullable=False, default=0)
+    episodios_vistos = db.Column(db.Integer, nullable=False, default=0)
+
+for model in (Comentario, Episodio, Impresion, Productora, Usuario, Reseña, Seguimiento, Titulo, EstadisticaTitulo,
+              ContadorImpresiones, Relacion, TokenRevocado, Actividad, EntradaFeed, TituloSimilar, MarcaAgua,
+              EventoProgreso, EventoBajaResenia, ResumenDiarioTitulo):
+    model.compile_serializer()
@@ -0,0 +1,35 @@
+import json
+
+NDJSON_MIMETYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+
+def is_ndjson(request) -> bool:
+    """
+    Returns True if the body of `request` is declared as newline delimited JSON.
+    """
+    return request.mimetype in NDJSON_MIMETYPES
+
+def iter_ndjson(stream):
+    """
+    Parses a newline delimited JSON stream one line at a time, without reading the
+    whole body into memory. Blank lines are skipped.
+
+    Yields
+    ------
+    tuple
+        `(line number, parsed object, error message)`, where exactly one of the last
+        two is None.
+    """
+    for number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield number, json.loads(line), None
+        except ValueError as e:
+            yield number, None, f'JSON invalido: {e}'
+
+def dumps_line(data) -> str:
+    """
+    Serializes `data` as one line of newline delimited JSON.
+    """
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':')) + '\n'
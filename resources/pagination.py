@@ -0,0 +1,92 @@
+import base64
+import json
+
+from flask import current_app, request
+from flask_restful import abort
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def encode_cursor(value) -> str:
+    """
+    Encodes the key of the last row of a page into an opaque cursor.
+    """
+    raw = json.dumps([value], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+def decode_cursor(cursor: str):
+    """
+    Decodes a cursor created by `encode_cursor`. Every paginated key is an integer ID
+    or position, so any other value is rejected before it reaches a query.
+
+    Raises
+    ------
+    ValueError
+        If the cursor is malformed or its key is not an integer.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        value = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(value, list) or len(value) != 1:
+        raise ValueError('Invalid cursor')
+    if not isinstance(value[0], int) or isinstance(value[0], bool):
+        raise ValueError('Invalid cursor')
+    return value[0]
+
+def page_args():
+    """
+    Reads the `after` and `limit` query parameters of the current request.
+
+    `limit` defaults to the `PAGE_SIZE` setting and is capped at `MAX_PAGE_SIZE`.
+    Invalid values abort the request with a 400 response.
+
+    Returns
+    -------
+    tuple
+        The decoded key to continue after (None for the first page) and the page size.
+    """
+    max_size = current_app.config.get('MAX_PAGE_SIZE', MAX_PAGE_SIZE)
+    limit = request.args.get('limit', current_app.config.get('PAGE_SIZE', DEFAULT_PAGE_SIZE))
+    try:
+        limit = int(limit)
+    except ValueError:
+        abort(400, error='Invalid limit')
+    if limit < 1:
+        abort(400, error='Invalid limit')
+
+    after = request.args.get('after')
+    if after is not None:
+        try:
+            after = decode_cursor(after)
+        except ValueError:
+            abort(400, error='Invalid cursor')
+    return after, min(limit, max_size)
+
+def keyset_page(query, key_column, after, limit):
+    """
+    Fetches one page of `query` ordered by `key_column`, continuing after the key `after`.
+
+    `key_column` must be unique within the rows of `query`, and should be covered by an
+    index together with the query's filters so each page is a single range scan.
+
+    Returns
+    -------
+    tuple
+        The rows of the page and the cursor of the next page, or None if this is the last one.
+    """
+    if after is not None:
+        query = query.filter(key_column > after)
+    rows = query.order_by(key_column).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(getattr(rows[-1], key_column.key))
+
+def paginate(query, key_column):
+    """
+    Shortcut for `keyset_page` using the pagination parameters of the current request.
+    """
+    after, limit = page_args()
+    return keyset_page(query, key_column, after, limit)
@@ -1,14 +1,87 @@
-from flask import Blueprint, request, make_response, redirect, url_for, session
+from datetime import date, datetime, timedelta, timezone
+from flask import Blueprint, Response, current_app, request, make_response, redirect, url_for, session, stream_with_context
 from flask_restful import Api, Resource
 from flask.templating import render_template
-from models.models import Titulo, DataBase, Productora
-from auth import generate_token, token_required
+from sqlalchemy.exc import SQLAlchemyError
+from models.models import Episodio, TipoTitulo, Titulo, DataBase, Productora
+from auth import token_required
+from resources.ndjson import dumps_line, iter_ndjson
+from resources.tituloAPI import parse_duracion, parse_episode, parse_title
+from services.analytics import resumen_productora
+from services.auth_service import end_session, login, signup
 
 productoraAPI_bp = Blueprint('productora', __name__)
 productora_api = Api(productoraAPI_bp)
 
 db = DataBase().db
 
+CATALOG_IMPORT_CHUNK = 200
+ANALYTICS_DEFAULT_DAYS = 30
+ANALYTICS_MAX_DAYS = 366
+
+def import_catalog_chunk(productora_id: int, lines):
+    """
+    Creates the titles (and their episodes) of a chunk of catalog lines in a single
+    transaction.
+
+    Each line is a title object that may contain an `episodios` list. A line with an
+    invalid title or episode is skipped as a whole. Movies without episodes get a
+    single episode, as when they are created through `TituloAPI.post`.
+
+    Parameters
+    ----------
+    productora_id : int
+        The producer that owns the titles.
+    lines : list
+        Pairs of `(line number, parsed object)`.
+
+    Returns
+    -------
+    tuple
+        The number of titles and episodes created, and the list of per-line errors.
+    """
+    errors = []
+    valid = []
+    for number, data in lines:
+        try:
+            titulo = parse_title(data)
+            episodios = data.get('episodios', [])
+            if not isinstance(episodios, list):
+                raise ValueError('episodios debe ser una lista')
+            episodios = [parse_episode(episodio, None) for episodio in episodios]
+            ordenes = [episodio['orden'] for episodio in episodios]
+            if len(set(ordenes)) != len(ordenes):
+                raise ValueError('orden repetido en los episodios')
+            if not episodios and titulo['tipo'] == TipoTitulo.PELICULA:
+                episodios = [{
+                    'titulo': titulo['titulo'],
+                    'duracion': parse_duracion(data.get('duracion', 0)),
+                    'orden': 1,
+                    'fecha_emision': titulo['fecha_inicio']
+                }]
+        except ValueError as e:
+            errors.append({'linea': number, 'error': str(e)})
+            continue
+        valid.append((number, Titulo(productora_id=productora_id, **titulo), episodios))
+
+    if not valid:
+        return 0, 0, errors
+
+    try:
+        db.session.add_all([titulo for _, titulo, _ in valid])
+        db.session.flush()
+        rows = [{**episodio, 'titulo_id': titulo.id} for _, titulo, episodios in valid for episodio in episodios]
+        if rows:
+            db.session.execute(db.insert(Episodio), rows)
+        db.session.commit()
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        errors.extend({'linea': number, 'error': f'Error de base de datos: {e.__class__.__name__}'}
+                      for number, _, _ in valid)
+        return 0, 0, sorted(errors, key=lambda error: error['linea'])
+
+    return len(valid), len(rows), errors
+
 class ProducerAPI(Resource):
     """
     Handles login operations for producers.
@@ -42,25 +115,7 @@ class ProducerAPI(Resource):
           500:
             description: Server error.
         """
-        data = request.get_json()
-        if not 'email' in data or not 'password' in data:
-          return {'error': 'Falta data'}, 400
-        
-        email = data['email']
-        password = data['password']
-
-        if not email or not password:
-          return {'error': 'Falta data'}, 400
-
-        login_info = Productora.query.filter_by(email=email).first()
-
-        if not login_info or not login_info.check_password(password):
-            return {'error': 'Login info incorrect.'}, 400
-        
-        token = generate_token(login_info.nombre_usuario, 'producer')
-        session['auth_token'] = token
-
-        return {'message': 'Producer authorized'}, 200
+        return login('producer', request.get_json())
     
     def post(self):
         """
@@ -94,33 +149,7 @@ class ProducerAPI(Resource):
           500:
             description: Server error.
         """
-        data = request.get_json()
-        if 'username' not in data or not 'email' in data or not 'password' in data:
-            return {'error': 'Falta data'}, 400
-        
-        email = data['email']
-        password = data['password']
-        username = data['username']
-
-        if not username or not email or not password:
-            return {'error': 'Falta data'}, 400
-
-        if Productora.query.filter_by(email=email).first():
-            return {'error': 'Email ya esta registrado'}, 400
-
-        if Productora.query.filter_by(nombre_usuario=username).first():
-            return {'error': 'Username ya existe'}, 400
-
-        new_login = Productora(nombre_usuario=username, email=email)
-        new_login.set_password(password)
-
-        db.session.add(new_login)
-        db.session.commit()
-
-        token = generate_token(new_login.nombre_usuario, 'producer')
-        session['auth_token'] = token
-
-        return {'message': 'Usuario registrado'}, 200
+        return signup('producer', request.get_json())
     
     def delete(self):
         """
@@ -129,16 +158,132 @@ class ProducerAPI(Resource):
         tags:
           - Producers
         summary: Log out a producer
-        description: Logs out the producer and clears their session token.
+        description: Logs out the producer, clears their session token and revokes it.
         responses:
           302:
             description: Redirect to the home page after logout.
           500:
             description: Server error.
         """
-        session.pop('auth_token', None)
+        end_session()
         return redirect(url_for('index'))
     
+class CatalogoImportAPI(Resource):
+    """
+    Import a producer's back catalog from a newline delimited JSON upload.
+    """
+
+    @token_required(user_type='producer', identity=True)
+    def post(self, current_user, identity):
+        """
+        Import a catalog.
+        ---
+        tags:
+          - Producers
+        summary: Import titles and episodes
+        description: Reads one title per line from an NDJSON body without buffering the whole upload, and creates the titles and their nested episodes in transactions of 200 lines. The response is streamed as NDJSON too, with a `progreso` line after each transaction, an `error` line for every line that could not be imported, and a final `resumen` line. Requires authentication as a producer.
+        requestBody:
+          required: true
+          content:
+            application/x-ndjson:
+              schema:
+                type: string
+                description: One title per line, with the same fields as the title creation endpoint and an optional `episodios` list.
+                example: '{"titulo": "My Show", "fecha_inicio": "2020-01-01", "fecha_fin": "2021-01-01", "tipo": "SERIE", "episodios": [{"titulo": "Pilot", "duracion": 45, "orden": 1, "fecha_emision": "2020-01-01"}]}'
+        responses:
+          200:
+            description: NDJSON stream with the progress of the import.
+            content:
+              application/x-ndjson:
+                schema:
+                  type: string
+          401:
+            description: Unauthorized access.
+        """
+        productora_id = identity.id
+        chunk_size = current_app.config.get('CATALOG_IMPORT_CHUNK', CATALOG_IMPORT_CHUNK)
+        stream = request.stream
+
+        def generate():
+            totals = {'lineas': 0, 'titulos': 0, 'episodios': 0, 'errores': 0}
+            chunk = []
+
+            def flush():
+                titulos, episodios, errors = import_catalog_chunk(productora_id, chunk)
+                chunk.clear()
+                totals['titulos'] += titulos
+                totals['episodios'] += episodios
+                totals['errores'] += len(errors)
+                for error in errors:
+                    yield dumps_line({'error': error})
+                yield dumps_line({'progreso': dict(totals)})
+
+            for number, data, error in iter_ndjson(stream):
+                totals['lineas'] += 1
+                if error:
+                    totals['errores'] += 1
+                    yield dumps_line({'error': {'linea': number, 'error': error}})
+                    continue
+                chunk.append((number, data))
+                if len(chunk) >= chunk_size:
+                    yield from flush()
+            if chunk:
+                yield from flush()
+            yield dumps_line({'resumen': totals})
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+class AnaliticaAPI(Resource):
+    """
+    Read the analytics of the authenticated producer's catalog.
+    """
+
+    @token_required(user_type='producer', identity=True)
+    def get(self, current_user, identity):
+        """
+        Get catalog analytics.
+        ---
+        tags:
+          - Producers
+        summary: Get the daily activity of the producer's titles
+        description: Returns the reviews, average score, new watchlist entries and episodes watched of the producer's titles, in total, per day and per title. The figures come from daily rollups updated by `flask analytics refresh`, so activity newer than its last run is not included yet. Requires authentication as a producer.
+        parameters:
+          - in: query
+            name: desde
+            required: false
+            schema:
+              type: string
+              format: date
+            description: First day of the period (defaults to 29 days before `hasta`).
+          - in: query
+            name: hasta
+            required: false
+            schema:
+              type: string
+              format: date
+            description: Last day of the period (defaults to today, UTC).
+        responses:
+          200:
+            description: The `totales`, `dias` and `titulos` of the period.
+          400:
+            description: Invalid dates, or a period longer than ANALYTICS_MAX_DAYS days.
+          401:
+            description: Unauthorized access.
+        """
+        try:
+            hasta = (date.fromisoformat(request.args['hasta']) if 'hasta' in request.args
+                     else datetime.now(timezone.utc).date())
+            desde = (date.fromisoformat(request.args['desde']) if 'desde' in request.args
+                     else hasta - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1))
+        except ValueError:
+            return {'error': 'Fecha invalida'}, 400
+        max_days = current_app.config.get('ANALYTICS_MAX_DAYS', ANALYTICS_MAX_DAYS)
+        if desde > hasta or (hasta - desde).days >= max_days:
+            return {'error': 'Periodo invalido'}, 400
+
+        return {'desde': desde.isoformat(), 'hasta': hasta.isoformat(),
+                **resumen_productora(identity.id, desde, hasta)}, 200
+
 class ProductoraProfile(Resource):
     """
     Handles the producer's profile view and updates.
@@ -192,4 +337,6 @@ class ProductoraProfile(Resource):
         return {'message': 'hi'}, 201
     
 productora_api.add_resource(ProducerAPI, '/')
+productora_api.add_resource(CatalogoImportAPI, '/catalogo/import')
+productora_api.add_resource(AnaliticaAPI, '/analytics')
 #productora_api.add_resource(ProductoraProfile, '/')
\ No newline at end of file
@@ -1,8 +1,18 @@
 from datetime import datetime, timezone
-from flask import Blueprint, jsonify, request, make_response, redirect, url_for, session
+from flask import Blueprint, jsonify, request, make_response, redirect, url_for, session, current_app
 from flask_restful import Api, Resource
-from models.models import Comentario, Impresion, Titulo, Usuario, Reseña, DataBase, Productora, TipoTitulo, Episodio
-from auth import token_required
+from sqlalchemy.exc import IntegrityError
+from models.models import Comentario, Impresion, Titulo, Usuario, Reseña, DataBase, Productora, TipoTitulo, Episodio, EstadisticaTitulo, ContadorImpresiones, TipoActividad
+from auth import session_identity, token_required
+from resources.ndjson import is_ndjson, iter_ndjson
+from resources.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, page_args, paginate
+from services.analytics import registrar_baja_resenia
+from services.feed import eliminar_actividades, registrar_actividad
+from services.impressions import obtener_contadores, registrar_impresion
+from services.ratings import PUNTUACION_MAXIMA, PUNTUACION_MINIMA, obtener_resumen, puntuacion_valida, registrar_puntuacion
+from services.recommendations import obtener_similares
+from services.search import buscar_titulos
+from services.trending import get_trending
 
 titulo_bp = Blueprint('titulo', __name__)
 titulo_api = Api(titulo_bp)
@@ -17,13 +27,153 @@ def create_epsidode(titulo: str, duracion: int, orden: int, fecha_emision: datet
                            titulo_id=titulo_id)
     db.session.add(new_episode)
 
+MAX_BULK_EPISODES = 1000
+
+def parse_duracion(duracion) -> int:
+    """
+    Validates the duration of an episode, a non-negative integer, and returns it.
+
+    Raises
+    ------
+    ValueError
+        If the duration is not a non-negative integer.
+    """
+    if not isinstance(duracion, int) or isinstance(duracion, bool) or duracion < 0:
+        raise ValueError('duracion invalida')
+    return duracion
+
+def parse_episode(data, titulo_id: int):
+    """
+    Validates the JSON representation of an episode and returns the column values
+    of the new `Episodio`.
+
+    Raises
+    ------
+    ValueError
+        If a field is missing or has an invalid value.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('El episodio debe ser un objeto')
+    missing = [key for key in ('titulo', 'duracion', 'orden', 'fecha_emision') if key not in data]
+    if missing:
+        raise ValueError(f'Falta data: {", ".join(missing)}')
+    if not isinstance(data['titulo'], str) or not data['titulo']:
+        raise ValueError('titulo invalido')
+    parse_duracion(data['duracion'])
+    if not isinstance(data['orden'], int) or isinstance(data['orden'], bool) or data['orden'] < 1:
+        raise ValueError('orden invalido')
+    try:
+        fecha_emision = datetime.fromisoformat(data['fecha_emision']).date()
+    except (TypeError, ValueError):
+        raise ValueError('fecha_emision invalida')
+    return {
+        'titulo': data['titulo'],
+        'duracion': data['duracion'],
+        'orden': data['orden'],
+        'fecha_emision': fecha_emision,
+        'titulo_id': titulo_id
+    }
+
+def parse_title(data):
+    """
+    Validates the JSON representation of a title and returns the column values of
+    the new `Titulo`, except for `productora_id`.
+
+    Raises
+    ------
+    ValueError
+        If a field is missing or has an invalid value.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('El titulo debe ser un objeto')
+    missing = [key for key in ('titulo', 'fecha_inicio', 'fecha_fin', 'tipo') if key not in data]
+    if missing:
+        raise ValueError(f'Falta data: {", ".join(missing)}')
+    if not isinstance(data['titulo'], str) or not data['titulo']:
+        raise ValueError('titulo invalido')
+    try:
+        fecha_inicio = datetime.fromisoformat(data['fecha_inicio']).date()
+        fecha_fin = datetime.fromisoformat(data['fecha_fin']).date()
+    except (TypeError, ValueError):
+        raise ValueError('fecha invalida')
+    try:
+        tipo = TipoTitulo(data['tipo'])
+    except ValueError:
+        raise ValueError('tipo invalido')
+    return {
+        'titulo': data['titulo'],
+        'fecha_inicio': fecha_inicio,
+        'fecha_fin': fecha_fin,
+        'tipo': tipo
+    }
+
+def existing_orders(titulo_id: int, ordenes, chunk_size: int = 500):
+    """
+    Returns which of `ordenes` are already taken by episodes of the title, using one
+    query per `chunk_size` values.
+    """
+    ordenes = list(ordenes)
+    taken = set()
+    for start in range(0, len(ordenes), chunk_size):
+        chunk = ordenes[start:start + chunk_size]
+        taken.update(db.session.execute(
+            db.select(Episodio.orden).where(Episodio.titulo_id == titulo_id, Episodio.orden.in_(chunk))
+        ).scalars())
+    return taken
+
+def insert_episodes(titulo_id: int, items):
+    """
+    Validates a batch of episodes of a title and inserts the valid ones with a single
+    executemany in the current transaction. The caller is responsible for committing.
+
+    Parameters
+    ----------
+    titulo_id : int
+        The title the episodes belong to.
+    items : iterable
+        Pairs of `(reference, data)`, where reference identifies the item in the
+        error report (e.g. its index or line number).
+
+    Returns
+    -------
+    tuple
+        The number of inserted episodes and the list of per-item errors.
+    """
+    errors = []
+    rows = {}
+    for reference, data in items:
+        try:
+            row = parse_episode(data, titulo_id)
+        except ValueError as e:
+            errors.append({'item': reference, 'error': str(e)})
+            continue
+        if row['orden'] in rows:
+            errors.append({'item': reference, 'error': 'orden repetido en el lote'})
+            continue
+        rows[row['orden']] = (reference, row)
+
+    for orden in existing_orders(titulo_id, rows):
+        reference, _ = rows.pop(orden)
+        errors.append({'item': reference, 'error': 'Episodio ya existe'})
+
+    if rows:
+        db.session.execute(db.insert(Episodio), [row for _, row in rows.values()])
+    errors.sort(key=lambda error: error['item'])
+    return len(rows), errors
+
+def requested_fields():
+    fields = request.args.get('fields')
+    if not fields:
+        return None
+    return tuple(field for field in fields.split(',') if field)
+
 class TituloAPI(Resource):
     """
     Manage titles for a production company.
     """
 
-    @token_required(user_type='producer')
-    def post(self, current_user):
+    @token_required(user_type='producer', identity=True)
+    def post(self, current_user, identity):
         """
         Create a new title.
         ---
@@ -87,8 +237,6 @@ class TituloAPI(Resource):
         """
         data = request.get_json()
 
-        productora = Productora.query.filter_by(nombre_usuario=current_user).first()
-
         fecha_inicio = datetime.fromisoformat(data['fecha_inicio']).date()
         fecha_fin = datetime.fromisoformat(data['fecha_fin']).date()
         titulo = data['titulo']
@@ -99,7 +247,7 @@ class TituloAPI(Resource):
             fecha_fin=fecha_fin,
             titulo=titulo, 
             tipo=tipo,
-            productora_id=productora.id
+            productora_id=identity.id
         )
         
         db.session.add(nuevo_titulo)
@@ -144,6 +292,9 @@ class TituloAPI(Resource):
                     titulo:
                       type: object
                       description: Serialized title data.
+                    puntuacion:
+                      type: object
+                      description: Number of reviews, average score and histogram of scores of the title.
           404:
             description: Title not found.
             content:
@@ -162,10 +313,10 @@ class TituloAPI(Resource):
         
         data = titulo.serialize()
 
-        return {'titulo': data}, 200
+        return {'titulo': data, 'puntuacion': obtener_resumen(titulo.id)}, 200
 
-    @token_required(user_type='producer')
-    def delete(self, current_user, titulo_id):
+    @token_required(user_type='producer', identity=True)
+    def delete(self, current_user, identity, titulo_id):
         """
         Delete a title.
         ---
@@ -223,23 +374,172 @@ class TituloAPI(Resource):
         if not titulo:
             return {'error': 'Titulo no encontrado'}, 404
         
-        productora = Productora.query.filter_by(nombre_usuario=current_user).first()
-        
-        if titulo.productora_id != productora.id:
+        if titulo.productora_id != identity.id:
             return {'error': 'No Autorizado'}, 401
         
         db.session.delete(titulo)
+        EstadisticaTitulo.query.filter_by(titulo_id=titulo.id).delete()
         db.session.commit()
 
         return {'message': 'Titulo eliminado'}, 200
     
+class BusquedaAPI(Resource):
+    """
+    Search titles by name.
+    """
+
+    def get(self):
+        """
+        Search titles.
+        ---
+        tags:
+          - Titles
+        summary: Search titles
+        description: Full text search over the names of the titles. Every word of the query is matched as a prefix, and results are ordered by relevance.
+        parameters:
+          - in: query
+            name: q
+            required: true
+            schema:
+              type: string
+            example: "breaking ba"
+            description: The text to search for.
+          - in: query
+            name: tipo
+            required: false
+            schema:
+              type: string
+              enum: [PELICULA, SERIE]
+            description: Only return titles of this type.
+          - in: query
+            name: limit
+            required: false
+            schema:
+              type: integer
+            description: Maximum number of results (default 50, capped at 200).
+        responses:
+          200:
+            description: Matching titles, best ranked first.
+            content:
+              application/json:
+                schema:
+                  type: object
+                  properties:
+                    titulos:
+                      type: array
+                      items:
+                        type: object
+                        description: Serialized title data.
+          400:
+            description: Missing query, or invalid type or limit.
+            content:
+              application/json:
+                schema:
+                  type: object
+                  properties:
+                    error:
+                      type: string
+                      example: "Falta el parametro q"
+        """
+        query = request.args.get('q', '')
+        if not query.strip():
+            return {'error': 'Falta el parametro q'}, 400
+
+        tipo = request.args.get('tipo')
+        if tipo is not None:
+            try:
+                tipo = TipoTitulo(tipo)
+            except ValueError:
+                return {'error': 'Tipo invalido'}, 400
+
+        try:
+            limit = int(request.args.get('limit', current_app.config.get('PAGE_SIZE', DEFAULT_PAGE_SIZE)))
+        except ValueError:
+            return {'error': 'Invalid limit'}, 400
+        if limit < 1:
+            return {'error': 'Invalid limit'}, 400
+        limit = min(limit, current_app.config.get('MAX_PAGE_SIZE', MAX_PAGE_SIZE))
+
+        titulos = buscar_titulos(query, tipo, limit)
+        return {'titulos': Titulo.serialize_many(titulos)}, 200
+
+class TendenciasAPI(Resource):
+    """
+    Rank the titles with the most recent activity.
+    """
+
+    def get(self):
+        """
+        Get trending titles.
+        ---
+        tags:
+          - Titles
+        summary: Get the trending titles
+        description: Returns the titles with the most recent reviews, watchlist entries and review impressions. Each event counts less as it gets older, halving its weight every TRENDING_HALF_LIFE_HOURS. The ranking is refreshed in the background every TRENDING_REFRESH_INTERVAL seconds, so new activity can take that long to show up.
+        parameters:
+          - in: query
+            name: limit
+            required: false
+            schema:
+              type: integer
+            description: Maximum number of titles (defaults to PAGE_SIZE, capped by MAX_PAGE_SIZE and TRENDING_SIZE).
+        responses:
+          200:
+            description: The trending titles, best first, each with its serialized `titulo` and its current `puntaje`.
+          400:
+            description: Invalid limit.
+        """
+        _, limit = page_args()
+        return {'titulos': list(get_trending().top(limit))}, 200
+
+class SimilaresAPI(Resource):
+    """
+    Recommend titles similar to a title.
+    """
+
+    def get(self, titulo_id):
+        """
+        Get similar titles.
+        ---
+        tags:
+          - Titles
+        summary: Users who watched this title also watched
+        description: Returns the titles most often reviewed or added to the watchlist by the same users as this title, most similar first. The recommendations are precomputed with `flask recommendations rebuild` and kept up to date with `flask recommendations refresh`.
+        parameters:
+          - in: path
+            name: titulo_id
+            required: true
+            schema:
+              type: integer
+            description: The ID of the title.
+          - in: query
+            name: limit
+            required: false
+            schema:
+              type: integer
+            description: Maximum number of titles (defaults to PAGE_SIZE, capped by MAX_PAGE_SIZE).
+        responses:
+          200:
+            description: The similar titles, each with its serialized `titulo` and a `puntaje` between 0 and 1.
+          400:
+            description: Invalid limit.
+          404:
+            description: Title not found.
+        """
+        if db.session.get(Titulo, titulo_id) is None:
+            return {'error': 'Titulo no encontrado'}, 404
+
+        _, limit = page_args()
+        return {'similares': [{'titulo': titulo.serialize(), 'puntaje': puntaje}
+                              for titulo, puntaje in obtener_similares(titulo_id, limit)]}, 200
+
 class EpisodioAPI(Resource):
     """
     Manage episodes of a title.
     """
 
-    @token_required('producer')
-    def post(self, current_user, titulo_id):
+    @token_required('producer', identity=True)
+    def post(self, current_user, identity, titulo_id):
         """
         Create a new episode.
         ---
@@ -304,12 +604,11 @@ class EpisodioAPI(Resource):
         """
         data = request.get_json()
 
-        productora = Productora.query.filter_by(nombre_usuario=current_user).first()
         titulo = Titulo.query.filter_by(id=titulo_id).first()
 
         if not titulo:
             return {'error': 'Title not found'}, 404
-        if titulo.productora_id != productora.id:
+        if titulo.productora_id != identity.id:
             return {'error': 'Not authorized'}, 401
 
         ep_titulo = data['titulo']
@@ -321,8 +620,12 @@ class EpisodioAPI(Resource):
             return {'error': 'Episodio ya existe'}, 403
 
         create_epsidode(ep_titulo, duracion, orden, fecha_emision, titulo.id)
-
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Otro pedido creo el mismo episodio entre la verificacion y el insert.
+            db.session.rollback()
+            return {'error': 'Episodio ya existe'}, 403
 
         return {'message': 'Episodio añadido'}, 200
 
@@ -347,6 +650,24 @@ class EpisodioAPI(Resource):
             schema:
               type: integer
             description: The order of the specific episode to retrieve.
+          - in: query
+            name: fields
+            required: false
+            schema:
+              type: string
+            description: Comma separated list of fields to include in each serialized episode (e.g. "id,titulo").
+          - in: query
+            name: after
+            required: false
+            schema:
+              type: string
+            description: Opaque cursor returned as `next` by the previous page.
+          - in: query
+            name: limit
+            required: false
+            schema:
+              type: integer
+            description: Maximum number of episodes per page (default 50, capped at 200).
         responses:
           200:
             description: Episodes retrieved successfully.
@@ -360,6 +681,12 @@ class EpisodioAPI(Resource):
                       items:
                         type: object
                         description: Serialized episode data.
+                    next:
+                      type: string
+                      nullable: true
+                      description: Cursor of the next page, or null if this is the last one.
+          400:
+            description: Invalid `after` cursor or `limit`.
           404:
             description: Title or episode not found.
         """
@@ -369,8 +696,8 @@ class EpisodioAPI(Resource):
             return {'error': 'Title not found'}, 404
 
         if orden is None:
-            episodios = Episodio.query.filter_by(titulo_id=titulo.id)
-            return {'episodios': [episodio.serialize() for episodio in episodios]}, 200
+            episodios, next_cursor = paginate(Episodio.query.filter_by(titulo_id=titulo.id), Episodio.orden)
+            return {'episodios': Episodio.serialize_many(episodios, requested_fields()), 'next': next_cursor}, 200
 
         episodio = Episodio.query.filter_by(titulo_id=titulo.id, orden=orden).first()
         if not episodio:
@@ -378,8 +705,8 @@ class EpisodioAPI(Resource):
 
         return {'episodio': episodio.serialize()}, 200
 
-    @token_required(user_type='producer')
-    def delete(self, current_user, titulo_id, orden):
+    @token_required(user_type='producer', identity=True)
+    def delete(self, current_user, identity, titulo_id, orden):
         """
         Delete an episode.
         ---
@@ -438,18 +765,16 @@ class EpisodioAPI(Resource):
                       type: string
                       example: "Episodio no encontrado"
         """
-        episodio = Episodio.query.filter_by(titulo_id=titulo_id, orden=orden).first()
+        row = (db.session.query(Episodio, Titulo.productora_id)
+               .join(Titulo, Titulo.id == Episodio.titulo_id)
+               .filter(Episodio.titulo_id == titulo_id, Episodio.orden == orden)
+               .first())
 
-        if not episodio:
+        if not row:
             return {'error': 'Episodio no encontrado'}, 404
 
-        titulo = Titulo.query.filter_by(id=titulo_id).first()
-        productora = Productora.query.filter_by(nombre_usuario=current_user).first()
-
-        if not titulo or not productora:
-            return {'error': 'Something went wrong'}, 404
-
-        if titulo.productora_id != productora.id:
+        episodio, productora_id = row
+        if productora_id != identity.id:
             return {'error': 'No Autorizado'}, 401
 
         db.session.delete(episodio)
@@ -457,13 +782,131 @@ class EpisodioAPI(Resource):
 
         return {'message': 'Episodio eliminado'}, 200
     
+class EpisodioBulkAPI(Resource):
+    """
+    Create many episodes of a title in a single request.
+    """
+
+    @token_required('producer', identity=True)
+    def post(self, current_user, identity, titulo_id):
+        """
+        Create a batch of episodes.
+        ---
+        tags:
+          - Episodes
+        summary: Add many episodes
+        description: Create up to 1000 episodes of a title in a single transaction. The body is either a JSON array of episodes or newline delimited JSON (`application/x-ndjson`) with one episode per line. Invalid items, and items whose order already exists, are reported individually and do not prevent the rest of the batch from being created. Requires authentication as the producer that owns the title.
+        parameters:
+          - in: path
+            name: titulo_id
+            required: true
+            schema:
+              type: integer
+            description: The ID of the title to which the episodes belong.
+        requestBody:
+          required: true
+          content:
+            application/json:
+              schema:
+                type: array
+                items:
+                  type: object
+                  properties:
+                    titulo:
+                      type: string
+                      example: "Pilot"
+                    duracion:
+                      type: integer
+                      example: 45
+                    orden:
+                      type: integer
+                      example: 1
+                    fecha_emision:
+                      type: string
+                      format: date
+                      example: "2023-01-01"
+            application/x-ndjson:
+              schema:
+                type: string
+                description: One episode object per line.
+        responses:
+          200:
+            description: Batch processed.
+            content:
+              application/json:
+                schema:
+                  type: object
+                  properties:
+                    creados:
+                      type: integer
+                      description: Number of episodes created.
+                    errores:
+                      type: array
+                      items:
+                        type: object
+                        properties:
+                          item:
+                            type: integer
+                            description: Index of the item in the array, or line number for NDJSON.
+                          error:
+                            type: string
+          400:
+            description: The body is not a JSON array.
+          401:
+            description: Not authorized.
+          404:
+            description: Title not found.
+          409:
+            description: A concurrent request created an episode with one of the same orders; nothing was created.
+          413:
+            description: More episodes than allowed in a single batch.
+        """
+        titulo = Titulo.query.filter_by(id=titulo_id).first()
+
+        if not titulo:
+            return {'error': 'Title not found'}, 404
+        if titulo.productora_id != identity.id:
+            return {'error': 'Not authorized'}, 401
+
+        max_items = current_app.config.get('MAX_BULK_EPISODES', MAX_BULK_EPISODES)
+        too_large = {'error': f'El lote no puede tener mas de {max_items} episodios'}, 413
+        errors = []
+        items = []
+        if is_ndjson(request):
+            for number, data, error in iter_ndjson(request.stream):
+                if error:
+                    errors.append({'item': number, 'error': error})
+                else:
+                    items.append((number, data))
+                # Se corta apenas se pasa el limite, sin leer el resto del cuerpo.
+                if len(items) + len(errors) > max_items:
+                    return too_large
+        else:
+            data = request.get_json(silent=True)
+            if not isinstance(data, list):
+                return {'error': 'Se esperaba una lista de episodios'}, 400
+            items = list(enumerate(data))
+
+        if len(items) + len(errors) > max_items:
+            return too_large
+
+        creados, item_errors = insert_episodes(titulo.id, items)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return {'error': 'Otro pedido creo episodios con el mismo orden, reintentar'}, 409
+
+        errors = sorted(errors + item_errors, key=lambda error: error['item'])
+        return {'creados': creados, 'errores': errors}, 200
+
 class ReseñaAPI(Resource):
     """
     Manage reviews for a title.
     """
 
-    @token_required(user_type='user')
-    def post(self, current_user, titulo_id):
+    @token_required(user_type='user', identity=True)
+    def post(self, current_user, identity, titulo_id):
         """
         Add a new review.
         ---
@@ -494,7 +937,7 @@ class ReseñaAPI(Resource):
                   puntuacion:
                     type: integer
                     example: 4
-                    description: The rating for the title (1-5 scale).
+                    description: The rating for the title (0-10 scale).
                   texto:
                     type: string
                     example: "Amazing title!"
@@ -510,6 +953,8 @@ class ReseñaAPI(Resource):
                     message:
                       type: string
                       example: "Reseña añadida con éxito"
+          400:
+            description: The score is not an integer between 0 and 10.
           404:
             description: Title or user not found.
             content:
@@ -523,25 +968,26 @@ class ReseñaAPI(Resource):
         """
         data = request.get_json()
 
-        usuario = Usuario.query.filter_by(nombre_usuario=current_user).first()
-        if not usuario:
-            return {'message': 'Usuario no encontrado en la base de datos'}, 404
-
         titulo = Titulo.query.filter_by(id=titulo_id).first()
         if not titulo:
             return {'message': f'Titulo no encontrado'}, 404
 
         puntuacion = data['puntuacion']
         texto = data['texto']
+        if not puntuacion_valida(puntuacion):
+            return {'message': f'La puntuación debe ser un entero entre {PUNTUACION_MINIMA} y {PUNTUACION_MAXIMA}'}, 400
      
         resenia = Reseña(
-            usuario_id=usuario.id, 
+            usuario_id=identity.id, 
             puntuacion=puntuacion,
             texto=texto,
             titulo_id=titulo.id, 
             fecha_publicacion=datetime.now(timezone.utc)
         )
         db.session.add(resenia)
+        db.session.flush()
+        registrar_puntuacion(titulo.id, puntuacion)
+        registrar_actividad(identity.id, TipoActividad.RESENIA, titulo.id, resenia.id, {'puntuacion': puntuacion})
         db.session.commit()
 
         return {'message': 'Reseña añadida con éxito'}, 200
@@ -567,6 +1013,24 @@ class ReseñaAPI(Resource):
             schema:
               type: integer
             description: The ID of the specific review to retrieve.
+          - in: query
+            name: fields
+            required: false
+            schema:
+              type: string
+            description: Comma separated list of fields to include in each serialized review (e.g. "id,puntuacion").
+          - in: query
+            name: after
+            required: false
+            schema:
+              type: string
+            description: Opaque cursor returned as `next` by the previous page.
+          - in: query
+            name: limit
+            required: false
+            schema:
+              type: integer
+            description: Maximum number of reviews per page (default 50, capped at 200).
         responses:
           200:
             description: Reviews retrieved successfully.
@@ -580,9 +1044,15 @@ class ReseñaAPI(Resource):
                       items:
                         type: object
                         description: Serialized review data.
+                    next:
+                      type: string
+                      nullable: true
+                      description: Cursor of the next page, or null if this is the last one.
                     review:
                       type: object
                       description: Serialized review data (for a single review).
+          400:
+            description: Invalid `after` cursor or `limit`.
           404:
             description: Title or review not found.
             content:
@@ -600,8 +1070,8 @@ class ReseñaAPI(Resource):
             return {'error': 'Title not found'}, 404
         
         if review_id is None:
-            reviews = Reseña.query.filter_by(titulo_id=titulo.id)
-            return {'reviews': [review.serialize() for review in reviews]}, 200
+            reviews, next_cursor = paginate(Reseña.query.filter_by(titulo_id=titulo.id), Reseña.id)
+            return {'reviews': Reseña.serialize_many(reviews, requested_fields()), 'next': next_cursor}, 200
         
         review = Reseña.query.filter_by(titulo_id=titulo.id, id=review_id).first()
         if not review:
@@ -609,8 +1079,8 @@ class ReseñaAPI(Resource):
         
         return {'review': review.serialize()}, 200
 
-    @token_required(user_type='user')
-    def delete(self, current_user, titulo_id, review_id):
+    @token_required(user_type='user', identity=True)
+    def delete(self, current_user, identity, titulo_id, review_id):
         """
         Delete a specific review.
         ---
@@ -674,11 +1144,14 @@ class ReseñaAPI(Resource):
         if not resenia:
             return {'message': 'Reseña no encontrada'}, 404
 
-        usuario = Usuario.query.filter_by(nombre_usuario=current_user).first()
-        if not usuario or resenia.usuario_id != usuario.id:
+        if resenia.usuario_id != identity.id:
             return {'message': 'No tienes permiso para eliminar esta reseña'}, 403
 
         db.session.delete(resenia)
+        registrar_puntuacion(resenia.titulo_id, resenia.puntuacion, -1)
+        registrar_baja_resenia(resenia)
+        ContadorImpresiones.query.filter_by(resenia_id=resenia.id).delete()
+        eliminar_actividades(TipoActividad.RESENIA, resenia.id)
         db.session.commit()
 
         return {'message': 'Reseña eliminada con éxito'}, 200
@@ -689,8 +1162,8 @@ class ComentarioAPI(Resource):
     Manage comments on reviews.
     """
 
-    @token_required(user_type='user')
-    def post(self, current_user, titulo_id, review_id):
+    @token_required(user_type='user', identity=True)
+    def post(self, current_user, identity, titulo_id, review_id):
         """
         Add a comment to a review.
         ---
@@ -770,18 +1243,17 @@ class ComentarioAPI(Resource):
         if not resenia:
             return {'message': 'Reseña no encontrada'}, 404
 
-        usuario = Usuario.query.filter_by(nombre_usuario=current_user).first()
-        if not usuario:
-            return {'message': 'Usuario no encontrado en la base de datos'}, 404
-
         comentario = Comentario(
             texto=texto,
-            usuario_id=usuario.id,
+            usuario_id=identity.id,
             resenia_id=resenia.id, 
             fecha_publicacion=datetime.now(timezone.utc)
         )
 
         db.session.add(comentario)
+        db.session.flush()
+        registrar_actividad(identity.id, TipoActividad.COMENTARIO, resenia.titulo_id, comentario.id,
+                            {'resenia_id': resenia.id})
         db.session.commit()
 
         return {'message': 'Comentario agregado con éxito'}, 200
@@ -813,6 +1285,24 @@ class ComentarioAPI(Resource):
             schema:
               type: integer
             description: The ID of the specific comment to retrieve.
+          - in: query
+            name: fields
+            required: false
+            schema:
+              type: string
+            description: Comma separated list of fields to include in each serialized comment (e.g. "id,texto").
+          - in: query
+            name: after
+            required: false
+            schema:
+              type: string
+            description: Opaque cursor returned as `next` by the previous page.
+          - in: query
+            name: limit
+            required: false
+            schema:
+              type: integer
+            description: Maximum number of comments per page (default 50, capped at 200).
         responses:
           200:
             description: Comments retrieved successfully.
@@ -826,9 +1316,15 @@ class ComentarioAPI(Resource):
                       items:
                         type: object
                         description: Serialized comment data.
+                    next:
+                      type: string
+                      nullable: true
+                      description: Cursor of the next page, or null if this is the last one.
                     comment:
                       type: object
                       description: Serialized comment data for a specific comment.
+          400:
+            description: Invalid `after` cursor or `limit`.
           404:
             description: Title, review, or comment not found.
             content:
@@ -851,8 +1347,8 @@ class ComentarioAPI(Resource):
             return {'error': 'Review not found'}, 404
 
         if comentario_id is None:
-            comments = Comentario.query.filter_by(resenia_id=review.id)
-            return {'comments': [comment.serialize() for comment in comments]}, 200
+            comments, next_cursor = paginate(Comentario.query.filter_by(resenia_id=review.id), Comentario.id)
+            return {'comments': Comentario.serialize_many(comments, requested_fields()), 'next': next_cursor}, 200
 
         comment = Comentario.query.filter_by(resenia_id=review.id, id=comentario_id).first()
         if not comment:
@@ -860,8 +1356,8 @@ class ComentarioAPI(Resource):
 
         return {'comment': comment.serialize()}, 200
 
-    @token_required(user_type='user')
-    def delete(self, current_user, titulo_id, review_id, comentario_id):
+    @token_required(user_type='user', identity=True)
+    def delete(self, current_user, identity, titulo_id, review_id, comentario_id):
         """
         Delete a comment.
         ---
@@ -931,11 +1427,11 @@ class ComentarioAPI(Resource):
         if not comentario:
             return {'message': 'Comentario no encontrado'}, 404
 
-        usuario = Usuario.query.filter_by(nombre_usuario=current_user).first()
-        if not usuario or comentario.usuario_id != usuario.id:
+        if comentario.usuario_id != identity.id:
             return {'message': 'No es posible eliminar este comentario'}, 403
 
         db.session.delete(comentario)
+        eliminar_actividades(TipoActividad.COMENTARIO, comentario.id)
         db.session.commit()
 
         return {'message': 'Comentario eliminado con éxito'}, 200
@@ -945,8 +1441,8 @@ class ImpresionAPI(Resource):
     Manage ratings (likes or dislikes) for reviews.
     """
 
-    @token_required(user_type='user')
-    def post(self, current_user, titulo_id, review_id):
+    @token_required(user_type='user', identity=True)
+    def post(self, current_user, identity, titulo_id, review_id):
         """
         Add a rating to a review.
         ---
@@ -1026,21 +1522,23 @@ class ImpresionAPI(Resource):
         resenia = Reseña.query.filter_by(id=review_id).first()
         if not resenia:
             return {'message': 'Reseña no encontrada'}, 404
-
-        usuario = Usuario.query.filter_by(nombre_usuario=current_user).first()
-        if not usuario:
-            return {'message': 'Usuario no encontrado en la base de datos'}, 404
         
-        impresion_existente = Impresion.query.filter_by(usuario_id=usuario.id, resenia_id=resenia.id).first()
+        impresion_existente = Impresion.query.filter_by(usuario_id=identity.id, resenia_id=resenia.id).first()
         if impresion_existente:
             return {'message': 'Ya has puntuado esta reseña anteriormente.'}, 400
 
         impresion = Impresion(
-            usuario_id=usuario.id,
+            usuario_id=identity.id,
             resenia_id=resenia.id,
             valor=valor)
 
         db.session.add(impresion)
+        try:
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            return {'message': 'Ya has puntuado esta reseña anteriormente.'}, 400
+        registrar_impresion(resenia.id, valor)
         db.session.commit()
 
         return {'message': f'Has dado un {"like" if valor == 1 else "dislike"} a la reseña.'}, 200
@@ -1052,7 +1550,7 @@ class ImpresionAPI(Resource):
         tags:
           - Ratings
         summary: Get ratings
-        description: Retrieve all ratings for a specific review.
+        description: Retrieve all ratings for a specific review, or only the number of likes and dislikes and the caller's own rating with `modo=resumen`.
         parameters:
           - in: path
             name: titulo_id
@@ -1066,6 +1564,31 @@ class ImpresionAPI(Resource):
             schema:
               type: integer
             description: The ID of the review for which ratings are being retrieved.
+          - in: query
+            name: modo
+            required: false
+            schema:
+              type: string
+              enum: [resumen]
+            description: If "resumen", only the counters and the caller's own rating are returned.
+          - in: query
+            name: fields
+            required: false
+            schema:
+              type: string
+            description: Comma separated list of fields to include in each serialized rating (e.g. "id,valor").
+          - in: query
+            name: after
+            required: false
+            schema:
+              type: string
+            description: Opaque cursor returned as `next` by the previous page.
+          - in: query
+            name: limit
+            required: false
+            schema:
+              type: integer
+            description: Maximum number of ratings per page (default 50, capped at 200).
         responses:
           200:
             description: Ratings retrieved successfully.
@@ -1079,6 +1602,22 @@ class ImpresionAPI(Resource):
                       items:
                         type: object
                         description: Serialized rating data.
+                    likes:
+                      type: integer
+                      description: Number of likes (only with `modo=resumen`).
+                    dislikes:
+                      type: integer
+                      description: Number of dislikes (only with `modo=resumen`).
+                    mi_impresion:
+                      type: integer
+                      nullable: true
+                      description: The authenticated user's rating of the review, if any (only with `modo=resumen`).
+                    next:
+                      type: string
+                      nullable: true
+                      description: Cursor of the next page, or null if this is the last one.
+          400:
+            description: Invalid `after` cursor or `limit`.
           404:
             description: Title or review not found.
             content:
@@ -1099,12 +1638,20 @@ class ImpresionAPI(Resource):
 
         if not review:
             return {'error': 'Review not found'}, 404
+
+        if request.args.get('modo') == 'resumen':
+            mi_impresion = None
+            identity = session_identity('user')
+            if identity:
+                impresion = Impresion.query.filter_by(usuario_id=identity.id, resenia_id=review.id).first()
+                mi_impresion = impresion.valor if impresion else None
+            return {**obtener_contadores(review.id), 'mi_impresion': mi_impresion}, 200
         
-        impresions = Impresion.query.filter_by(resenia_id=review.id)
-        return {'impresiones': [impresion.serialize() for impresion in impresions]}, 200
+        impresions, next_cursor = paginate(Impresion.query.filter_by(resenia_id=review.id), Impresion.id)
+        return {'impresiones': Impresion.serialize_many(impresions, requested_fields()), 'next': next_cursor}, 200
 
-    @token_required(user_type='user')
-    def delete(self, current_user, titulo_id, review_id):
+    @token_required(user_type='user', identity=True)
+    def delete(self, current_user, identity, titulo_id, review_id):
         """
         Delete a rating from a review.
         ---
@@ -1163,26 +1710,27 @@ class ImpresionAPI(Resource):
                       type: string
                       example: "Puntuación no encontrada."
         """
-        usuario = Usuario.query.filter_by(nombre_usuario=current_user).first()
-        if not usuario:
-            return {'message': 'Usuario no encontrado en la base de datos'}, 404
-
         resenia = Reseña.query.filter_by(id=review_id).first()
         if not resenia:
             return {'message': 'Reseña no encontrada'}, 404
 
-        impresion = Impresion.query.filter_by(usuario_id=usuario.id, resenia_id=resenia.id).first()
+        impresion = Impresion.query.filter_by(usuario_id=identity.id, resenia_id=resenia.id).first()
         if not impresion:
             return {'message': 'No has puntuado esta reseña.'}, 404
 
         db.session.delete(impresion)
+        registrar_impresion(resenia.id, impresion.valor, -1)
         db.session.commit()
 
         return {'message': 'Puntuación eliminada con éxito.'}, 200
 
 titulo_api.add_resource(TituloAPI, '/', '/<int:titulo_id>')
+titulo_api.add_resource(BusquedaAPI, '/buscar')
+titulo_api.add_resource(TendenciasAPI, '/trending')
+titulo_api.add_resource(SimilaresAPI, '/<int:titulo_id>/similares')
 titulo_api.add_resource(EpisodioAPI, '/<int:titulo_id>/episodes', 
                         '/<int:titulo_id>/episodes/<int:orden>')
+titulo_api.add_resource(EpisodioBulkAPI, '/<int:titulo_id>/episodes/bulk')
 titulo_api.add_resource(ReseñaAPI, '/<int:titulo_id>/review', 
                         '/<int:titulo_id>/review/<int:review_id>')
 titulo_api.add_resource(ComentarioAPI, '/<int:titulo_id>/review/<int:review_id>/comentario', 
@@ -1,13 +1,43 @@
-from flask import request, make_response, redirect, url_for, session, Blueprint
+from flask import request, make_response, redirect, url_for, session, Blueprint, Response, current_app, stream_with_context
 from flask_restful import Resource, Api
-from models.models import  Episodio, EstadoTitulo, Relacion, Reseña, Seguimiento, Titulo, DataBase, Usuario
-from auth import generate_token, token_required
+from models.models import  Comentario, Episodio, EstadoTitulo, Impresion, Relacion, Reseña, Seguimiento, TipoActividad, Titulo, DataBase, Usuario
+from sqlalchemy.exc import IntegrityError
+from auth import resolve_identity, session_identity, token_required
+from resources.ndjson import dumps_line
+from resources.pagination import encode_cursor, page_args
+from services.analytics import registrar_progreso
+from services.auth_service import end_session, login, signup
+from services.feed import al_dejar_de_seguir, al_seguir, leer_feed, registrar_actividad
+from services.follow_graph import get_follow_graph
 
 usuarioAPI_bp = Blueprint('usuarioAPI', __name__)
 usuario_api = Api(usuarioAPI_bp)
 
 db = DataBase().db
 
+EXPORT_BATCH_SIZE = 500
+
+def stream_rows(tipo: str, model, condition, batch_size: int):
+    """
+    Yields the rows of `model` matching `condition` as NDJSON lines tagged with `tipo`.
+
+    Rows are read with a server side cursor in batches of `batch_size` and selected
+    as plain column tuples, so they are never added to the session and memory use
+    does not grow with the number of rows. Each batch is yielded as a single string.
+    """
+    statement = (db.select(*model.__table__.columns)
+                 .where(condition)
+                 .execution_options(yield_per=batch_size))
+    result = db.session.execute(statement)
+    for partition in result.partitions():
+        yield ''.join(dumps_line({'tipo': tipo, 'data': data}) for data in model.serialize_many(partition))
+
+def cantidad_valida(cantidad) -> bool:
+    """
+    Returns whether `cantidad` is a valid number of watched episodes: a non-negative integer.
+    """
+    return isinstance(cantidad, int) and not isinstance(cantidad, bool) and cantidad >= 0
+
 class UserAPI(Resource):
     """
     Manage user login operations.
@@ -42,34 +72,7 @@ class UserAPI(Resource):
           400:
             description: Missing or already registered data.
         """
-        data = request.get_json()
-
-        if 'username' not in data or not 'email' in data or not 'password' in data:
-            return {'error': 'Falta data'}, 400
-        
-        email = data['email']
-        password = data['password']
-        username = data['username']
-
-        if not username or not email or not password:
-            return {'error': 'Falta data'}, 400
-
-        if Usuario.query.filter_by(email=email).first():
-            return {'error': 'Email ya esta registrado'}, 400
-
-        if Usuario.query.filter_by(nombre_usuario=username).first():
-            return {'error': 'Username ya existe'}, 400
-
-        new_login = Usuario(nombre_usuario=username, email=email)
-        new_login.set_password(password)
-
-        db.session.add(new_login)
-        db.session.commit()
-
-        token = generate_token(new_login.nombre_usuario, 'user')
-        session['auth_token'] = token
-
-        return {'message': 'Usuario registrado'}, 200
+        return signup('user', request.get_json())
     
     def get(self):
         """
@@ -98,25 +101,7 @@ class UserAPI(Resource):
           400:
             description: Missing or incorrect credentials.
         """
-        data = request.get_json()
-        if not 'email' in data or not 'password' in data:
-          return {'error': 'Falta data'}, 400
-        
-        email = data['email']
-        password = data['password']
-
-        if not email or not password:
-          return {'error': 'Falta data'}, 400
-
-        login_info = Usuario.query.filter_by(email=email).first()
-
-        if not login_info or not login_info.check_password(password):
-          return {'error': 'Login info incorrect.'}, 403
-        
-        token = generate_token(login_info.nombre_usuario, 'user')
-        session['auth_token'] = token
-
-        return {'message': 'User verified successfully'}, 200
+        return login('user', request.get_json())
     
     def delete(self):
         """
@@ -125,20 +110,20 @@ class UserAPI(Resource):
         tags:
           - Authentication
         summary: User logout
-        description: Logs out the currently authenticated user and redirects to the homepage.
+        description: Logs out the currently authenticated user, revokes their session token and redirects to the homepage.
         responses:
           302:
             description: Redirect to homepage after logout.
         """
-        session.pop('auth_token', None)
+        end_session()
         return redirect(url_for('index'))
     
 class SeguirAPI(Resource):
     """
     Manage user follow operations.
     """
-    @token_required(user_type='user')
-    def post(self, current_user):
+    @token_required(user_type='user', identity=True)
+    def post(self, current_user, identity):
         """
         Follow another user.
         ---
@@ -166,29 +151,34 @@ class SeguirAPI(Resource):
         """
         data = request.get_json()
         seguido_id = data['seguido_id']
-        seguidor = Usuario.query.filter_by(nombre_usuario=current_user).first()
         seguido = Usuario.query.filter_by(id=seguido_id).first()
         if not seguido:
             return {'message': 'El usuario que intentas seguir no existe'}, 404
         
         #Verifico que no se siga a si mismo
-        if seguidor.id == seguido.id:
+        if identity.id == seguido.id:
             return {'message': 'Operación no válida'}, 403
 
-        #Verifico si ya se siguen
-        relacion_existente = Relacion.query.filter_by(seguidor=seguidor.id, seguido=seguido.id).first()
-        if relacion_existente:
-            return {'message': 'Ya sigues a este usuario'}, 403
-
-        nueva_relacion = Relacion(seguidor=seguidor.id, seguido=seguido.id)
+        #Verifico si ya se siguen. El grafo de este proceso puede estar atrasado respecto
+        #de otros workers, asi que decide la clave primaria de Relaciones.
+        graph = get_follow_graph()
+        nueva_relacion = Relacion(seguidor=identity.id, seguido=seguido.id)
 
         db.session.add(nueva_relacion)
+        try:
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            graph.add(identity.id, seguido.id)
+            return {'message': 'Ya sigues a este usuario'}, 403
+        al_seguir(identity.id, seguido.id)
         db.session.commit()
+        graph.add(identity.id, seguido.id)
 
         return {'message': 'Ahora sigues a este usuario con éxito'}, 200
     
-    @token_required(user_type='user')
-    def get(self, current_user):  
+    @token_required(user_type='user', identity=True)
+    def get(self, current_user, identity):  
         """
         Retrieve the list of followers or followings.
         ---
@@ -212,20 +202,15 @@ class SeguirAPI(Resource):
           404:
             description: User not found.
         """  
-        user = Usuario.query.filter_by(nombre_usuario=current_user).first()
-        if not user:
-            return {'error': 'Usuario actual no existe'}, 404
-        
         data = request.get_json()
+        graph = get_follow_graph()
         if 'type' in data and data['type'] == 'follower':
-            seguidores = Relacion.query.filter_by(seguido=user.id)
-            return {'seguidores': [seguidor.seguidor for seguidor in seguidores]}, 200
-        seguidos = Relacion.query.filter_by(seguidor=user.id)
-        return {'seguidos': [seguido.seguido for seguido in seguidos]}, 200
+            return {'seguidores': graph.seguidores(identity.id).tolist()}, 200
+        return {'seguidos': graph.seguidos(identity.id).tolist()}, 200
         
     
-    @token_required(user_type='user')
-    def delete(self, current_user, seguido_id):
+    @token_required(user_type='user', identity=True)
+    def delete(self, current_user, identity, seguido_id):
         """
         Unfollow a user.
         ---
@@ -246,20 +231,20 @@ class SeguirAPI(Resource):
           404:
             description: User or follow relationship not found.
         """
-        seguidor = Usuario.query.filter_by(nombre_usuario=current_user).first()
-        if not seguidor:
-            return {'message': 'Usuario no encontrado'}, 404
-
         seguido = Usuario.query.filter_by(id=seguido_id).first()
         if not seguido:
             return {'message': 'El usuario no existe'}, 404
 
-        relacion = Relacion.query.filter_by(seguidor=seguidor.id, seguido=seguido.id).first()
-        if not relacion:
+        borradas = db.session.execute(
+            db.delete(Relacion).where(Relacion.seguidor == identity.id, Relacion.seguido == seguido.id)).rowcount
+        if not borradas:
+            db.session.rollback()
+            # Si el grafo todavia tenia la relacion, estaba atrasado.
+            get_follow_graph().remove(identity.id, seguido.id)
             return {'message': 'No estás siguiendo a este usuario'}, 400
-
-        db.session.delete(relacion)
+        al_dejar_de_seguir(identity.id, seguido.id)
         db.session.commit()
+        get_follow_graph().remove(identity.id, seguido.id)
 
         return {'message': f'Has dejado de seguir a {seguido.nombre_usuario}'}, 200
 
@@ -267,8 +252,8 @@ class WatchlistAPI(Resource):
     """
     Manage following titles.
     """
-    @token_required(user_type='user')
-    def post(self, current_user, user):
+    @token_required(user_type='user', identity=True)
+    def post(self, current_user, identity, user):
         """
         Follow a title.
         ---
@@ -294,7 +279,6 @@ class WatchlistAPI(Resource):
         if current_user != user:
             return {'error': 'Access denied'}, 401
         
-        usuario = Usuario.query.filter_by(nombre_usuario=user).first()
         data = request.get_json()
         if 'titulo_id' not in data:
             return {'error': 'Title is required'}, 403
@@ -304,13 +288,15 @@ class WatchlistAPI(Resource):
         if not titulo:
             return {'error': 'Título no encontrado'}, 404
         
-        seguimiento = Seguimiento.query.filter_by(usuario_id=usuario.id, titulo_id=titulo.id).first()
+        seguimiento = Seguimiento.query.filter_by(usuario_id=identity.id, titulo_id=titulo.id).first()
 
         if seguimiento:
             return {'message': 'Ya estás siguiendo este título'}, 403
         
         estado = EstadoTitulo(data['estado']) if 'estado' in data else EstadoTitulo.SIN_COMENZAR
         cantidad_visto = data['cantidad_visto'] if 'cantidad_visto' in data else 0
+        if not cantidad_valida(cantidad_visto):
+            return {'error': 'Invalid cantidad_visto'}, 400
 
         episodios = Episodio.query.filter_by(titulo_id=titulo.id)
 
@@ -318,7 +304,7 @@ class WatchlistAPI(Resource):
             return {'error': 'Invalid cantidad_visto'}, 403
         
         nuevo_seguimiento = Seguimiento(
-            usuario_id=usuario.id,
+            usuario_id=identity.id,
             estado=estado,  # 1=activo, 0=terminado
             resenia_id=None,  
             cantidad_visto=cantidad_visto,
@@ -326,22 +312,36 @@ class WatchlistAPI(Resource):
         )
 
         db.session.add(nuevo_seguimiento)
+        try:
+            db.session.flush()
+        except IntegrityError:
+            db.session.rollback()
+            return {'message': 'Ya estás siguiendo este título'}, 403
+        registrar_progreso(titulo.id, cantidad_visto)
+        registrar_actividad(identity.id, TipoActividad.SEGUIMIENTO, titulo.id, nuevo_seguimiento.id,
+                            {'estado': estado.value})
         db.session.commit()
 
         return {'message': 'Título seguido con éxito'}, 200
     
-    @token_required(user_type='user')
-    def put(self, current_user, titulo_id):
+    @token_required(user_type='user', identity=True)
+    def put(self, current_user, identity, user, watch_id):
         """
         Update title follow status.
         ---
         tags:
           - Titles
         summary: Update title follow
-        description: Updates the status and view count for a title being followed by the authenticated user.
+        description: Updates the status and view count for a title being followed by the authenticated user. A change of status is shown in the feed of the user's followers.
         parameters:
           - in: path
-            name: titulo_id
+            name: user
+            required: true
+            schema:
+              type: string
+            description: The username of the authenticated user.
+          - in: path
+            name: watch_id
             required: true
             schema:
               type: integer
@@ -354,9 +354,10 @@ class WatchlistAPI(Resource):
                 type: object
                 properties:
                   estado:
-                    type: integer
-                    example: 1
-                    description: Status of the follow (1 = active, 0 = completed).
+                    type: string
+                    enum: [COMPLETO, ACTIVO, SIN_COMENZAR]
+                    example: ACTIVO
+                    description: Status of the follow.
                   cantidad_visto:
                     type: integer
                     example: 10
@@ -364,30 +365,235 @@ class WatchlistAPI(Resource):
         responses:
           200:
             description: Follow status updated successfully.
+          400:
+            description: Invalid status or view count, or the title is not being followed.
+          401:
+            description: Access denied.
           404:
-            description: Title not found or not being followed.
+            description: Title not found.
         """
-        usuario = Usuario.query.filter_by(nombre_usuario=current_user).first()
+        if current_user != user:
+            return {'error': 'Access denied'}, 401
 
-        titulo = Titulo.query.filter_by(id=titulo_id).first()
+        titulo = Titulo.query.filter_by(id=watch_id).first()
         if not titulo:
             return {'message': 'Título no encontrado'}, 404
 
-        seguimiento = Seguimiento.query.filter_by(usuario_id=usuario.id, titulo_id=titulo.id).first()
+        seguimiento = Seguimiento.query.filter_by(usuario_id=identity.id, titulo_id=titulo.id).first()
         if not seguimiento:
             return {'message': 'No estás siguiendo este título'}, 400  
 
-        data = request.get_json()
-        estado = data['estado', seguimiento.estado]  # Si no se pasa, se mantiene el actual
-        cantidad_visto = data['cantidad_visto', seguimiento.cantidad_visto]  
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return {'error': 'Invalid body'}, 400
+        # Si no se pasa, se mantiene el actual
+        try:
+            estado = EstadoTitulo(data['estado']) if 'estado' in data else seguimiento.estado
+        except ValueError:
+            return {'error': 'Invalid estado'}, 400
+        cantidad_visto = data.get('cantidad_visto', seguimiento.cantidad_visto)
+        if not cantidad_valida(cantidad_visto):
+            return {'error': 'Invalid cantidad_visto'}, 400
+        if cantidad_visto > Episodio.query.filter_by(titulo_id=titulo.id).count():
+            return {'error': 'Invalid cantidad_visto'}, 400
+
+        cambio_estado = estado != seguimiento.estado
+        registrar_progreso(titulo.id, cantidad_visto - seguimiento.cantidad_visto)
 
         # Actualizar el seguimiento
         seguimiento.estado = estado
         seguimiento.cantidad_visto = cantidad_visto
+        if cambio_estado:
+            registrar_actividad(identity.id, TipoActividad.SEGUIMIENTO, titulo.id, seguimiento.id,
+                                {'estado': estado.value})
 
         db.session.commit()
         return {'message': 'Seguimiento actualizado con éxito'}, 200
     
+class ExportarActividadAPI(Resource):
+    """
+    Export the full activity history of a user.
+    """
+    @token_required(user_type='user', identity=True)
+    def get(self, current_user, identity, user):
+        """
+        Export user activity.
+        ---
+        tags:
+          - Profile
+        summary: Export the activity history
+        description: Streams every review, watchlist entry, follow, comment and impression of the authenticated user as newline delimited JSON. Each line has a `tipo` (usuario, resenia, seguimiento, seguido, seguidor, comentario or impresion) and the serialized `data`. Rows are read from the database in batches, so memory use does not depend on the size of the history.
+        parameters:
+          - in: path
+            name: user
+            required: true
+            schema:
+              type: string
+            description: The username of the authenticated user.
+        responses:
+          200:
+            description: NDJSON stream with the user's activity.
+            content:
+              application/x-ndjson:
+                schema:
+                  type: string
+          401:
+            description: Access denied.
+        """
+        if current_user != user:
+            return {'error': 'Access denied'}, 401
+
+        usuario_id = identity.id
+        batch_size = current_app.config.get('EXPORT_BATCH_SIZE', EXPORT_BATCH_SIZE)
+        sections = (
+            ('resenia', Reseña, Reseña.usuario_id == usuario_id),
+            ('seguimiento', Seguimiento, Seguimiento.usuario_id == usuario_id),
+            ('seguido', Relacion, Relacion.seguidor == usuario_id),
+            ('seguidor', Relacion, Relacion.seguido == usuario_id),
+            ('comentario', Comentario, Comentario.usuario_id == usuario_id),
+            ('impresion', Impresion, Impresion.usuario_id == usuario_id),
+        )
+
+        def generate():
+            yield dumps_line({'tipo': 'usuario', 'data': {'id': identity.id, 'nombre_usuario': identity.username}})
+            for tipo, model, condition in sections:
+                yield from stream_rows(tipo, model, condition, batch_size)
+
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+class RelacionesAPI(Resource):
+    """
+    Read the follower counts of a user.
+    """
+    def get(self, user):
+        """
+        Get follower counts.
+        ---
+        tags:
+          - Follows
+        summary: Get the follower and following counts of a user
+        description: Returns how many users follow the given user and how many they follow. If the request has a user session, it also says whether the given user follows the authenticated user and the other way around.
+        parameters:
+          - in: path
+            name: user
+            required: true
+            schema:
+              type: string
+            description: The username of the user.
+        responses:
+          200:
+            description: The counts, plus `te_sigue` and `lo_sigues` (null without a session).
+          404:
+            description: User not found.
+        """
+        usuario = resolve_identity(user, 'user')
+        if not usuario:
+            return {'message': 'El usuario no existe'}, 404
+
+        graph = get_follow_graph()
+        te_sigue = lo_sigues = None
+        identity = session_identity('user')
+        if identity:
+            te_sigue = graph.sigue(usuario.id, identity.id)
+            lo_sigues = graph.sigue(identity.id, usuario.id)
+        return {
+            'seguidores': graph.cantidad_seguidores(usuario.id),
+            'seguidos': graph.cantidad_seguidos(usuario.id),
+            'te_sigue': te_sigue,
+            'lo_sigues': lo_sigues
+        }, 200
+
+class MutuosAPI(Resource):
+    """
+    Read the mutual follows of the authenticated user.
+    """
+    @token_required(user_type='user', identity=True)
+    def get(self, current_user, identity):
+        """
+        Get mutual follows.
+        ---
+        tags:
+          - Follows
+        summary: Get the users the authenticated user follows and that follow them back
+        responses:
+          200:
+            description: The IDs of the mutual follows, in ascending order.
+        """
+        return {'mutuos': get_follow_graph().mutuos(identity.id)}, 200
+
+class SugerenciasAPI(Resource):
+    """
+    Suggest users to follow.
+    """
+    @token_required(user_type='user', identity=True)
+    def get(self, current_user, identity):
+        """
+        Get follow suggestions.
+        ---
+        tags:
+          - Follows
+        summary: Suggest users followed by the users the authenticated user follows
+        description: Ranks the users followed by the users the authenticated user follows by how many of them follow each one. Users already followed are left out.
+        parameters:
+          - in: query
+            name: limit
+            required: false
+            schema:
+              type: integer
+            description: Maximum number of suggestions (defaults to PAGE_SIZE, capped by MAX_PAGE_SIZE).
+        responses:
+          200:
+            description: The suggestions as `id` and `en_comun` pairs, best first.
+          400:
+            description: Invalid limit.
+        """
+        _, limit = page_args()
+        sugerencias = get_follow_graph().sugerencias(identity.id, limit)
+        return {'sugerencias': [{'id': usuario_id, 'en_comun': en_comun} for usuario_id, en_comun in sugerencias]}, 200
+
+class FeedAPI(Resource):
+    """
+    Read the activity feed of the authenticated user.
+    """
+    @token_required(user_type='user', identity=True)
+    def get(self, current_user, identity):
+        """
+        Get the home feed.
+        ---
+        tags:
+          - Feed
+        summary: Get the activity of followed users
+        description: Returns the reviews, watchlist changes and comments of the users the authenticated user follows, newest first.
+        parameters:
+          - in: query
+            name: limit
+            required: false
+            schema:
+              type: integer
+            description: Maximum number of activities to return (capped by MAX_PAGE_SIZE).
+          - in: query
+            name: after
+            required: false
+            schema:
+              type: string
+            description: Cursor returned as `next` by the previous page.
+        responses:
+          200:
+            description: A page of the feed and the cursor of the next page (null on the last page).
+          400:
+            description: Invalid limit or cursor.
+        """
+        after, limit = page_args()
+        rows, hay_mas = leer_feed(identity.id, after, limit)
+        actividades = []
+        for actividad, nombre_usuario, titulo in rows:
+            data = actividad.serialize(('id', 'tipo', 'titulo_id', 'referencia_id', 'detalle', 'fecha'))
+            data['usuario'] = nombre_usuario
+            data['titulo'] = titulo
+            actividades.append(data)
+        next_cursor = encode_cursor(rows[-1][0].id) if hay_mas else None
+        return {'actividades': actividades, 'next': next_cursor}, 200
+
 class PerfilUsuario(Resource):
     """
     Class to manage a user's profile. 
@@ -407,7 +613,7 @@ class PerfilUsuario(Resource):
             required: false
             schema:
               type: string
-            description: Section of the profile to retrieve. Allowed values: 'resenias', 'titulos', 'info', or leave empty to retrieve the full profile.
+            description: "Section of the profile to retrieve. Allowed values: 'resenias', 'titulos', 'info', or leave empty to retrieve the full profile."
           - in: header
             name: Authorization
             required: true
@@ -430,22 +636,26 @@ class PerfilUsuario(Resource):
           404:
             description: User not found.
         """
+        seccion = request.args.get('seccion', seccion)
+        if seccion not in ('resenias', 'titulos', 'info', None):
+            return {'message': 'Sección no válida'}, 400
+
         usuario = Usuario.query.filter_by(nombre_usuario=user).first()
+        if not usuario:
+            return {'message': 'Usuario no encontrado'}, 404
 
         if seccion == 'resenias':
             return self.obtener_resenias(usuario.id)
         elif seccion == 'titulos':
             return self.obtener_titulos(usuario.id)
         elif seccion == 'info':
-            return self.obtener_info(usuario.id)
-        elif seccion is None:
-            return self.obtener_perfil_completo(usuario.id)
-        else:
-            return {'message': 'Sección no válida'}, 400
+            return self.obtener_info(usuario)
+        return self.obtener_perfil_completo(usuario)
 
     def obtener_resenias(self, usuario_id):
         """
-        Obtiene todas las reseñas realizadas por el usuario.
+        Obtiene todas las reseñas realizadas por el usuario, junto con el nombre del
+        título reseñado, en una sola consulta.
 
         Parámetros
         --------
@@ -455,59 +665,78 @@ class PerfilUsuario(Resource):
         --------
         dict: Reseñas del usuario.
         """
-        resenias = Reseña.query.filter_by(usuario_id=usuario_id).all()
-        resenias_data = [{'id': r.id, 'puntuacion': r.puntuacion, 'texto': r.texto, 'fecha': r.fecha_publicacion.isoformat()} for r in resenias]
+        resenias = (db.session.query(Reseña.id, Reseña.puntuacion, Reseña.texto, Reseña.fecha_publicacion,
+                                     Reseña.titulo_id, Titulo.titulo)
+                    .outerjoin(Titulo, Titulo.id == Reseña.titulo_id)
+                    .filter(Reseña.usuario_id == usuario_id)
+                    .order_by(Reseña.id)
+                    .all())
+        resenias_data = [{'id': r.id,
+                          'puntuacion': r.puntuacion,
+                          'texto': r.texto,
+                          'fecha': r.fecha_publicacion.isoformat(),
+                          'titulo_id': r.titulo_id,
+                          'titulo': r.titulo} for r in resenias]
         return {'reseñas': resenias_data}
 
     def obtener_titulos(self, usuario_id):
         """
-        Retrieve all reviews made by the user.
+        Retrieve the watchlist of the user.
         ---
         tags:
-        - Reviews
-        summary: Get user reviews
-        description: Fetches all reviews created by the specified user.
+        - Tracking
+        summary: Get user watchlist
+        description: Fetches every title followed by the specified user together with the title's name and type, in a single query.
         parameters:
         - in: path
             name: usuario_id
             required: true
             schema:
             type: integer
-            description: The ID of the user whose reviews are being requested.
+            description: The ID of the user whose watchlist is being requested.
         responses:
         200:
-            description: User reviews retrieved successfully.
+            description: User watchlist retrieved successfully.
             content:
             application/json:
                 schema:
                 type: object
                 properties:
-                    reseñas:
+                    series_vistas:
                     type: array
                     items:
                         type: object
                         properties:
-                        id:
+                        titulo_id:
                             type: integer
-                            description: Review ID.
-                        puntuacion:
+                            description: Title ID.
+                        estado:
+                            type: string
+                            description: Tracking status.
+                        cantidad_visto:
                             type: integer
-                            description: Review score.
-                        texto:
+                            description: Number of episodes watched.
+                        titulo:
                             type: string
-                            description: Review text.
-                        fecha:
+                            description: Name of the title.
+                        tipo:
                             type: string
-                            format: date-time
-                            description: Publication date of the review.
-        404:
-            description: No reviews found for the user.
+                            description: Type of the title.
         """
-        series = Seguimiento.query.filter_by(usuario_id=usuario_id).all()
-        series_data = [{'titulo_id': s.titulo_id, 'estado': s.estado, 'cantidad_visto': s.cantidad_visto} for s in series]
+        series = (db.session.query(Seguimiento.titulo_id, Seguimiento.estado, Seguimiento.cantidad_visto,
+                                   Titulo.titulo, Titulo.tipo)
+                  .outerjoin(Titulo, Titulo.id == Seguimiento.titulo_id)
+                  .filter(Seguimiento.usuario_id == usuario_id)
+                  .order_by(Seguimiento.id)
+                  .all())
+        series_data = [{'titulo_id': s.titulo_id,
+                        'estado': s.estado.value,
+                        'cantidad_visto': s.cantidad_visto,
+                        'titulo': s.titulo,
+                        'tipo': s.tipo.value if s.tipo else None} for s in series]
         return {'series_vistas': series_data}
 
-    def obtener_info(self, usuario_id):
+    def obtener_info(self, usuario):
         """
         Retrieve user information.
         ---
@@ -516,12 +745,12 @@ class PerfilUsuario(Resource):
         summary: Get user information
         description: Fetches basic information about the specified user, including username and email.
         parameters:
-        - in: path
-            name: usuario_id
+        - in: body
+            name: usuario
             required: true
             schema:
-            type: integer
-            description: The ID of the user whose information is being requested.
+            type: object
+            description: The already loaded user whose information is being requested.
         responses:
         200:
             description: User information retrieved successfully.
@@ -543,25 +772,24 @@ class PerfilUsuario(Resource):
         404:
             description: User not found.
         """
-        usuario = Usuario.query.get(usuario_id)
         info_data = {'nombre_usuario': usuario.nombre_usuario, 'email': usuario.email}
         return {'usuario': info_data}
 
-    def obtener_perfil_completo(self, usuario_id):
+    def obtener_perfil_completo(self, usuario):
         """
         Retrieve the complete user profile.
         ---
         tags:
         - Profile
         summary: Get complete user profile
-        description: Fetches all available information related to the user's profile, including personal details, reviews, and followed titles.
+        description: Fetches all available information related to the user's profile, including personal details, reviews, and followed titles with their names. Besides loading the user, it costs one query for the reviews and one for the followed titles.
         parameters:
-        - in: path
-            name: usuario_id
+        - in: body
+            name: usuario
             required: true
             schema:
-            type: integer
-            description: The ID of the user whose complete profile is being requested.
+            type: object
+            description: The already loaded user whose complete profile is being requested.
         responses:
         200:
             description: Complete user profile retrieved successfully.
@@ -606,9 +834,9 @@ class PerfilUsuario(Resource):
         404:
             description: User not found.
         """
-        info = self.obtener_info(usuario_id)
-        resenias = self.obtener_resenias(usuario_id)
-        series = self.obtener_titulos(usuario_id)
+        info = self.obtener_info(usuario)
+        resenias = self.obtener_resenias(usuario.id)
+        series = self.obtener_titulos(usuario.id)
         
         return {
             'usuario': info['usuario'],
@@ -619,6 +847,11 @@ class PerfilUsuario(Resource):
 usuario_api.add_resource(UserAPI, '/')
 usuario_api.add_resource(SeguirAPI, '/follow',
                          '/follow/<int:seguido_id>')
+usuario_api.add_resource(MutuosAPI, '/follow/mutuals')
+usuario_api.add_resource(SugerenciasAPI, '/follow/suggestions')
 usuario_api.add_resource(WatchlistAPI, '/<string:user>/watchlist',
                          '/<string:user>/watchlist/<int:watch_id>')
+usuario_api.add_resource(ExportarActividadAPI, '/<string:user>/export')
+usuario_api.add_resource(FeedAPI, '/feed')
+usuario_api.add_resource(RelacionesAPI, '/<string:user>/follows')
 usuario_api.add_resource(PerfilUsuario, '/<string:user>/perfil')
\ No newline at end of file
@@ -0,0 +1,206 @@
+from datetime import datetime, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func
+
+from models.models import DataBase, EventoBajaResenia, EventoProgreso, Reseña, ResumenDiarioTitulo, Seguimiento, Titulo
+from services.watermarks import leer_marca, limite_seguro, mover_marca
+
+db = DataBase().db
+
+analytics_cli = AppGroup('analytics', help='Manage the daily rollups of producer analytics.')
+
+MARCA_RESENIAS = 'analytics.resenias'
+MARCA_SEGUIMIENTOS = 'analytics.seguimientos'
+MARCA_PROGRESO = 'analytics.progreso'
+MARCA_BAJAS = 'analytics.bajas_resenias'
+MARCAS = {MARCA_RESENIAS: Reseña, MARCA_SEGUIMIENTOS: Seguimiento, MARCA_PROGRESO: EventoProgreso,
+          MARCA_BAJAS: EventoBajaResenia}
+
+METRICAS = ('resenias', 'suma_puntuaciones', 'nuevos_seguimientos', 'episodios_vistos')
+CHUNK = 500
+# Segundos que tiene una transaccion para confirmar filas con IDs ya vistos por el job.
+SAFETY_LAG = 300
+
+def _hoy():
+    return datetime.now(timezone.utc).date()
+
+def registrar_progreso(titulo_id: int, delta: int):
+    """
+    Logs a change of `delta` episodes in the `cantidad_visto` of a watchlist entry, in
+    the current session's transaction.
+
+    Only increases are logged: lowering `cantidad_visto` corrects the count, it does
+    not unwatch episodes, so it must not make `episodios_vistos` negative.
+    """
+    if delta > 0:
+        db.session.add(EventoProgreso(titulo_id=titulo_id, delta=delta, fecha=_hoy()))
+
+def registrar_baja_resenia(resenia: Reseña):
+    """
+    Logs the deletion of `resenia` in the current session's transaction, so the next
+    run subtracts it from the rollups if an earlier run had added it.
+    """
+    db.session.add(EventoBajaResenia(resenia_id=resenia.id, titulo_id=resenia.titulo_id,
+                                     puntuacion=resenia.puntuacion, fecha=resenia.fecha_publicacion))
+
+def _agregar(totales, titulo_id, dia, **metricas):
+    fila = totales.setdefault((titulo_id, dia), dict.fromkeys(METRICAS, 0))
+    for nombre, valor in metricas.items():
+        fila[nombre] += int(valor or 0)
+
+def _leer_deltas(desde, hasta):
+    """
+    Aggregates the rows with IDs in `(desde[marca], hasta[marca]]` by title and day.
+    """
+    totales = {}
+    rows = (db.session.query(Reseña.titulo_id, Reseña.fecha_publicacion,
+                             func.count(Reseña.id), func.sum(Reseña.puntuacion))
+            .filter(Reseña.id > desde[MARCA_RESENIAS], Reseña.id <= hasta[MARCA_RESENIAS])
+            .group_by(Reseña.titulo_id, Reseña.fecha_publicacion))
+    for titulo_id, dia, cantidad, suma in rows:
+        _agregar(totales, titulo_id, dia, resenias=cantidad, suma_puntuaciones=suma)
+
+    # Los seguimientos no guardan fecha: se cuentan en el dia en que los procesa el job.
+    hoy = _hoy()
+    rows = (db.session.query(Seguimiento.titulo_id, func.count(Seguimiento.id))
+            .filter(Seguimiento.id > desde[MARCA_SEGUIMIENTOS], Seguimiento.id <= hasta[MARCA_SEGUIMIENTOS])
+            .group_by(Seguimiento.titulo_id))
+    for titulo_id, cantidad in rows:
+        _agregar(totales, titulo_id, hoy, nuevos_seguimientos=cantidad)
+
+    rows = (db.session.query(EventoProgreso.titulo_id, EventoProgreso.fecha, func.sum(EventoProgreso.delta))
+            .filter(EventoProgreso.id > desde[MARCA_PROGRESO], EventoProgreso.id <= hasta[MARCA_PROGRESO])
+            .group_by(EventoProgreso.titulo_id, EventoProgreso.fecha))
+    for titulo_id, dia, delta in rows:
+        _agregar(totales, titulo_id, dia, episodios_vistos=delta)
+
+    # Solo se restan las reseñas que una corrida anterior ya habia sumado.
+    rows = (db.session.query(EventoBajaResenia.titulo_id, EventoBajaResenia.fecha,
+                             func.count(EventoBajaResenia.id), func.sum(EventoBajaResenia.puntuacion))
+            .filter(EventoBajaResenia.id > desde[MARCA_BAJAS], EventoBajaResenia.id <= hasta[MARCA_BAJAS],
+                    EventoBajaResenia.resenia_id <= desde[MARCA_RESENIAS])
+            .group_by(EventoBajaResenia.titulo_id, EventoBajaResenia.fecha))
+    for titulo_id, dia, cantidad, suma in rows:
+        _agregar(totales, titulo_id, dia, resenias=-cantidad, suma_puntuaciones=-(suma or 0))
+    return totales
+
+def _aplicar(totales):
+    """
+    Adds the aggregated deltas to the rollups, creating the missing rows.
+    """
+    claves = sorted(totales)
+    for inicio in range(0, len(claves), CHUNK):
+        chunk = claves[inicio:inicio + CHUNK]
+        titulo_ids = {titulo_id for titulo_id, _ in chunk}
+        productoras = dict(db.session.query(Titulo.id, Titulo.productora_id).filter(Titulo.id.in_(titulo_ids)))
+        existentes = {(r.titulo_id, r.dia): r for r in ResumenDiarioTitulo.query
+                      .filter(ResumenDiarioTitulo.titulo_id.in_(titulo_ids),
+                              ResumenDiarioTitulo.dia.in_({dia for _, dia in chunk}))}
+        nuevas = []
+        for titulo_id, dia in chunk:
+            if titulo_id not in productoras:
+                # Titulo borrado: no hay productora a quien mostrarle la actividad.
+                continue
+            metricas = totales[(titulo_id, dia)]
+            resumen = existentes.get((titulo_id, dia))
+            if resumen is None:
+                nuevas.append({'titulo_id': titulo_id, 'dia': dia, 'productora_id': productoras[titulo_id], **metricas})
+                continue
+            for nombre, valor in metricas.items():
+                setattr(resumen, nombre, getattr(resumen, nombre) + valor)
+        if nuevas:
+            db.session.execute(db.insert(ResumenDiarioTitulo), nuevas)
+
+def actualizar_resumenes(lag: float = None):
+    """
+    Adds the reviews, watchlist entries and progress events created since the last run
+    to the daily rollups, subtracts the reviews deleted since then, and commits the
+    result together with the new watermarks.
+
+    Rows are only processed once their IDs were seen at least `lag` seconds before
+    (`ANALYTICS_SAFETY_LAG` by default), see `limite_seguro`, so rows of transactions
+    that commit after a run started are picked up by a later run. A row whose
+    transaction takes longer than that is never counted until `analytics rebuild`.
+
+    Returns
+    -------
+    int
+        The number of `(title, day)` rollups updated.
+    """
+    if lag is None:
+        lag = current_app.config.get('ANALYTICS_SAFETY_LAG', SAFETY_LAG)
+    desde = {nombre: leer_marca(nombre) or 0 for nombre in MARCAS}
+    hasta = {nombre: limite_seguro(f'{nombre}.visto', db.session.query(func.max(model.id)).scalar() or 0,
+                                   desde[nombre], lag)
+             for nombre, model in MARCAS.items()}
+    totales = _leer_deltas(desde, hasta)
+    _aplicar(totales)
+    for nombre, valor in hasta.items():
+        mover_marca(nombre, valor)
+    db.session.commit()
+    return len(totales)
+
+def reconstruir_resumenes():
+    """
+    Deletes the rollups and aggregates every row again.
+
+    Reviews keep their publication day, but watchlist entries have no date, so all of
+    them are counted on the day of the rebuild. The rebuild reads up to the current
+    maximum IDs, without the safety lag, so rows still uncommitted while it runs are
+    left out.
+    """
+    db.session.query(ResumenDiarioTitulo).delete()
+    for nombre in MARCAS:
+        mover_marca(nombre, 0)
+    db.session.flush()
+    return actualizar_resumenes(lag=0)
+
+def resumen_productora(productora_id: int, desde, hasta):
+    """
+    Returns the analytics of a producer between the days `desde` and `hasta`, both included.
+
+    Returns
+    -------
+    dict
+        The `totales` of the period, and the metrics per day (`dias`) and per title
+        (`titulos`). Each entry has `resenias`, `promedio` (None without reviews),
+        `nuevos_seguimientos` and `episodios_vistos`.
+    """
+    sumas = [func.sum(getattr(ResumenDiarioTitulo, nombre)) for nombre in METRICAS]
+    filtro = (ResumenDiarioTitulo.productora_id == productora_id,
+              ResumenDiarioTitulo.dia >= desde, ResumenDiarioTitulo.dia <= hasta)
+
+    def entrada(valores):
+        resenias, suma, seguimientos, vistos = valores
+        return {'resenias': resenias,
+                'promedio': round(suma / resenias, 2) if resenias else None,
+                'nuevos_seguimientos': seguimientos,
+                'episodios_vistos': vistos}
+
+    def enteros(valores):
+        return [int(valor or 0) for valor in valores]
+
+    dias = [(dia, enteros(valores)) for dia, *valores in
+            db.session.query(ResumenDiarioTitulo.dia, *sumas)
+            .filter(*filtro).group_by(ResumenDiarioTitulo.dia).order_by(ResumenDiarioTitulo.dia)]
+    titulos = (db.session.query(ResumenDiarioTitulo.titulo_id, *sumas)
+               .filter(*filtro).group_by(ResumenDiarioTitulo.titulo_id).order_by(ResumenDiarioTitulo.titulo_id))
+    totales = [sum(columna) for columna in zip(*(valores for _, valores in dias))] or [0] * len(METRICAS)
+    return {'totales': entrada(totales),
+            'dias': [{'dia': dia.isoformat(), **entrada(valores)} for dia, valores in dias],
+            'titulos': [{'titulo_id': titulo_id, **entrada(enteros(valores))} for titulo_id, *valores in titulos]}
+
+@analytics_cli.command('refresh')
+def refresh_command():
+    """Add the activity created since the last run to the daily rollups."""
+    count = actualizar_resumenes()
+    click.echo(f'Updated {count} daily rollups.')
+
+@analytics_cli.command('rebuild')
+def rebuild_command():
+    """Rebuild the daily rollups from every review, watchlist entry and progress event."""
+    count = reconstruir_resumenes()
+    click.echo(f'Rebuilt {count} daily rollups.')
@@ -0,0 +1,140 @@
+from typing import Literal
+
+from flask import session
+
+import jwt
+
+from auth import ROLE_MODELS, decode_token, generate_token
+from models.models import DataBase
+from services.passwords import PasswordPoolSaturated, hash_password, needs_rehash
+from services.sessions import revoke
+
+db = DataBase().db
+
+# Mensajes de cada rol, iguales a los que devolvian UserAPI y ProducerAPI.
+LOGIN_MESSAGES = {'user': 'User verified successfully', 'producer': 'Producer authorized'}
+LOGIN_FAILURE_STATUS = {'user': 403, 'producer': 400}
+BUSY_MESSAGE = 'Servidor ocupado, intenta de nuevo en unos segundos'
+RETRY_AFTER = '1'
+
+class AuthError(Exception):
+    """
+    Raised when a login or a signup is rejected.
+
+    Attributes:
+    -----------
+    message : str
+        The error message returned to the client.
+    status : int
+        The HTTP status code of the response.
+    """
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+    def response(self):
+        """
+        Returns the error as a `(body, status)` tuple, adding `Retry-After` when the server is busy.
+        """
+        if self.status == 503:
+            return {'error': self.message}, self.status, {'Retry-After': RETRY_AFTER}
+        return {'error': self.message}, self.status
+
+def authenticate(role: Literal['user', 'producer'], email: str, password: str):
+    """
+    Returns the account of `role` with the given credentials, or raises `AuthError`.
+
+    If the stored hash was made with a different method or cost than `PASSWORD_HASH_METHOD`,
+    the password is hashed again with the current settings and saved.
+    """
+    if not email or not password:
+        raise AuthError('Falta data', 400)
+
+    account = ROLE_MODELS[role].query.filter_by(email=email).first()
+    try:
+        if not account or not account.check_password(password):
+            raise AuthError('Login info incorrect.', LOGIN_FAILURE_STATUS[role])
+        if needs_rehash(account.contraseña):
+            account.contraseña = hash_password(password)
+            db.session.commit()
+    except PasswordPoolSaturated:
+        db.session.rollback()
+        raise AuthError(BUSY_MESSAGE, 503) from None
+    return account
+
+def register(role: Literal['user', 'producer'], username: str, email: str, password: str):
+    """
+    Creates and commits a new account of `role`, or raises `AuthError` if the data is missing or taken.
+    """
+    if not username or not email or not password:
+        raise AuthError('Falta data', 400)
+
+    model = ROLE_MODELS[role]
+    if model.query.filter_by(email=email).first():
+        raise AuthError('Email ya esta registrado', 400)
+    if model.query.filter_by(nombre_usuario=username).first():
+        raise AuthError('Username ya existe', 400)
+
+    account = model(nombre_usuario=username, email=email)
+    try:
+        account.set_password(password)
+    except PasswordPoolSaturated:
+        raise AuthError(BUSY_MESSAGE, 503) from None
+    db.session.add(account)
+    db.session.commit()
+    return account
+
+def start_session(account, role: Literal['user', 'producer']):
+    """
+    Issues a token for `account` and stores it in the session of the current request.
+    """
+    token = generate_token(account.nombre_usuario, role)
+    session['auth_token'] = token
+    return token
+
+def end_session():
+    """
+    Removes the token from the session of the current request and revokes it, so a copy
+    of it is not accepted anymore either.
+    """
+    token = session.pop('auth_token', None)
+    if not token:
+        return
+    try:
+        claims = decode_token(token)
+    except jwt.InvalidTokenError:
+        return
+    revoke(claims)
+
+def login(role: Literal['user', 'producer'], data):
+    """
+    Logs in with the `email` and `password` of `data` and starts a session.
+
+    Returns the response of the JSON API as a `(body, status)` tuple (plus a `Retry-After`
+    header when the password pool is saturated), so both the API resources and the HTML
+    front blueprints can call it directly in their own request.
+    """
+    if not data or 'email' not in data or 'password' not in data:
+        return {'error': 'Falta data'}, 400
+    try:
+        account = authenticate(role, data['email'], data['password'])
+    except AuthError as error:
+        return error.response()
+    start_session(account, role)
+    return {'message': LOGIN_MESSAGES[role]}, 200
+
+def signup(role: Literal['user', 'producer'], data):
+    """
+    Registers an account with the `username`, `email` and `password` of `data` and starts a session.
+
+    Returns the response of the JSON API as a `(body, status)` tuple, like `login`.
+    """
+    if not data or 'username' not in data or 'email' not in data or 'password' not in data:
+        return {'error': 'Falta data'}, 400
+    try:
+        account = register(role, data['username'], data['email'], data['password'])
+    except AuthError as error:
+        return error.response()
+    start_session(account, role)
+    return {'message': 'Usuario registrado'}, 200
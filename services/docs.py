@@ -0,0 +1,57 @@
+import json
+import os
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from flasgger import Swagger
+
+docs_cli = AppGroup('docs', help='Build the OpenAPI spec served by /apidocs.')
+
+class PrebuiltSwagger(Swagger):
+    """
+    `Swagger` that can serve a spec precompiled with `flask docs build`.
+
+    flasgger builds the spec from the YAML docstrings the first time a spec route is
+    requested and keeps it for the life of the process. When `SWAGGER_SPEC_FILE`
+    points to an existing JSON file, that file is served instead, so no docstring is
+    parsed at all. The file maps each spec endpoint (e.g. `apispec_1`) to its spec.
+    In debug mode the spec is always rebuilt from the docstrings.
+    """
+
+    def get_apispecs(self, endpoint='apispec_1'):
+        if not self.app.debug and endpoint not in self.apispecs:
+            prebuilt = load_spec_file(self.app.config.get('SWAGGER_SPEC_FILE'))
+            if endpoint in prebuilt:
+                self.apispecs[endpoint] = prebuilt[endpoint]
+        return super().get_apispecs(endpoint)
+
+def load_spec_file(path):
+    """
+    Returns the specs stored in `path` by `flask docs build`, or an empty dict if there is no such file.
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+def build_specs(swagger: Swagger):
+    """
+    Builds the spec of every spec endpoint of `swagger` from the docstrings.
+    """
+    swagger.apispecs.clear()
+    return {spec['endpoint']: Swagger.get_apispecs(swagger, spec['endpoint'])
+            for spec in swagger.config['specs']}
+
+@docs_cli.command('build')
+@click.option('--output', default=None, help='Path of the JSON file (defaults to SWAGGER_SPEC_FILE).')
+def build_command(output):
+    """Precompile the OpenAPI spec from the endpoint docstrings."""
+    output = output or current_app.config.get('SWAGGER_SPEC_FILE')
+    if not output:
+        raise click.UsageError('Set SWAGGER_SPEC_FILE or pass --output.')
+    specs = build_specs(current_app.swag)
+    with open(output, 'w', encoding='utf-8') as file:
+        json.dump(specs, file, ensure_ascii=False, sort_keys=True)
+    paths = sum(len(spec.get('paths', {})) for spec in specs.values())
+    click.echo(f'Wrote {len(specs)} specs with {paths} paths to {output}.')
@@ -0,0 +1,89 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+# Perfiles de SQLite. 'default' deja los PRAGMAs de SQLite como vienen (journal DELETE,
+# synchronous FULL); 'wal' permite lecturas concurrentes con una escritura en curso.
+SQLITE_PROFILES = {
+    'default': {},
+    'wal': {'journal_mode': 'WAL', 'synchronous': 'NORMAL'},
+}
+
+DEFAULTS = {
+    'DB_POOL_SIZE': 10,
+    'DB_MAX_OVERFLOW': 20,
+    'DB_POOL_TIMEOUT': 30,
+    'DB_POOL_RECYCLE': 1800,
+    'DB_POOL_PRE_PING': True,
+    'DB_STATEMENT_TIMEOUT_MS': 5000,
+    'SQLITE_PROFILE': 'wal',
+    'SQLITE_BUSY_TIMEOUT_MS': 5000,
+    'SQLITE_MMAP_SIZE': 256 * 1024 * 1024,
+}
+
+def _setting(config, key: str):
+    return config.get(key, DEFAULTS[key])
+
+def _is_memory_sqlite(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+def engine_options(uri: str, config):
+    """
+    Builds `SQLALCHEMY_ENGINE_OPTIONS` for `uri` from the `DB_*` settings of `config`.
+
+    Pool sizing, pre-ping and recycling apply to every backend that uses a connection
+    pool. The statement timeout is sent to PostgreSQL as a connection option; SQLite
+    has no statement timeout, so there `busy_timeout` bounds how long a statement
+    waits for a lock instead.
+    """
+    url = make_url(uri)
+    if _is_memory_sqlite(url):
+        # Las bases en memoria usan un pool de una conexion por thread, que no acepta tamaños.
+        return {}
+
+    options = {
+        'pool_size': _setting(config, 'DB_POOL_SIZE'),
+        'max_overflow': _setting(config, 'DB_MAX_OVERFLOW'),
+        'pool_timeout': _setting(config, 'DB_POOL_TIMEOUT'),
+        'pool_recycle': _setting(config, 'DB_POOL_RECYCLE'),
+        'pool_pre_ping': _setting(config, 'DB_POOL_PRE_PING'),
+    }
+    backend = url.get_backend_name()
+    if backend == 'postgresql':
+        timeout = _setting(config, 'DB_STATEMENT_TIMEOUT_MS')
+        if timeout:
+            options['connect_args'] = {'options': f'-c statement_timeout={int(timeout)}'}
+    elif backend == 'sqlite':
+        options['connect_args'] = {'timeout': _setting(config, 'SQLITE_BUSY_TIMEOUT_MS') / 1000}
+    return options
+
+def sqlite_pragmas(config):
+    """
+    Returns the PRAGMAs to run on every new SQLite connection for the configured `SQLITE_PROFILE`.
+    """
+    profile = _setting(config, 'SQLITE_PROFILE')
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(f'Unknown SQLITE_PROFILE {profile!r}')
+    pragmas = {'busy_timeout': int(_setting(config, 'SQLITE_BUSY_TIMEOUT_MS'))}
+    if profile != 'default':
+        pragmas['mmap_size'] = int(_setting(config, 'SQLITE_MMAP_SIZE'))
+        pragmas.update(SQLITE_PROFILES[profile])
+    return pragmas
+
+def init_engine(engine, config):
+    """
+    Applies the SQLite profile of `config` to every connection `engine` opens.
+
+    Does nothing for other backends, whose settings are passed through `engine_options`.
+    """
+    if engine.dialect.name != 'sqlite' or _is_memory_sqlite(engine.url):
+        return
+    pragmas = sqlite_pragmas(config)
+
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f'PRAGMA {name}={value}')
+        finally:
+            cursor.close()
@@ -0,0 +1,110 @@
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import literal
+
+from models.models import Actividad, DataBase, EntradaFeed, Relacion, TipoActividad, Titulo, Usuario
+from services.follow_graph import get_follow_graph
+
+db = DataBase().db
+
+FEED_FANOUT_LIMIT = 1000
+FEED_BACKFILL = 20
+
+
+def registrar_actividad(usuario_id: int, tipo: TipoActividad, titulo_id: int, referencia_id: int, detalle=None):
+    """
+    Records an activity of `usuario_id` in the current session's transaction.
+
+    If the author has at most `FEED_FANOUT_LIMIT` followers the activity is copied to
+    every follower's feed with a single INSERT ... SELECT (fan-out on write). Activities
+    of accounts with more followers are left undistributed and `leer_feed` merges them
+    in when a follower reads their feed (fan-out on read).
+
+    The follower count comes from this process's follow graph, which may be stale, so
+    it only chooses between the two strategies: the INSERT ... SELECT always runs for
+    distributed activities and reads the followers from `Relaciones` itself.
+    """
+    limit = current_app.config.get('FEED_FANOUT_LIMIT', FEED_FANOUT_LIMIT)
+    seguidores = get_follow_graph().cantidad_seguidores(usuario_id)
+    actividad = Actividad(usuario_id=usuario_id, tipo=tipo, titulo_id=titulo_id, referencia_id=referencia_id,
+                          detalle=detalle, fecha=datetime.now(timezone.utc), difundida=seguidores <= limit)
+    db.session.add(actividad)
+    db.session.flush()
+
+    if actividad.difundida:
+        db.session.execute(
+            db.insert(EntradaFeed).from_select(
+                ['usuario_id', 'actividad_id'],
+                db.select(Relacion.seguidor, literal(actividad.id)).where(Relacion.seguido == usuario_id)))
+    return actividad
+
+def eliminar_actividades(tipo: TipoActividad, referencia_id: int):
+    """
+    Removes the activities about a deleted review, watchlist entry or comment from every feed.
+    """
+    ids = db.select(Actividad.id).where(Actividad.tipo == tipo, Actividad.referencia_id == referencia_id)
+    db.session.execute(db.delete(EntradaFeed).where(EntradaFeed.actividad_id.in_(ids)))
+    db.session.execute(db.delete(Actividad).where(Actividad.tipo == tipo, Actividad.referencia_id == referencia_id))
+
+def al_seguir(seguidor: int, seguido: int):
+    """
+    Copies the latest `FEED_BACKFILL` distributed activities of `seguido` to the feed of a new follower.
+    """
+    backfill = current_app.config.get('FEED_BACKFILL', FEED_BACKFILL)
+    if not backfill:
+        return
+    recientes = (db.select(literal(seguidor), Actividad.id)
+                 .where(Actividad.usuario_id == seguido, Actividad.difundida.is_(True))
+                 .order_by(Actividad.id.desc())
+                 .limit(backfill))
+    db.session.execute(db.insert(EntradaFeed).from_select(['usuario_id', 'actividad_id'], recientes))
+
+def al_dejar_de_seguir(seguidor: int, seguido: int):
+    """
+    Removes the activities of `seguido` from the feed of a former follower.
+    """
+    ids = db.select(Actividad.id).where(Actividad.usuario_id == seguido)
+    db.session.execute(db.delete(EntradaFeed).where(EntradaFeed.usuario_id == seguidor,
+                                                    EntradaFeed.actividad_id.in_(ids)))
+
+def leer_feed(usuario_id: int, after=None, limit: int = 50):
+    """
+    Returns one page of the feed of `usuario_id`, newest first, continuing before the activity ID `after`.
+
+    The distributed activities are a single range scan of the `EntradasFeed` primary
+    key. The undistributed activities of followed heavy accounts are read through
+    `Relaciones` and the `(usuario_id, difundida, id)` index of `Actividades`, which
+    only finds rows for the few heavy accounts, and both lists are merged by ID.
+
+    Returns
+    -------
+    tuple
+        The page as a list of `(Actividad, nombre_usuario, titulo)` rows and whether there are more pages.
+    """
+    difundidas = (db.select(EntradaFeed.actividad_id)
+                  .where(EntradaFeed.usuario_id == usuario_id)
+                  .order_by(EntradaFeed.actividad_id.desc())
+                  .limit(limit + 1))
+    pendientes = (db.select(Actividad.id)
+                  .join(Relacion, Relacion.seguido == Actividad.usuario_id)
+                  .where(Relacion.seguidor == usuario_id, Actividad.difundida.is_(False))
+                  .order_by(Actividad.id.desc())
+                  .limit(limit + 1))
+    if after is not None:
+        difundidas = difundidas.where(EntradaFeed.actividad_id < after)
+        pendientes = pendientes.where(Actividad.id < after)
+
+    ids = sorted({*db.session.scalars(difundidas), *db.session.scalars(pendientes)}, reverse=True)
+    hay_mas = len(ids) > limit
+    ids = ids[:limit]
+    if not ids:
+        return [], False
+
+    rows = (db.session.query(Actividad, Usuario.nombre_usuario, Titulo.titulo)
+            .outerjoin(Usuario, Usuario.id == Actividad.usuario_id)
+            .outerjoin(Titulo, Titulo.id == Actividad.titulo_id)
+            .filter(Actividad.id.in_(ids))
+            .order_by(Actividad.id.desc())
+            .all())
+    return rows, hay_mas
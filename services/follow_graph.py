@@ -0,0 +1,239 @@
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from threading import Lock, Thread
+import heapq
+import math
+import time
+
+from flask import current_app
+
+from models.models import DataBase, Relacion
+
+db = DataBase().db
+
+DEFAULT_REFRESH_INTERVAL = 60
+LOAD_BATCH_SIZE = 10000
+
+# Enteros de 64 bits: los IDs de la base pueden superar 2**31.
+TYPECODE = 'q'
+_EMPTY = array(TYPECODE)
+
+def _contains(values, value):
+    i = bisect_left(values, value)
+    return i < len(values) and values[i] == value
+
+def _with(values, value):
+    i = bisect_left(values, value)
+    if i < len(values) and values[i] == value:
+        return values
+    return values[:i] + array(TYPECODE, (value,)) + values[i:]
+
+def _without(values, value):
+    i = bisect_left(values, value)
+    if i == len(values) or values[i] != value:
+        return values
+    return values[:i] + values[i + 1:]
+
+def _apply(seguidos, seguidores, operation, seguidor: int, seguido: int):
+    for adjacency, key, value in ((seguidos, seguidor, seguido), (seguidores, seguido, seguidor)):
+        values = operation(adjacency.get(key, _EMPTY), value)
+        if values:
+            adjacency[key] = values
+        else:
+            adjacency.pop(key, None)
+
+def interseccion(a, b):
+    """
+    Returns the values present in both sorted arrays `a` and `b`, in ascending order.
+
+    Each value of the shorter array is searched for in the longer one, starting after
+    the previous match, so the cost is O(m log n) rather than O(m + n).
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    result = []
+    lo = 0
+    for value in a:
+        lo = bisect_left(b, value, lo)
+        if lo == len(b):
+            break
+        if b[lo] == value:
+            result.append(value)
+    return result
+
+class FollowGraph:
+    """
+    In-memory adjacency index of the `Relaciones` table.
+
+    Every user maps to two sorted arrays of 64 bit integers, the IDs they follow and
+    the IDs that follow them, so counts are a `len`, "follows you" checks are a binary
+    search and mutuals are the intersection of two sorted arrays. Users without
+    relations take no space.
+
+    Writes replace the affected arrays with updated copies instead of changing them in
+    place, so readers never need the lock and always see a consistent array. The
+    index is rebuilt from the table every `refresh_interval` seconds, in a background
+    thread, to pick up follows made by other processes; the current arrays keep being
+    served meanwhile, and follows made by this process while a rebuild is running are
+    replayed on the new index.
+    """
+
+    def __init__(self, refresh_interval: float = DEFAULT_REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._seguidos = {}
+        self._seguidores = {}
+        self._lock = Lock()
+        self._pendientes = None
+        self._next_refresh = math.inf
+
+    def load(self, batch_size: int = LOAD_BATCH_SIZE):
+        """
+        Rebuilds the index from `Relaciones`. Returns False if another thread is already rebuilding it.
+
+        Relations are read in primary key order, `(seguidor, seguido)`, so both the
+        followed and the follower arrays are filled already sorted.
+        """
+        with self._lock:
+            if self._pendientes is not None:
+                return False
+            self._pendientes = []
+            self._next_refresh = math.inf
+
+        seguidos, seguidores = {}, {}
+        statement = (db.select(Relacion.seguidor, Relacion.seguido)
+                     .order_by(Relacion.seguidor, Relacion.seguido)
+                     .execution_options(yield_per=batch_size))
+        try:
+            for seguidor, seguido in db.session.execute(statement):
+                values = seguidos.get(seguidor)
+                if values is None:
+                    values = seguidos[seguidor] = array(TYPECODE)
+                values.append(seguido)
+                values = seguidores.get(seguido)
+                if values is None:
+                    values = seguidores[seguido] = array(TYPECODE)
+                values.append(seguidor)
+        except BaseException:
+            with self._lock:
+                self._pendientes = None
+                self._schedule_refresh()
+            raise
+
+        with self._lock:
+            for operation, seguidor, seguido in self._pendientes:
+                _apply(seguidos, seguidores, operation, seguidor, seguido)
+            self._seguidos, self._seguidores = seguidos, seguidores
+            self._pendientes = None
+            self._schedule_refresh()
+        return True
+
+    def _schedule_refresh(self):
+        if self.refresh_interval:
+            self._next_refresh = time.monotonic() + self.refresh_interval
+
+    def refresh_in_background(self, app):
+        """
+        Starts a rebuild in a daemon thread with an app context of `app` if the index is
+        older than `refresh_interval`, unless one is already running.
+        """
+        with self._lock:
+            if self._pendientes is not None or time.monotonic() < self._next_refresh:
+                return
+            # Hasta que el thread arranque la recarga, ningun otro pedido inicia otra.
+            self._next_refresh = math.inf
+
+        def run():
+            try:
+                with app.app_context():
+                    self.load()
+            except Exception:
+                app.logger.exception('Could not refresh the follow graph')
+                with self._lock:
+                    if self._pendientes is None:
+                        self._schedule_refresh()
+
+        Thread(target=run, name='follow-graph-refresh', daemon=True).start()
+
+    def _write(self, operation, seguidor: int, seguido: int):
+        with self._lock:
+            _apply(self._seguidos, self._seguidores, operation, seguidor, seguido)
+            if self._pendientes is not None:
+                self._pendientes.append((operation, seguidor, seguido))
+
+    def add(self, seguidor: int, seguido: int):
+        """
+        Records that `seguidor` follows `seguido`. Call it once the relation is committed.
+        """
+        self._write(_with, seguidor, seguido)
+
+    def remove(self, seguidor: int, seguido: int):
+        """
+        Records that `seguidor` no longer follows `seguido`. Call it once the deletion is committed.
+        """
+        self._write(_without, seguidor, seguido)
+
+    def seguidos(self, usuario_id: int):
+        return self._seguidos.get(usuario_id, _EMPTY)
+
+    def seguidores(self, usuario_id: int):
+        return self._seguidores.get(usuario_id, _EMPTY)
+
+    def cantidad_seguidos(self, usuario_id: int):
+        return len(self.seguidos(usuario_id))
+
+    def cantidad_seguidores(self, usuario_id: int):
+        return len(self.seguidores(usuario_id))
+
+    def sigue(self, seguidor: int, seguido: int):
+        return _contains(self.seguidos(seguidor), seguido)
+
+    def mutuos(self, usuario_id: int):
+        """
+        Returns the IDs of the users that `usuario_id` follows and that follow them back.
+        """
+        return interseccion(self.seguidos(usuario_id), self.seguidores(usuario_id))
+
+    def sugerencias(self, usuario_id: int, limit: int = 10):
+        """
+        Suggests users followed by the users `usuario_id` follows (friends of friends).
+
+        Returns
+        -------
+        list of tuple
+            Up to `limit` `(id, en_comun)` pairs, where `en_comun` is how many of the
+            users followed by `usuario_id` follow the suggested user. They are sorted
+            by `en_comun`, descending, and then by ID. Users `usuario_id` already
+            follows are left out.
+        """
+        seguidos = self.seguidos(usuario_id)
+        en_comun = Counter()
+        for seguido in seguidos:
+            en_comun.update(self.seguidos(seguido))
+        candidatos = ((-cantidad, candidato) for candidato, cantidad in en_comun.items()
+                      if candidato != usuario_id and not _contains(seguidos, candidato))
+        return [(candidato, -cantidad) for cantidad, candidato in heapq.nsmallest(limit, candidatos)]
+
+def get_follow_graph() -> FollowGraph:
+    """
+    Returns the follow graph of the current app.
+
+    The first call loads it synchronously. Afterwards, a call made more than
+    `FOLLOW_GRAPH_REFRESH_INTERVAL` seconds after the last load starts a rebuild in
+    the background and returns the current index without waiting for it.
+    """
+    graph = current_app.extensions.get('follow_graph')
+    if graph is None:
+        graph = FollowGraph(current_app.config.get('FOLLOW_GRAPH_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL))
+        graph.load()
+        graph = current_app.extensions.setdefault('follow_graph', graph)
+    else:
+        graph.refresh_in_background(current_app._get_current_object())
+    return graph
+
+def init_follow_graph(app):
+    """
+    Loads the follow graph of `app` from the database. Must run inside an app context.
+    """
+    app.extensions.pop('follow_graph', None)
+    get_follow_graph()
@@ -0,0 +1,65 @@
+import click
+from flask.cli import AppGroup
+from sqlalchemy import case, func
+
+from models.models import ContadorImpresiones, DataBase, Impresion, Reseña
+from services.upserts import insertar_si_falta
+
+db = DataBase().db
+
+impressions_cli = AppGroup('impressions', help='Manage the like and dislike counters of reviews.')
+
+def registrar_impresion(resenia_id: int, valor: int, delta: int = 1):
+    """
+    Adds (`delta=1`) or removes (`delta=-1`) an impression from the counters of a review.
+
+    The counters row is created if missing and incremented with a single UPDATE in the
+    current session's transaction, so they are committed or rolled back together with
+    the impression.
+    """
+    insertar_si_falta(ContadorImpresiones, resenia_id=resenia_id, likes=0, dislikes=0)
+    column = ContadorImpresiones.likes if valor == 1 else ContadorImpresiones.dislikes
+    db.session.execute(
+        db.update(ContadorImpresiones)
+        .where(ContadorImpresiones.resenia_id == resenia_id)
+        .values({column: case((column + delta < 0, 0), else_=column + delta)})
+    )
+
+def obtener_contadores(resenia_id: int):
+    """
+    Returns the number of likes and dislikes of a review.
+    """
+    contador = db.session.get(ContadorImpresiones, resenia_id)
+    if contador is None:
+        return {'likes': 0, 'dislikes': 0}
+    return {'likes': contador.likes, 'dislikes': contador.dislikes}
+
+def reconstruir_contadores():
+    """
+    Rebuilds the counters of every review from its impressions and commits the result.
+
+    Returns
+    -------
+    int
+        The number of reviews with at least one impression.
+    """
+    rows = (db.session.query(Impresion.resenia_id,
+                             func.sum(case((Impresion.valor == 1, 1), else_=0)),
+                             func.sum(case((Impresion.valor == -1, 1), else_=0)))
+            .join(Reseña, Reseña.id == Impresion.resenia_id)
+            .group_by(Impresion.resenia_id)
+            .all())
+
+    db.session.query(ContadorImpresiones).delete()
+    if rows:
+        db.session.execute(db.insert(ContadorImpresiones),
+                           [{'resenia_id': resenia_id, 'likes': likes, 'dislikes': dislikes}
+                            for resenia_id, likes, dislikes in rows])
+    db.session.commit()
+    return len(rows)
+
+@impressions_cli.command('rebuild')
+def rebuild_command():
+    """Rebuild the like and dislike counters of every review from its impressions."""
+    count = reconstruir_contadores()
+    click.echo(f'Rebuilt impression counters for {count} reviews.')
@@ -0,0 +1,188 @@
+import threading
+import time
+import weakref
+from bisect import bisect_left
+
+from flask import Response, current_app, g, has_app_context, request
+
+from services.query_stats import current_query_stats
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class _Shard:
+    __slots__ = ('counters', 'histograms')
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+
+class MetricsRegistry:
+    """
+    Counters and histograms exposed in the Prometheus text format.
+
+    Every thread writes to its own shard, so recording a value never takes a lock or
+    contends with other threads. Shards are only merged when the metrics are rendered.
+    The shards of threads that exited are folded into a base shard whenever a new
+    shard is created or the metrics are collected, so servers that start a thread per
+    request do not keep one shard per thread forever.
+    Labels are passed as tuples of `(name, value)` pairs.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._descriptions = {}
+        self._local = threading.local()
+        self._shards = []
+        self._base = _Shard()
+        self._lock = threading.Lock()
+
+    def describe(self, name: str, kind: str, help: str):
+        self._descriptions[name] = (kind, help)
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = _Shard()
+            with self._lock:
+                self._prune()
+                self._shards.append((weakref.ref(threading.current_thread()), shard))
+        return shard
+
+    def _prune(self):
+        # Se llama con el lock tomado. Un thread terminado ya no escribe en su shard.
+        vivos = []
+        for thread, shard in self._shards:
+            hilo = thread()
+            if hilo is not None and hilo.is_alive():
+                vivos.append((thread, shard))
+            else:
+                _merge(self._base, shard)
+        self._shards = vivos
+
+    def inc(self, name: str, labels: tuple = (), amount: float = 1):
+        counters = self._shard().counters
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+    def observe(self, name: str, labels: tuple, value: float):
+        histograms = self._shard().histograms
+        key = (name, labels)
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        histogram[0][bisect_left(self.buckets, value)] += 1
+        histogram[1] += value
+
+    def collect(self):
+        """
+        Merges the shards of every thread.
+
+        Returns
+        -------
+        tuple
+            Counter values and histograms (per bucket counts and sum), keyed by `(name, labels)`.
+        """
+        total = _Shard()
+        with self._lock:
+            self._prune()
+            _merge(total, self._base)
+            shards = [shard for _, shard in self._shards]
+        for shard in shards:
+            _merge(total, shard)
+        return total.counters, total.histograms
+
+    def render(self) -> str:
+        counters, histograms = self.collect()
+        lines = []
+        for name in sorted({key[0] for key in counters} | {key[0] for key in histograms}):
+            kind, help = self._descriptions.get(name, ('untyped', ''))
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+            for (metric, labels), (counts, total) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else _format_value(bound)
+                    lines.append(f'{name}_bucket{_format_labels(labels + (("le", le),))} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(total)}')
+                lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+def _merge(target: _Shard, shard: _Shard):
+    for key, value in dict(shard.counters).items():
+        target.counters[key] = target.counters.get(key, 0) + value
+    for key, (counts, total) in dict(shard.histograms).items():
+        merged = target.histograms.setdefault(key, [[0] * len(counts), 0.0])
+        for i, count in enumerate(list(counts)):
+            merged[0][i] += count
+        merged[1] += total
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+def _format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def get_metrics():
+    """
+    Returns the `MetricsRegistry` of the current app, or None if metrics are not set up.
+    """
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('metrics')
+
+def record_jwt_decode(elapsed: float):
+    """
+    Records the time spent decoding and verifying a JWT.
+    """
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.observe('watchnet_jwt_decode_seconds', (), elapsed)
+
+def init_metrics(app):
+    """
+    Records request counts, latencies and database time for every endpoint of `app`,
+    and serves them from `/metrics` in the Prometheus text format.
+    """
+    metrics = MetricsRegistry(app.config.get('METRICS_BUCKETS', DEFAULT_BUCKETS))
+    metrics.describe('watchnet_http_requests_total', 'counter', 'Requests by endpoint, method and status code.')
+    metrics.describe('watchnet_http_request_duration_seconds', 'histogram', 'Request latency by endpoint and method.')
+    metrics.describe('watchnet_http_request_db_seconds', 'histogram', 'Time spent in SQL per request.')
+    metrics.describe('watchnet_db_queries_total', 'counter', 'SQL statements executed by endpoint and method.')
+    metrics.describe('watchnet_jwt_decode_seconds', 'histogram', 'Time spent decoding and verifying JWTs.')
+    metrics.describe('watchnet_password_pool_rejections_total', 'counter',
+                     'Logins and signups rejected because the password pool was saturated.')
+    app.extensions['metrics'] = metrics
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start = g.get('request_start')
+        if start is None:
+            return response
+        labels = (('endpoint', request.endpoint or 'unmatched'), ('method', request.method))
+        metrics.inc('watchnet_http_requests_total', labels + (('status', str(response.status_code)),))
+        metrics.observe('watchnet_http_request_duration_seconds', labels, time.perf_counter() - start)
+        stats = current_query_stats()
+        if stats is not None:
+            metrics.observe('watchnet_http_request_db_seconds', labels, stats.total_time)
+            metrics.inc('watchnet_db_queries_total', labels, stats.count)
+        return response
+
+    def metrics_view():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,122 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from functools import lru_cache
+from threading import BoundedSemaphore
+
+from flask import current_app, has_app_context
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from services.metrics import get_metrics
+
+DEFAULT_HASH_METHOD = 'pbkdf2:sha256:600000'
+DEFAULT_WORKERS = 4
+DEFAULT_QUEUE_DEPTH = 16
+DEFAULT_TIMEOUT = 10
+
+class PasswordPoolSaturated(Exception):
+    """
+    Raised when the password pool has no free slot, or a job did not finish in time.
+    """
+
+class PasswordPool:
+    """
+    Bounded thread pool that runs password hashing and verification off the request thread.
+
+    PBKDF2 and scrypt release the GIL while they hash, so the workers run in parallel
+    with the request threads. At most `workers + queue_depth` jobs are accepted at a
+    time; once they are all taken `run` raises `PasswordPoolSaturated` immediately
+    instead of queueing, so a login storm cannot pile up waiting requests.
+
+    Attributes:
+    -----------
+    workers : int
+        The number of threads that hash passwords.
+    queue_depth : int
+        How many jobs may wait for a free worker.
+    timeout : float
+        Seconds a request waits for its job before giving up.
+    """
+    def __init__(self, workers: int = DEFAULT_WORKERS, queue_depth: int = DEFAULT_QUEUE_DEPTH,
+                 timeout: float = DEFAULT_TIMEOUT):
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.timeout = timeout
+        self._slots = BoundedSemaphore(workers + queue_depth)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password')
+
+    def run(self, fn, *args):
+        """
+        Runs `fn(*args)` in the pool and returns its result.
+        """
+        if not self._slots.acquire(blocking=False):
+            _record_rejection('saturated')
+            raise PasswordPoolSaturated()
+        try:
+            future = self._executor.submit(fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        # El slot se libera cuando el job termina, aunque el request ya haya dejado de esperarlo.
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            _record_rejection('timeout')
+            raise PasswordPoolSaturated() from None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+def _record_rejection(reason: str):
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.inc('watchnet_password_pool_rejections_total', (('reason', reason),))
+
+def get_password_pool():
+    """
+    Returns the `PasswordPool` of the current app, creating it from the app config on first use.
+    """
+    pool = current_app.extensions.get('password_pool')
+    if pool is None:
+        config = current_app.config
+        pool = current_app.extensions.setdefault('password_pool', PasswordPool(
+            config.get('PASSWORD_POOL_WORKERS', DEFAULT_WORKERS),
+            config.get('PASSWORD_POOL_QUEUE_DEPTH', DEFAULT_QUEUE_DEPTH),
+            config.get('PASSWORD_POOL_TIMEOUT', DEFAULT_TIMEOUT)))
+    return pool
+
+def hash_method():
+    """
+    Returns the werkzeug hash method configured with `PASSWORD_HASH_METHOD`.
+    """
+    if has_app_context():
+        return current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_HASH_METHOD)
+    return DEFAULT_HASH_METHOD
+
+def _run(fn, *args):
+    if not has_app_context():
+        return fn(*args)
+    return get_password_pool().run(fn, *args)
+
+def hash_password(password: str):
+    """
+    Hashes `password` with the configured method in the password pool.
+    """
+    return _run(generate_password_hash, password, hash_method())
+
+def verify_password(password_hash: str, password: str):
+    """
+    Checks `password` against `password_hash` in the password pool.
+    """
+    return _run(check_password_hash, password_hash, password)
+
+@lru_cache(maxsize=8)
+def _canonical_method(method: str):
+    # werkzeug completa los parametros por defecto ('pbkdf2' -> 'pbkdf2:sha256:600000'),
+    # asi que se compara contra el prefijo que escribe realmente en el hash.
+    return generate_password_hash('', method).split('$', 1)[0]
+
+def needs_rehash(password_hash: str):
+    """
+    True if `password_hash` was not produced with the configured hash method and cost.
+    """
+    return password_hash.split('$', 1)[0] != _canonical_method(hash_method())
@@ -0,0 +1,137 @@
+import logging
+import time
+from collections import Counter
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUDGET = 20
+QUERY_REPEAT_THRESHOLD = 5
+
+class QueryStats:
+    """
+    SQL statements executed while handling one request.
+
+    Attributes:
+    -----------
+    count : int
+        Number of statements executed.
+    total_time : float
+        Time spent executing them, in seconds.
+    shapes : Counter
+        Executions per statement text, regardless of its parameters.
+    duplicates : Counter
+        Executions per statement text and hash of its parameters. Batches sent with
+        `executemany` are not tracked.
+    """
+    __slots__ = ('count', 'total_time', 'shapes', 'duplicates')
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes = Counter()
+        self.duplicates = Counter()
+
+    def record(self, statement: str, parameters, elapsed: float):
+        self.count += 1
+        self.total_time += elapsed
+        self.shapes[statement] += 1
+        key = _parameters_key(parameters)
+        if key is not None:
+            self.duplicates[(statement, key)] += 1
+
+    def repeated(self, threshold: int):
+        """
+        Returns the statements that look like an N+1 pattern or a redundant lookup: those
+        executed at least `threshold` times with any parameters, and those executed
+        more than once with the same parameters.
+        """
+        flagged = {statement: n for statement, n in self.shapes.items() if n >= threshold}
+        for (statement, _), n in self.duplicates.items():
+            if n > 1:
+                flagged.setdefault(statement, n)
+        return flagged
+
+def _parameters_key(parameters):
+    # Se guarda un hash y no `repr`, que se pagaria en cada sentencia. Las listas son
+    # lotes de `executemany`, que no son consultas repetidas.
+    try:
+        if isinstance(parameters, tuple):
+            return hash(parameters)
+        if isinstance(parameters, dict):
+            return hash(frozenset(parameters.items()))
+    except TypeError:
+        pass
+    return None
+
+def current_query_stats():
+    """
+    Returns the `QueryStats` of the current request, or None outside of a request or
+    if the app was not set up with `init_query_stats`.
+    """
+    if not has_request_context():
+        return None
+    return g.get('query_stats')
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+    context._query_stats_started = True
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info['query_start_time'].pop()
+    context._query_stats_started = False
+    stats = current_query_stats()
+    if stats is not None:
+        stats.record(statement, parameters, time.perf_counter() - start)
+
+def _handle_error(exception_context):
+    # Una sentencia que falla no llega a `after_cursor_execute`: se descarta su inicio.
+    context = exception_context.execution_context
+    if context is not None and getattr(context, '_query_stats_started', False):
+        context._query_stats_started = False
+        exception_context.connection.info['query_start_time'].pop()
+
+def _register_engine_events():
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+def init_query_stats(app):
+    """
+    Counts the SQL statements and their time for every request of `app`.
+
+    In debug mode, or with `QUERY_STATS_HEADERS` enabled, the totals are returned in
+    the `X-Query-Count`, `X-Query-Time-Ms` and `X-Query-Repeated` response headers.
+    Requests that execute more than `QUERY_BUDGET` statements are logged, and so are
+    statements flagged by `QueryStats.repeated` with `QUERY_REPEAT_THRESHOLD`.
+    """
+    _register_engine_events()
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = QueryStats()
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = current_query_stats()
+        if stats is None:
+            return response
+
+        repeated = stats.repeated(app.config.get('QUERY_REPEAT_THRESHOLD', QUERY_REPEAT_THRESHOLD))
+        budget = app.config.get('QUERY_BUDGET', QUERY_BUDGET)
+        if budget is not None and stats.count > budget:
+            logger.warning('%s %s executed %d queries (budget %d) in %.1f ms',
+                           request.method, request.path, stats.count, budget, stats.total_time * 1000)
+        for statement, n in repeated.items():
+            logger.warning('%s %s repeated a query %d times: %s',
+                           request.method, request.path, n, ' '.join(statement.split())[:200])
+
+        if app.debug or app.config.get('QUERY_STATS_HEADERS'):
+            response.headers['X-Query-Count'] = str(stats.count)
+            response.headers['X-Query-Time-Ms'] = f'{stats.total_time * 1000:.3f}'
+            response.headers['X-Query-Repeated'] = str(len(repeated))
+        return response
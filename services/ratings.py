@@ -0,0 +1,90 @@
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func
+
+from models.models import DataBase, EstadisticaTitulo, Reseña, Titulo
+from services.upserts import insertar_si_falta
+
+db = DataBase().db
+
+ratings_cli = AppGroup('ratings', help='Manage the rating aggregates of titles.')
+
+PUNTUACION_MINIMA = 0
+PUNTUACION_MAXIMA = 10
+
+def puntuacion_valida(puntuacion):
+    """
+    Returns whether `puntuacion` is an integer score between `PUNTUACION_MINIMA` and `PUNTUACION_MAXIMA`.
+    """
+    return (isinstance(puntuacion, int) and not isinstance(puntuacion, bool)
+            and PUNTUACION_MINIMA <= puntuacion <= PUNTUACION_MAXIMA)
+
+def registrar_puntuacion(titulo_id: int, puntuacion: int, delta: int = 1):
+    """
+    Adds (`delta=1`) or removes (`delta=-1`) a review score from the aggregates of a title.
+
+    The aggregate row is created if missing, then locked and updated in the current
+    session's transaction, so it is committed or rolled back together with the review
+    itself. Creating the row first also serializes writers on SQLite, where
+    `SELECT ... FOR UPDATE` does not lock.
+    """
+    insertar_si_falta(EstadisticaTitulo, titulo_id=titulo_id, cantidad_resenias=0, suma_puntuaciones=0, histograma={})
+    stats = (EstadisticaTitulo.query
+             .filter_by(titulo_id=titulo_id)
+             .with_for_update()
+             .one())
+
+    stats.cantidad_resenias += delta
+    stats.suma_puntuaciones += delta * puntuacion
+
+    histograma = dict(stats.histograma or {})
+    key = str(puntuacion)
+    histograma[key] = histograma.get(key, 0) + delta
+    if histograma[key] <= 0:
+        del histograma[key]
+    stats.histograma = histograma
+
+def obtener_resumen(titulo_id: int):
+    """
+    Returns the rating summary of a title, as returned by `EstadisticaTitulo.resumen`.
+    """
+    stats = db.session.get(EstadisticaTitulo, titulo_id)
+    if stats is None:
+        return {'cantidad': 0, 'promedio': None, 'histograma': {}}
+    return stats.resumen()
+
+def reconstruir_estadisticas():
+    """
+    Rebuilds the aggregates of every title from its reviews and commits the result.
+
+    Returns
+    -------
+    int
+        The number of titles with at least one review.
+    """
+    rows = (db.session.query(Reseña.titulo_id, Reseña.puntuacion, func.count(Reseña.id))
+            .join(Titulo, Titulo.id == Reseña.titulo_id)
+            .group_by(Reseña.titulo_id, Reseña.puntuacion)
+            .all())
+
+    stats = {}
+    for titulo_id, puntuacion, cantidad in rows:
+        entry = stats.setdefault(titulo_id, {'titulo_id': titulo_id,
+                                             'cantidad_resenias': 0,
+                                             'suma_puntuaciones': 0,
+                                             'histograma': {}})
+        entry['cantidad_resenias'] += cantidad
+        entry['suma_puntuaciones'] += cantidad * puntuacion
+        entry['histograma'][str(puntuacion)] = cantidad
+
+    db.session.query(EstadisticaTitulo).delete()
+    if stats:
+        db.session.execute(db.insert(EstadisticaTitulo), list(stats.values()))
+    db.session.commit()
+    return len(stats)
+
+@ratings_cli.command('rebuild')
+def rebuild_command():
+    """Rebuild the rating aggregates of every title from its reviews."""
+    count = reconstruir_estadisticas()
+    click.echo(f'Rebuilt rating aggregates for {count} titles.')
@@ -0,0 +1,281 @@
+from dataclasses import dataclass
+
+import click
+import numpy as np
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import func
+
+from models.models import DataBase, Reseña, Seguimiento, Titulo, TituloSimilar
+from services.watermarks import leer_marca, mover_marca
+
+db = DataBase().db
+
+recommendations_cli = AppGroup('recommendations', help='Manage the precomputed similar titles.')
+
+TOP_K = 20
+BLOCK_CELLS = 4_000_000
+LOAD_BATCH_SIZE = 50_000
+PUNTUACION_MAXIMA = 10
+
+MARCA_RESENIAS = 'recomendaciones.resenias'
+MARCA_SEGUIMIENTOS = 'recomendaciones.seguimientos'
+
+@dataclass
+class MatrizInteracciones:
+    """
+    Sparse user x title matrix, stored both by user (CSR) and by title (CSC).
+
+    Users and titles are numbered by the position of their ID in `usuario_ids` and
+    `titulo_ids`. The titles of user `u` are `titulos[por_usuario[u]:por_usuario[u + 1]]`
+    with weights `pesos_usuario[...]`; the users of title `t` are
+    `usuarios[por_titulo[t]:por_titulo[t + 1]]` with weights `pesos_titulo[...]`.
+    """
+    usuario_ids: np.ndarray
+    titulo_ids: np.ndarray
+    por_usuario: np.ndarray
+    titulos: np.ndarray
+    pesos_usuario: np.ndarray
+    por_titulo: np.ndarray
+    usuarios: np.ndarray
+    pesos_titulo: np.ndarray
+    normas: np.ndarray
+
+    @property
+    def cantidad_titulos(self):
+        return len(self.titulo_ids)
+
+def _rangos(inicios, cantidades):
+    """
+    Concatenates `arange(inicio, inicio + cantidad)` for each pair, without a Python loop.
+    """
+    if not len(cantidades):
+        return np.zeros(0, dtype=np.int64)
+    desplazamientos = inicios - np.cumsum(cantidades) + cantidades
+    return np.repeat(desplazamientos, cantidades) + np.arange(cantidades.sum())
+
+def _punteros(indices, cantidad: int):
+    return np.concatenate(([0], np.cumsum(np.bincount(indices, minlength=cantidad))))
+
+def construir_matriz(usuarios, titulos, pesos) -> MatrizInteracciones:
+    """
+    Builds the interaction matrix from parallel arrays of user IDs, title IDs and weights.
+
+    Repeated `(usuario, titulo)` pairs are added together.
+    """
+    usuario_ids, u = np.unique(np.asarray(usuarios, dtype=np.int64), return_inverse=True)
+    titulo_ids, t = np.unique(np.asarray(titulos, dtype=np.int64), return_inverse=True)
+    n_usuarios, n_titulos = len(usuario_ids), len(titulo_ids)
+
+    claves, inversa = np.unique(u * n_titulos + t, return_inverse=True)
+    valores = np.bincount(inversa, weights=np.asarray(pesos, dtype=np.float64), minlength=len(claves))
+    u, t = claves // n_titulos, claves % n_titulos
+
+    # Las claves quedan ordenadas por (usuario, titulo): ya es el orden CSR.
+    orden = np.argsort(t, kind='stable')
+    return MatrizInteracciones(
+        usuario_ids=usuario_ids,
+        titulo_ids=titulo_ids,
+        por_usuario=_punteros(u, n_usuarios),
+        titulos=t,
+        pesos_usuario=valores,
+        por_titulo=_punteros(t, n_titulos),
+        usuarios=u[orden],
+        pesos_titulo=valores[orden],
+        normas=np.sqrt(np.bincount(t, weights=valores ** 2, minlength=n_titulos)),
+    )
+
+def similitudes(matriz: MatrizInteracciones, filas):
+    """
+    Returns the cosine similarity between the titles `filas` and every title as a dense
+    `len(filas) x cantidad_titulos` array, with the similarity of a title to itself set to 0.
+
+    The products are computed by expanding each (title, user) pair of `filas` into
+    the other titles of that user and summing the weight products with a single
+    `bincount`, so the cost is proportional to the number of co-occurrences.
+    """
+    filas = np.asarray(filas, dtype=np.int64)
+    n_titulos = matriz.cantidad_titulos
+
+    cantidades = matriz.por_titulo[filas + 1] - matriz.por_titulo[filas]
+    posiciones = _rangos(matriz.por_titulo[filas], cantidades)
+    locales = np.repeat(np.arange(len(filas)), cantidades)
+    usuarios = matriz.usuarios[posiciones]
+    pesos = matriz.pesos_titulo[posiciones]
+
+    cantidades = matriz.por_usuario[usuarios + 1] - matriz.por_usuario[usuarios]
+    posiciones = _rangos(matriz.por_usuario[usuarios], cantidades)
+    locales = np.repeat(locales, cantidades)
+    pesos = np.repeat(pesos, cantidades) * matriz.pesos_usuario[posiciones]
+    columnas = matriz.titulos[posiciones]
+
+    productos = np.bincount(locales * n_titulos + columnas, weights=pesos, minlength=len(filas) * n_titulos)
+    productos = productos.reshape(len(filas), n_titulos)
+    normas = np.outer(matriz.normas[filas], matriz.normas)
+    resultado = np.divide(productos, normas, out=np.zeros_like(productos), where=normas > 0)
+    resultado[np.arange(len(filas)), filas] = 0
+    return resultado
+
+def top_k(bloque, k: int):
+    """
+    Returns the column indices and scores of the `k` highest positive scores of each row, best first.
+    """
+    k = min(k, bloque.shape[1])
+    if k < bloque.shape[1]:
+        columnas = np.argpartition(-bloque, k - 1, axis=1)[:, :k]
+    else:
+        columnas = np.tile(np.arange(bloque.shape[1]), (bloque.shape[0], 1))
+    puntajes = np.take_along_axis(bloque, columnas, axis=1)
+    orden = np.argsort(-puntajes, axis=1, kind='stable')
+    return np.take_along_axis(columnas, orden, axis=1), np.take_along_axis(puntajes, orden, axis=1)
+
+def _maximos():
+    return {
+        MARCA_RESENIAS: db.session.query(func.max(Reseña.id)).scalar() or 0,
+        MARCA_SEGUIMIENTOS: db.session.query(func.max(Seguimiento.id)).scalar() or 0,
+    }
+
+def _leer(statement, columnas: int):
+    partes = [np.array(partition, dtype=np.float64).reshape(-1, columnas)
+              for partition in db.session.execute(statement.execution_options(yield_per=LOAD_BATCH_SIZE)).partitions()]
+    return np.concatenate(partes) if partes else np.zeros((0, columnas))
+
+def cargar_matriz(marcas) -> MatrizInteracciones:
+    """
+    Loads the reviews and watchlist entries up to the IDs in `marcas` into an interaction matrix.
+
+    A watchlist entry weighs 1 and a review adds its score divided by
+    `PUNTUACION_MAXIMA`, so a title a user watched and rated highly weighs more than
+    one they only added to their watchlist.
+    """
+    resenias = _leer(db.select(Reseña.usuario_id, Reseña.titulo_id, Reseña.puntuacion)
+                     .where(Reseña.id <= marcas[MARCA_RESENIAS]), 3)
+    seguimientos = _leer(db.select(Seguimiento.usuario_id, Seguimiento.titulo_id)
+                         .where(Seguimiento.id <= marcas[MARCA_SEGUIMIENTOS]), 2)
+    pesos = np.concatenate((np.clip(resenias[:, 2] / PUNTUACION_MAXIMA, 0, 1), np.ones(len(seguimientos))))
+    return construir_matriz(np.concatenate((resenias[:, 0], seguimientos[:, 0])),
+                            np.concatenate((resenias[:, 1], seguimientos[:, 1])),
+                            pesos)
+
+def bloques(matriz: MatrizInteracciones, filas, celdas: int):
+    """
+    Splits `filas` into consecutive blocks whose `similitudes` use about `celdas` cells each.
+
+    A row costs its dense output (`cantidad_titulos` cells) plus its co-occurrences:
+    the number of titles of each of its users, which is the length of the arrays
+    `similitudes` expands it into. A row that alone exceeds `celdas` gets its own block.
+    """
+    usuarios_por_titulo = np.diff(matriz.por_titulo)
+    grados = np.diff(matriz.por_usuario)[matriz.usuarios]
+    coocurrencias = np.bincount(np.repeat(np.arange(matriz.cantidad_titulos), usuarios_por_titulo),
+                                weights=grados, minlength=matriz.cantidad_titulos)
+    acumulado = np.cumsum(matriz.cantidad_titulos + coocurrencias[filas])
+    inicio = 0
+    while inicio < len(filas):
+        previo = acumulado[inicio - 1] if inicio else 0
+        fin = max(inicio + 1, int(np.searchsorted(acumulado, previo + celdas, side='right')))
+        yield filas[inicio:fin]
+        inicio = fin
+
+def _guardar(matriz: MatrizInteracciones, filas, k: int):
+    if not matriz.cantidad_titulos:
+        return
+    celdas = current_app.config.get('RECOMMENDATIONS_BLOCK_CELLS', BLOCK_CELLS)
+    for bloque in bloques(matriz, filas, celdas):
+        columnas, puntajes = top_k(similitudes(matriz, bloque), k)
+        rows = []
+        for fila, cols, scores in zip(bloque, columnas, puntajes):
+            titulo_id = int(matriz.titulo_ids[fila])
+            for posicion, (columna, puntaje) in enumerate(zip(cols[scores > 0], scores[scores > 0])):
+                rows.append({'titulo_id': titulo_id, 'posicion': posicion,
+                             'similar_id': int(matriz.titulo_ids[columna]), 'puntaje': float(puntaje)})
+        if rows:
+            db.session.execute(db.insert(TituloSimilar), rows)
+
+def _k():
+    return current_app.config.get('RECOMMENDATIONS_TOP_K', TOP_K)
+
+def reconstruir_similares():
+    """
+    Recomputes the similar titles of every title and commits the result.
+
+    Returns
+    -------
+    int
+        The number of titles with at least one review or watchlist entry.
+    """
+    marcas = _maximos()
+    matriz = cargar_matriz(marcas)
+    db.session.query(TituloSimilar).delete()
+    _guardar(matriz, np.arange(matriz.cantidad_titulos), _k())
+    for nombre, valor in marcas.items():
+        mover_marca(nombre, valor)
+    db.session.commit()
+    return matriz.cantidad_titulos
+
+def actualizar_similares():
+    """
+    Recomputes the similar titles of the titles touched by reviews and watchlist entries
+    created since the last run, and commits the result. Runs a full rebuild the first time.
+
+    The recomputed titles are the ones that got new reviews or watchlist entries and
+    the other titles of the users who added them, whose rows are the ones the new
+    co-occurrences change. Other rows keep their scores until the next rebuild, which
+    also picks up deleted reviews, and reviews or watchlist entries whose transaction
+    committed after a run had already read a higher ID.
+
+    Returns
+    -------
+    int
+        The number of titles recomputed.
+    """
+    anteriores = {nombre: leer_marca(nombre) for nombre in (MARCA_RESENIAS, MARCA_SEGUIMIENTOS)}
+    if None in anteriores.values():
+        return reconstruir_similares()
+
+    marcas = _maximos()
+    nuevas = [(Reseña, MARCA_RESENIAS), (Seguimiento, MARCA_SEGUIMIENTOS)]
+    cambios = np.concatenate([_leer(db.select(model.usuario_id, model.titulo_id)
+                                    .where(model.id > anteriores[nombre], model.id <= marcas[nombre]), 2)
+                              for model, nombre in nuevas]).astype(np.int64)
+    if not len(cambios):
+        return 0
+
+    matriz = cargar_matriz(marcas)
+    usuarios = np.searchsorted(matriz.usuario_ids, np.unique(cambios[:, 0]))
+    filas = np.union1d(np.searchsorted(matriz.titulo_ids, np.unique(cambios[:, 1])),
+                       matriz.titulos[_rangos(matriz.por_usuario[usuarios],
+                                              matriz.por_usuario[usuarios + 1] - matriz.por_usuario[usuarios])])
+
+    titulo_ids = matriz.titulo_ids[filas].tolist()
+    for inicio in range(0, len(titulo_ids), 500):
+        db.session.execute(db.delete(TituloSimilar)
+                           .where(TituloSimilar.titulo_id.in_(titulo_ids[inicio:inicio + 500])))
+    _guardar(matriz, filas, _k())
+    for nombre, valor in marcas.items():
+        mover_marca(nombre, valor)
+    db.session.commit()
+    return len(filas)
+
+def obtener_similares(titulo_id: int, limit: int):
+    """
+    Returns up to `limit` `(Titulo, puntaje)` pairs recommended for a title, most similar first.
+    """
+    return (db.session.query(Titulo, TituloSimilar.puntaje)
+            .join(TituloSimilar, TituloSimilar.similar_id == Titulo.id)
+            .filter(TituloSimilar.titulo_id == titulo_id)
+            .order_by(TituloSimilar.posicion)
+            .limit(limit)
+            .all())
+
+@recommendations_cli.command('rebuild')
+def rebuild_command():
+    """Recompute the similar titles of every title."""
+    count = reconstruir_similares()
+    click.echo(f'Rebuilt similar titles for {count} titles.')
+
+@recommendations_cli.command('refresh')
+def refresh_command():
+    """Recompute the similar titles affected by new reviews and watchlist entries."""
+    count = actualizar_similares()
+    click.echo(f'Refreshed similar titles for {count} titles.')
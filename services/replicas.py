@@ -0,0 +1,73 @@
+import time
+
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+import sqlalchemy as sa
+
+REPLICA_BIND = 'replica'
+SAFE_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+DEFAULT_READ_YOUR_WRITES_SECONDS = 5
+
+def _is_write(clause):
+    if isinstance(clause, sa.UpdateBase):
+        return True
+    return getattr(clause, '_for_update_arg', None) is not None
+
+def _default_bind(mapper):
+    if mapper is None:
+        return True
+    table = sa.inspect(mapper).local_table
+    return table.metadata.info.get('bind_key') is None
+
+class RoutingSession(Session):
+    """
+    Session that sends the reads of read-only requests to the `replica` bind.
+
+    A request is read-only when `init_replicas` marked it so (a GET, HEAD or OPTIONS
+    request outside the read-your-own-writes window). As soon as the session flushes,
+    or a statement writes or locks rows, the rest of the request uses the primary.
+    Models with their own `__bind_key__` and code running outside a request always
+    use their usual engine.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context() and g.get('db_read_only'):
+            if self._flushing or _is_write(clause):
+                g.db_read_only = False
+                g.db_wrote = True
+            else:
+                replica = self._db.engines.get(REPLICA_BIND)
+                if replica is not None and _default_bind(mapper):
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def use_primary():
+    """
+    Sends the remaining queries of the current request to the primary.
+    """
+    g.db_read_only = False
+
+def init_replicas(app):
+    """
+    Routes read-only requests of `app` to the `replica` bind of `SQLALCHEMY_BINDS`.
+
+    After a request that changes data, the client's session remembers it for
+    `DB_READ_YOUR_WRITES_SECONDS` and its reads keep going to the primary, so it sees
+    its own writes even if the replica is lagging behind. Does nothing if no replica
+    is configured.
+    """
+    if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return
+
+    @app.before_request
+    def route_reads():
+        g.db_read_only = (request.method in SAFE_METHODS
+                          and session.get('db_primary_until', 0) <= time.time())
+
+    @app.after_request
+    def remember_writes(response):
+        wrote = request.method not in SAFE_METHODS or g.get('db_wrote', False)
+        if wrote and response.status_code < 400:
+            window = app.config.get('DB_READ_YOUR_WRITES_SECONDS', DEFAULT_READ_YOUR_WRITES_SECONDS)
+            session['db_primary_until'] = time.time() + window
+        return response
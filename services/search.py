@@ -0,0 +1,110 @@
+import re
+
+from sqlalchemy import inspect, text
+
+from models.models import DataBase, Titulo
+
+db = DataBase().db
+
+FTS_TABLE = 'TitulosFTS'
+PG_INDEX = 'ix_Titulos_titulo_fts'
+
+_SQLITE_SETUP = [
+    f'''CREATE VIRTUAL TABLE IF NOT EXISTS "{FTS_TABLE}" USING fts5(
+        titulo,
+        content='Titulos',
+        content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )''',
+    f'''CREATE TRIGGER IF NOT EXISTS "{FTS_TABLE}_ai" AFTER INSERT ON "Titulos" BEGIN
+        INSERT INTO "{FTS_TABLE}"(rowid, titulo) VALUES (new.id, new.titulo);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS "{FTS_TABLE}_ad" AFTER DELETE ON "Titulos" BEGIN
+        INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}", rowid, titulo) VALUES ('delete', old.id, old.titulo);
+    END''',
+    f'''CREATE TRIGGER IF NOT EXISTS "{FTS_TABLE}_au" AFTER UPDATE OF titulo ON "Titulos" BEGIN
+        INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}", rowid, titulo) VALUES ('delete', old.id, old.titulo);
+        INSERT INTO "{FTS_TABLE}"(rowid, titulo) VALUES (new.id, new.titulo);
+    END''',
+]
+
+_POSTGRES_SETUP = [
+    f'''CREATE INDEX IF NOT EXISTS "{PG_INDEX}" ON "Titulos"
+        USING GIN (to_tsvector('simple', titulo))''',
+]
+
+def init_search(engine):
+    """
+    Creates the full text index over `Titulo.titulo` if it does not exist yet.
+
+    On SQLite this is an external content FTS5 table kept in sync with `Titulos` by
+    triggers, and it is populated from the existing titles when it is first created.
+    On PostgreSQL it is a GIN index over `to_tsvector('simple', titulo)`. Other
+    databases fall back to a LIKE scan and need no setup.
+    """
+    dialect = engine.dialect.name
+    with engine.begin() as conn:
+        if dialect == 'sqlite':
+            exists = inspect(conn).has_table(FTS_TABLE)
+            for statement in _SQLITE_SETUP:
+                conn.execute(text(statement))
+            if not exists:
+                conn.execute(text(f'INSERT INTO "{FTS_TABLE}"("{FTS_TABLE}") VALUES (\'rebuild\')'))
+        elif dialect == 'postgresql':
+            for statement in _POSTGRES_SETUP:
+                conn.execute(text(statement))
+
+def _terms(query: str):
+    return re.findall(r'\w+', query)
+
+def buscar_titulos(query: str, tipo=None, limit: int = 20):
+    """
+    Searches titles whose name contains words starting with every word of `query`.
+
+    Parameters
+    ----------
+    query : str
+        Free text. Each word is matched as a prefix.
+    tipo : TipoTitulo, optional
+        Only return titles of this type.
+    limit : int
+        Maximum number of results.
+
+    Returns
+    -------
+    list of Titulo
+        The matching titles, best ranked first.
+    """
+    terms = _terms(query)
+    if not terms:
+        return []
+
+    dialect = db.session.get_bind(mapper=Titulo.__mapper__).dialect.name
+    params = {'limit': limit}
+    tipo_filter = ''
+    if tipo is not None:
+        tipo_filter = 'AND t.tipo = :tipo'
+        params['tipo'] = tipo.name
+
+    if dialect == 'sqlite':
+        params['match'] = ' '.join(f'"{term}"*' for term in terms)
+        statement = text(f'''
+            SELECT t.* FROM "{FTS_TABLE}" f JOIN "Titulos" t ON t.id = f.rowid
+            WHERE "{FTS_TABLE}" MATCH :match {tipo_filter}
+            ORDER BY f.rank
+            LIMIT :limit''')
+    elif dialect == 'postgresql':
+        params['match'] = ' & '.join(f'{term}:*' for term in terms)
+        statement = text(f'''
+            SELECT t.* FROM "Titulos" t
+            WHERE to_tsvector('simple', t.titulo) @@ to_tsquery('simple', :match) {tipo_filter}
+            ORDER BY ts_rank(to_tsvector('simple', t.titulo), to_tsquery('simple', :match)) DESC
+            LIMIT :limit''')
+    else:
+        query = Titulo.query.filter(*[Titulo.titulo.ilike(f'%{term}%') for term in terms])
+        if tipo is not None:
+            query = query.filter(Titulo.tipo == tipo)
+        return query.order_by(Titulo.id).limit(limit).all()
+
+    return db.session.execute(db.select(Titulo).from_statement(statement), params).scalars().all()
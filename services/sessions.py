@@ -0,0 +1,162 @@
+import time
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.models import DataBase, TokenRevocado
+
+db = DataBase().db
+
+sessions_cli = AppGroup('sessions', help='Manage revoked session tokens.')
+
+DEFAULT_SYNC_INTERVAL = 5
+
+def _utc(timestamp: float):
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+class MemoryRevocationStore:
+    """
+    Deny-list of revoked token IDs kept in process memory.
+
+    Each entry maps a `jti` to the expiry of its token as a Unix timestamp, so
+    `is_revoked` is a single dict lookup. Entries are only needed until the token
+    expires on its own; expired ones are dropped every `purge_every` revocations,
+    which keeps the index as small as the set of revoked tokens still alive.
+    """
+
+    def __init__(self, purge_every: int = 256):
+        self.purge_every = purge_every
+        self._entries = {}
+        self._lock = Lock()
+        self._since_purge = 0
+
+    def _add(self, jti: str, expires: float):
+        with self._lock:
+            self._entries[jti] = expires
+            self._since_purge += 1
+            if self._since_purge >= self.purge_every:
+                self._purge_locked(time.time())
+
+    def _purge_locked(self, now: float):
+        self._entries = {jti: expires for jti, expires in self._entries.items() if expires > now}
+        self._since_purge = 0
+
+    def revoke(self, jti: str, expires: float):
+        """
+        Revokes the token `jti`, which expires at the Unix timestamp `expires`.
+        """
+        self._add(jti, expires)
+
+    def is_revoked(self, jti: str):
+        expires = self._entries.get(jti)
+        return expires is not None and expires > time.time()
+
+    def purge(self):
+        """
+        Drops the entries of tokens that have already expired and returns how many were dropped.
+        """
+        with self._lock:
+            before = len(self._entries)
+            self._purge_locked(time.time())
+            return before - len(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+class SqlRevocationStore(MemoryRevocationStore):
+    """
+    Deny-list of revoked token IDs stored in the `TokensRevocados` table.
+
+    Checks are answered from the in-memory index of `MemoryRevocationStore`, so they
+    never touch the database. Revocations made by this process are added to the index
+    at once; revocations made by other processes are loaded at most every
+    `sync_interval` seconds, reading only the rows revoked since the last load.
+    """
+
+    def __init__(self, sync_interval: float = DEFAULT_SYNC_INTERVAL, purge_every: int = 256):
+        super().__init__(purge_every)
+        self.sync_interval = sync_interval
+        self._next_sync = 0.0
+        self._synced_until = None
+
+    def revoke(self, jti: str, expires: float):
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        db.session.merge(TokenRevocado(jti=jti, expira=_utc(expires), revocado_en=now))
+        db.session.commit()
+        self._add(jti, expires)
+
+    def is_revoked(self, jti: str):
+        if time.monotonic() >= self._next_sync:
+            self.sync()
+        return super().is_revoked(jti)
+
+    def sync(self):
+        """
+        Loads the tokens revoked since the previous sync that have not expired yet.
+        """
+        self._next_sync = time.monotonic() + self.sync_interval
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        query = db.session.query(TokenRevocado.jti, TokenRevocado.expira).filter(TokenRevocado.expira > now)
+        if self._synced_until is not None:
+            # Se superpone un intervalo para no perder revocaciones con relojes algo desfasados.
+            query = query.filter(TokenRevocado.revocado_en >= self._synced_until - timedelta(seconds=self.sync_interval))
+        try:
+            rows = query.all()
+        except SQLAlchemyError:
+            db.session.rollback()
+            current_app.logger.exception('Could not load revoked tokens')
+            return
+        for jti, expira in rows:
+            self._add(jti, expira.replace(tzinfo=timezone.utc).timestamp())
+        self._synced_until = now
+
+    def purge(self):
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        deleted = TokenRevocado.query.filter(TokenRevocado.expira <= now).delete()
+        db.session.commit()
+        super().purge()
+        return deleted
+
+REVOCATION_STORES = {'memory': MemoryRevocationStore, 'sql': SqlRevocationStore}
+
+def get_revocation_store():
+    """
+    Returns the revocation store of the current app, creating it on first use from the
+    `TOKEN_REVOCATION_STORE` ('memory' or 'sql') and `TOKEN_REVOCATION_SYNC_INTERVAL` settings.
+    """
+    store = current_app.extensions.get('revocation_store')
+    if store is None:
+        kind = current_app.config.get('TOKEN_REVOCATION_STORE', 'sql')
+        if kind not in REVOCATION_STORES:
+            raise ValueError(f'Unknown TOKEN_REVOCATION_STORE {kind!r}')
+        if kind == 'sql':
+            store = SqlRevocationStore(current_app.config.get('TOKEN_REVOCATION_SYNC_INTERVAL', DEFAULT_SYNC_INTERVAL))
+        else:
+            store = MemoryRevocationStore()
+        store = current_app.extensions.setdefault('revocation_store', store)
+    return store
+
+def is_revoked(claims: dict):
+    """
+    True if the decoded token `claims` belong to a token that was revoked.
+    """
+    jti = claims.get('jti')
+    return jti is not None and get_revocation_store().is_revoked(jti)
+
+def revoke(claims: dict):
+    """
+    Revokes the token of the decoded `claims` until it expires.
+    """
+    jti = claims.get('jti')
+    if jti is not None and 'exp' in claims:
+        get_revocation_store().revoke(jti, float(claims['exp']))
+
+@sessions_cli.command('purge')
+def purge_command():
+    """Delete revoked tokens that have already expired."""
+    deleted = get_revocation_store().purge()
+    click.echo(f'Deleted {deleted} expired revoked tokens.')
@@ -0,0 +1,179 @@
+from datetime import datetime, time as dtime, timedelta, timezone
+from threading import Lock, Thread
+import heapq
+import math
+import time
+
+from flask import current_app
+from sqlalchemy import func
+
+from models.models import DataBase, Impresion, Reseña, Seguimiento, Titulo
+
+db = DataBase().db
+
+HALF_LIFE_HOURS = 48
+REFRESH_INTERVAL = 60
+CAPACITY = 1000
+SIZE = 100
+
+PESOS = {'resenia': 3.0, 'seguimiento': 2.0, 'impresion': 0.5}
+
+# Por debajo de este puntaje (ya decaido) un titulo deja de ser tendencia.
+MIN_PUNTAJE = 0.01
+# Exponente a partir del cual se corre el punto de referencia, para que los pesos no desborden.
+MAX_EXPONENTE = 50
+# Reseñas que se leen al armar el ranking, en vidas medias: las anteriores pesan menos de 1/1000.
+HISTORIAL_VIDAS_MEDIAS = 10
+
+class TrendingRanking:
+    """
+    Ranking of the titles with the most recent activity, kept up to date incrementally.
+
+    Scores use forward decay: an event of weight `w` at time `t` adds
+    `w * exp(λ (t - referencia))` to its title, with `λ = ln 2 / half-life`. All scores
+    decay by the same factor as time passes, so stored scores never need to be
+    updated and the order only changes when new events arrive. A title's current
+    score is its stored score times `exp(-λ (now - referencia))`.
+
+    Only the `capacity` best titles are kept; the rest are dropped after each refresh,
+    so memory is bounded whatever the size of the catalog. Each refresh reads the
+    reviews, watchlist entries and impressions created since the previous one (by ID)
+    and publishes the top `size` titles, serialized, as an immutable snapshot, so
+    serving the ranking is a slice of a tuple.
+
+    Watchlist entries and impressions have no timestamp, so they count from the
+    moment a refresh first sees them; reviews use `fecha_publicacion`, which also lets
+    the first refresh rebuild the recent ranking from the reviews of the last days.
+    Rows whose transaction commits after a refresh already read a higher ID are not
+    counted; the ranking only reflects recent activity, so the error fades with it.
+    """
+
+    def __init__(self, half_life_hours: float = HALF_LIFE_HOURS, capacity: int = CAPACITY, size: int = SIZE):
+        self.half_life_hours = half_life_hours
+        self.tasa = math.log(2) / (half_life_hours * 3600)
+        self.capacity = capacity
+        self.size = size
+        self.referencia = time.time()
+        self.puntajes = {}
+        self.marcas = None
+        self.snapshot = ()
+        self.actualizado = None
+        self._lock = Lock()
+        self._refreshing = False
+
+    def _peso(self, peso: float, instante: float):
+        return peso * math.exp(self.tasa * (instante - self.referencia))
+
+    def _decaimiento(self, ahora: float):
+        return math.exp(-self.tasa * (ahora - self.referencia))
+
+    def _rebase(self, ahora: float):
+        if self.tasa * (ahora - self.referencia) > MAX_EXPONENTE:
+            factor = self._decaimiento(ahora)
+            self.puntajes = {titulo_id: puntaje * factor for titulo_id, puntaje in self.puntajes.items()}
+            self.referencia = ahora
+
+    def registrar(self, titulo_id: int, peso: float, instante: float):
+        """
+        Adds an event of weight `peso` that happened at the Unix timestamp `instante`.
+        """
+        self.puntajes[titulo_id] = self.puntajes.get(titulo_id, 0.0) + self._peso(peso, instante)
+
+    def _maximos(self):
+        return {
+            'resenia': db.session.query(func.max(Reseña.id)).scalar() or 0,
+            'seguimiento': db.session.query(func.max(Seguimiento.id)).scalar() or 0,
+            'impresion': db.session.query(func.max(Impresion.id)).scalar() or 0,
+        }
+
+    def _cargar_historial(self, marcas, ahora: float):
+        peso = PESOS['resenia']
+        desde = (datetime.fromtimestamp(ahora, timezone.utc)
+                 - timedelta(hours=HISTORIAL_VIDAS_MEDIAS * self.half_life_hours)).date()
+        rows = (db.session.query(Reseña.titulo_id, Reseña.fecha_publicacion)
+                .filter(Reseña.id <= marcas['resenia'], Reseña.fecha_publicacion >= desde))
+        for titulo_id, fecha in rows:
+            instante = datetime.combine(fecha, dtime(), timezone.utc).timestamp()
+            self.registrar(titulo_id, peso, min(instante, ahora))
+
+    def _cargar_nuevos(self, marcas, ahora: float):
+        consultas = {
+            'resenia': db.session.query(Reseña.titulo_id)
+                         .filter(Reseña.id > self.marcas['resenia'], Reseña.id <= marcas['resenia']),
+            'seguimiento': db.session.query(Seguimiento.titulo_id)
+                             .filter(Seguimiento.id > self.marcas['seguimiento'],
+                                     Seguimiento.id <= marcas['seguimiento']),
+            'impresion': db.session.query(Reseña.titulo_id)
+                           .join(Impresion, Impresion.resenia_id == Reseña.id)
+                           .filter(Impresion.id > self.marcas['impresion'], Impresion.id <= marcas['impresion']),
+        }
+        for tipo, consulta in consultas.items():
+            for (titulo_id,) in consulta:
+                self.registrar(titulo_id, PESOS[tipo], ahora)
+
+    def refresh(self):
+        """
+        Adds the activity created since the previous refresh and publishes a new snapshot.
+        """
+        ahora = time.time()
+        self._rebase(ahora)
+        marcas = self._maximos()
+        if self.marcas is None:
+            self._cargar_historial(marcas, ahora)
+        else:
+            self._cargar_nuevos(marcas, ahora)
+        self.marcas = marcas
+
+        minimo = MIN_PUNTAJE / self._decaimiento(ahora)
+        mejores = heapq.nlargest(self.capacity, ((puntaje, titulo_id) for titulo_id, puntaje in self.puntajes.items()
+                                                 if puntaje >= minimo))
+        self.puntajes = {titulo_id: puntaje for puntaje, titulo_id in mejores}
+
+        top = mejores[:self.size]
+        titulos = {titulo.id: titulo for titulo in Titulo.query.filter(Titulo.id.in_([t for _, t in top]))}
+        factor = self._decaimiento(ahora)
+        self.snapshot = tuple({'titulo': titulos[titulo_id].serialize(), 'puntaje': round(puntaje * factor, 4)}
+                              for puntaje, titulo_id in top if titulo_id in titulos)
+        self.actualizado = time.monotonic()
+
+    def refresh_in_background(self, app):
+        """
+        Starts a refresh in a daemon thread with an app context of `app`, unless one is already running.
+        """
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                with app.app_context():
+                    self.refresh()
+            except Exception:
+                app.logger.exception('Could not refresh the trending titles')
+            finally:
+                self._refreshing = False
+
+        Thread(target=run, name='trending-refresh', daemon=True).start()
+
+    def top(self, limit: int):
+        return self.snapshot[:limit]
+
+def get_trending() -> TrendingRanking:
+    """
+    Returns the trending ranking of the current app.
+
+    The first call builds it synchronously. Afterwards, a call made more than
+    `TRENDING_REFRESH_INTERVAL` seconds after the last refresh starts a refresh in the
+    background and returns the current snapshot without waiting for it.
+    """
+    ranking = current_app.extensions.get('trending')
+    if ranking is None:
+        ranking = TrendingRanking(current_app.config.get('TRENDING_HALF_LIFE_HOURS', HALF_LIFE_HOURS),
+                                  current_app.config.get('TRENDING_CAPACITY', CAPACITY),
+                                  current_app.config.get('TRENDING_SIZE', SIZE))
+        ranking.refresh()
+        ranking = current_app.extensions.setdefault('trending', ranking)
+    elif time.monotonic() - ranking.actualizado >= current_app.config.get('TRENDING_REFRESH_INTERVAL', REFRESH_INTERVAL):
+        ranking.refresh_in_background(current_app._get_current_object())
+    return ranking
@@ -0,0 +1,27 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+
+from models.models import DataBase
+
+db = DataBase().db
+
+INSERTS = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+def insertar_si_falta(model, **valores):
+    """
+    Inserts a row of `model` with `valores` unless one with the same primary key exists.
+
+    Uses `INSERT ... ON CONFLICT DO NOTHING` where the backend supports it, so two
+    transactions creating the same row at once never fail; elsewhere the insert runs
+    in a savepoint and the conflict is ignored. Either way the rest of the current
+    transaction is kept.
+    """
+    insert = INSERTS.get(db.session.get_bind(mapper=model.__mapper__).dialect.name)
+    if insert is not None:
+        db.session.execute(insert(model).values(**valores).on_conflict_do_nothing())
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.execute(db.insert(model).values(**valores))
+    except IntegrityError:
+        pass
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+
+from models.models import DataBase, MarcaAgua
+
+db = DataBase().db
+
+def leer_marca(nombre: str):
+    """
+    Returns the watermark `nombre`, or None if the job never ran.
+    """
+    marca = db.session.get(MarcaAgua, nombre)
+    return marca.valor if marca is not None else None
+
+def mover_marca(nombre: str, valor: int):
+    """
+    Sets the watermark `nombre` to `valor` in the current session's transaction, so it
+    is committed together with the results of the job.
+    """
+    db.session.merge(MarcaAgua(nombre=nombre, valor=valor,
+                               actualizada=datetime.now(timezone.utc).replace(tzinfo=None)))
+
+def limite_seguro(nombre: str, maximo: int, desde: int, lag: float):
+    """
+    Returns the highest ID a job can process now without skipping rows of transactions
+    that are still in flight.
+
+    IDs are handed out when a row is inserted, not when it is committed, so on
+    PostgreSQL a row can become visible after rows with higher IDs. Moving a watermark
+    straight to `max(id)` would skip it forever. Instead the maximum ID seen is kept as
+    the watermark `nombre`, and the job only processes up to it once it is at least
+    `lag` seconds old; then the current `maximo` is recorded for the next time. Rows
+    whose transaction takes longer than `lag` to commit can still be skipped. With
+    `lag` 0 the job processes up to `maximo` right away.
+
+    Returns
+    -------
+    int
+        The ID to process up to, never lower than `desde`.
+    """
+    if not lag:
+        return maximo
+    marca = db.session.get(MarcaAgua, nombre)
+    ahora = datetime.now(timezone.utc).replace(tzinfo=None)
+    if marca is None:
+        mover_marca(nombre, maximo)
+        return desde
+    if ahora - marca.actualizada < timedelta(seconds=lag):
+        return desde
+    visto = marca.valor
+    mover_marca(nombre, maximo)
+    return max(visto, desde)
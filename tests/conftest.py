@@ -3,6 +3,7 @@ import os
 import tempfile
 from datetime import date
 import pytest
+from sqlalchemy import event
 
 # Add the root directory to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -18,6 +19,7 @@ def app():
     app = create_app(local=True, local_path=db_path)
     app.config.update({
         'TESTING': True,
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
     })
 
     yield app
@@ -29,6 +31,30 @@ def app():
 
     os.unlink(db_path)
 
+@pytest.fixture()
+def replica_app():
+    paths = []
+    for _ in range(2):
+        db_fd, db_path = tempfile.mkstemp(suffix='.db')
+        os.close(db_fd)
+        paths.append(db_path)
+    app = create_app(local=True, local_path=paths[0], replica_path=paths[1])
+    app.config.update({
+        'TESTING': True,
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+    })
+
+    yield app
+
+    db = DataBase().db
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+    for db_path in paths:
+        os.unlink(db_path)
+
 @pytest.fixture()
 def client(app):
     return app.test_client()
@@ -113,4 +139,21 @@ def auth_prod(client):
 
 @pytest.fixture()
 def titles(client):
-    return TitleActions(client)
\ No newline at end of file
+    return TitleActions(client)
+@pytest.fixture()
+def race(app):
+    """
+    Returns a function that inserts a row of `model` from another connection right
+    before the next flush, as a concurrent request would after the handler checked for it.
+    """
+    db = DataBase().db
+
+    def insert_before_flush(model, **values):
+        def insert(session, flush_context, instances):
+            with db.engine.begin() as conn:
+                conn.execute(db.insert(model).values(**values))
+        event.listen(db.session, 'before_flush', insert, once=True)
+
+    yield insert_before_flush
+    with app.app_context():
+        db.session.remove()
@@ -1,3 +1,15 @@
+import threading
+import time
+
+import pytest
+
+from auth import Identity, IdentityCache
+from models.models import DataBase, TokenRevocado, Usuario
+from services.passwords import PasswordPool, PasswordPoolSaturated
+from services.sessions import MemoryRevocationStore, SqlRevocationStore
+
+db = DataBase().db
+
 def test_user_authentication(client, auth):
     response = client.get('/user/home')
     assert response.status_code == 401
@@ -45,4 +57,150 @@ def test_crossed_authentication(client, auth, auth_prod):
     auth_prod.login()
     response = client.get('/user/home')
     assert response.status_code == 401
-    auth_prod.logout()
\ No newline at end of file
+    auth_prod.logout()
+
+def test_identity_cache_lru_and_ttl():
+    cache = IdentityCache(maxsize=2, ttl=60)
+    cache.put(Identity(1, 'a', 'user'))
+    cache.put(Identity(2, 'b', 'user'))
+    assert cache.get('user', 'a').id == 1
+    cache.put(Identity(3, 'c', 'user'))
+    assert cache.get('user', 'b') is None
+    assert cache.get('user', 'a') is not None
+    assert cache.get('producer', 'a') is None
+
+    expired = IdentityCache(ttl=-1)
+    expired.put(Identity(1, 'a', 'user'))
+    assert expired.get('user', 'a') is None
+
+def test_identity_cache_invalidation(app, client, auth):
+    auth.init()
+    client.post('/api/user/follow', json={'seguido_id': 2})
+
+    cache = app.extensions['identity_cache']
+    assert cache.get('user', 'test').id == 1
+
+    with app.app_context():
+        usuario = Usuario.query.filter_by(nombre_usuario='test').first()
+        usuario.nombre_usuario = 'renamed'
+        db.session.commit()
+        assert cache.get('user', 'test') is None
+
+    response = client.post('/api/user/follow', json={'seguido_id': 2})
+    assert response.status_code == 404
+    assert b'Usuario no encontrado' in response.data
+
+def test_password_pool_rejects_when_saturated():
+    pool = PasswordPool(workers=1, queue_depth=1, timeout=5)
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+        return 'done'
+
+    results = []
+    worker = threading.Thread(target=lambda: results.append(pool.run(block)))
+    worker.start()
+    started.wait(5)
+    waiting = threading.Thread(target=lambda: results.append(pool.run(lambda: 'queued')))
+    waiting.start()
+
+    with pytest.raises(PasswordPoolSaturated):
+        pool.run(lambda: 'rejected')
+
+    release.set()
+    worker.join()
+    waiting.join()
+    assert sorted(results) == ['done', 'queued']
+    assert pool.run(lambda: 'ok') == 'ok'
+    pool.shutdown()
+
+def test_login_returns_503_when_password_pool_saturated(app, client, auth):
+    auth.signup()
+    auth.logout()
+
+    pool = PasswordPool(workers=1, queue_depth=0, timeout=5)
+    release = threading.Event()
+    blocker = threading.Thread(target=pool.run, args=(release.wait, 5))
+    blocker.start()
+    app.extensions['password_pool'] = pool
+    try:
+        response = auth.login()
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '1'
+
+        response = client.post('/user/login', json={'email': 'test', 'password': 'test'})
+        assert response.status_code == 503
+    finally:
+        release.set()
+        blocker.join()
+
+    response = auth.login()
+    assert response.status_code == 200
+    assert b'password_pool_rejections_total{reason="saturated"} 2' in client.get('/metrics').data
+
+def test_password_rehash_on_login(app, client, auth):
+    auth.signup()
+    with app.app_context():
+        assert Usuario.query.one().contraseña.startswith('pbkdf2:sha256:1000$')
+
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:2000'
+    response = auth.login()
+    assert response.status_code == 200
+    with app.app_context():
+        assert Usuario.query.one().contraseña.startswith('pbkdf2:sha256:2000$')
+
+    response = auth.login()
+    assert response.status_code == 200
+
+def test_logout_revokes_token(app, client, auth):
+    auth.signup()
+    auth.login()
+    with client.session_transaction() as session:
+        token = session['auth_token']
+
+    auth.logout()
+    with client.session_transaction() as session:
+        session['auth_token'] = token
+    response = client.get('/user/home')
+    assert response.status_code == 403
+    assert b'revoked' in response.data
+
+    auth.login()
+    response = client.get('/user/home')
+    assert response.status_code == 200
+
+def test_sql_revocation_store_syncs_between_processes(app):
+    with app.app_context():
+        first = SqlRevocationStore(sync_interval=0)
+        second = SqlRevocationStore(sync_interval=0)
+        assert not second.is_revoked('abc')
+
+        first.revoke('abc', time.time() + 60)
+        first.revoke('old', time.time() - 60)
+        assert second.is_revoked('abc')
+        assert not second.is_revoked('old')
+
+        assert first.purge() == 1
+        assert [row.jti for row in TokenRevocado.query.all()] == ['abc']
+
+def test_memory_revocation_store_drops_expired_tokens():
+    store = MemoryRevocationStore(purge_every=3)
+    store.revoke('expired', time.time() - 1)
+    store.revoke('alive', time.time() + 60)
+    assert not store.is_revoked('expired')
+    assert store.is_revoked('alive')
+    assert len(store) == 2
+
+    store.revoke('other', time.time() + 60)
+    assert len(store) == 2
+
+def test_sessions_purge_command(app, client, auth):
+    auth.signup()
+    auth.login()
+    auth.logout()
+
+    result = app.test_cli_runner().invoke(args=['sessions', 'purge'])
+    assert 'Deleted 0 expired revoked tokens.' in result.output
@@ -0,0 +1,76 @@
+import pytest
+from datetime import date
+from sqlalchemy import inspect
+from sqlalchemy.exc import IntegrityError
+
+from models.models import DataBase, Episodio, EstadoTitulo, Impresion, Seguimiento, TipoTitulo, Titulo
+
+db = DataBase().db
+
+@pytest.mark.parametrize(('table', 'columns'), (
+        ('Episodios', ['titulo_id', 'orden']),
+        ('Reseñas', ['titulo_id']),
+        ('Comentarios', ['resenia_id']),
+        ('Comentarios', ['usuario_id']),
+        ('Reseñas', ['usuario_id']),
+        ('Impresiones', ['usuario_id', 'resenia_id']),
+        ('Impresiones', ['resenia_id']),
+        ('Seguimientos', ['usuario_id', 'titulo_id']),
+        ('Relaciones', ['seguido']),
+        ('Usuarios', ['nombre_usuario']),
+        ('Productoras', ['nombre_usuario'])
+))
+def test_lookup_indexes(app, table, columns):
+    with app.app_context():
+        inspector = inspect(db.engine)
+        indexed = [i['column_names'] for i in inspector.get_indexes(table)]
+        indexed += [u['column_names'] for u in inspector.get_unique_constraints(table)]
+        assert columns in indexed
+
+def test_unique_constraints(app):
+    with app.app_context():
+        db.session.add(Episodio(titulo='a', duracion=1, orden=1, fecha_emision=date(2000, 1, 1), titulo_id=1))
+        db.session.add(Episodio(titulo='b', duracion=1, orden=1, fecha_emision=date(2000, 1, 1), titulo_id=1))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+        db.session.add(Impresion(usuario_id=1, resenia_id=1, valor=1))
+        db.session.add(Impresion(usuario_id=1, resenia_id=1, valor=-1))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+def test_serialize_converters():
+    titulo = Titulo(id=1, productora_id=1, fecha_inicio=date(2000, 1, 1), fecha_fin=date(2000, 1, 2),
+                    titulo='test', tipo=TipoTitulo.SERIE)
+    assert titulo.serialize() == {
+        'id': 1,
+        'productora_id': 1,
+        'fecha_inicio': '2000-01-01',
+        'fecha_fin': '2000-01-02',
+        'titulo': 'test',
+        'tipo': 'SERIE'
+    }
+    assert titulo.serialize(fields=('id', 'tipo', 'unknown')) == {'id': 1, 'tipo': 'SERIE'}
+
+    seguimiento = Seguimiento(id=1, usuario_id=1, estado=EstadoTitulo.ACTIVO, resenia_id=None,
+                              cantidad_visto=0, titulo_id=1)
+    assert seguimiento.serialize()['estado'] == 'ACTIVO'
+    assert seguimiento.serialize()['resenia_id'] is None
+
+def test_serialize_many():
+    episodios = [Episodio(id=i, titulo=f'ep{i}', duracion=30, orden=i, fecha_emision=date(2000, 1, i),
+                          titulo_id=1) for i in range(1, 4)]
+    data = Episodio.serialize_many(episodios)
+    assert data == [episodio.serialize() for episodio in episodios]
+    assert data[2]['fecha_emision'] == '2000-01-03'
+    assert Episodio.serialize_many(episodios, fields=('orden',)) == [{'orden': 1}, {'orden': 2}, {'orden': 3}]
+
+    # Nombres desconocidos u ordenes distintos no agregan entradas a la cache.
+    Episodio.compile_serializer()
+    for i in range(100):
+        assert Episodio.serialize_many(episodios[:1], fields=('orden', f'x{i}')) == [{'orden': 1}]
+    Episodio.serialize_many(episodios[:1], fields=('titulo', 'orden'))
+    Episodio.serialize_many(episodios[:1], fields=('orden', 'titulo'))
+    assert set(Episodio._serializer_subsets) == {frozenset({'orden'}), frozenset({'orden', 'titulo'})}
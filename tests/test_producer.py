@@ -1,6 +1,13 @@
+import json
 import pytest
+from datetime import date, datetime, timedelta, timezone
 from flask import session
 
+from models.models import DataBase, MarcaAgua
+from services.analytics import SAFETY_LAG, actualizar_resumenes, reconstruir_resumenes
+
+db = DataBase().db
+
 def test_prod_signup(client, auth_prod):
     response = client.post('/api/producer/', json={})
     assert response.status_code == 400
@@ -36,4 +43,144 @@ def test_prod_register_validate_existing(client):
         '/api/producer/',
         json={'email': 'a', 'username': 'test', 'password': 'test'}
     )
-    assert b'Username ya existe' in response.data
\ No newline at end of file
+    assert b'Username ya existe' in response.data
+
+def test_prod_front_login(client, auth_prod):
+    auth_prod.signup()
+    auth_prod.logout()
+
+    with client:
+        response = client.post('/producer/login', json={'email': 'test', 'password': 'test'})
+        assert response.status_code == 302
+        assert response.headers['Location'] == '/producer/home'
+        assert session['auth_token'] is not None
+
+    response = client.post('/producer/login', json={'email': 'test', 'password': 'a'})
+    assert response.status_code == 400
+    assert b'Login info incorrect' in response.data
+
+def test_catalog_import(app, client, auth_prod):
+    route = '/api/producer/catalogo/import'
+    serie = {
+        'titulo': 'serie',
+        'fecha_inicio': '2000-01-01',
+        'fecha_fin': '2001-01-01',
+        'tipo': 'SERIE',
+        'episodios': [
+            {'titulo': f'ep{i}', 'duracion': 30, 'orden': i, 'fecha_emision': '2000-01-01'} for i in range(1, 4)
+        ]
+    }
+    pelicula = {
+        'titulo': 'pelicula',
+        'fecha_inicio': '2000-01-01',
+        'fecha_fin': '2000-01-01',
+        'tipo': 'PELICULA',
+        'duracion': 90
+    }
+    lines = [
+        json.dumps(serie),
+        json.dumps({**pelicula, 'duracion': 'x'}),
+        json.dumps(pelicula),
+        json.dumps({**pelicula, 'tipo': 'LIBRO'}),
+        '{not json',
+        json.dumps({**serie, 'episodios': [serie['episodios'][0], serie['episodios'][0]]}),
+        json.dumps({**serie, 'titulo': 'serie2'})
+    ]
+
+    assert client.post(route, data='\n'.join(lines), content_type='application/x-ndjson').status_code == 401
+
+    auth_prod.init()
+    app.config['CATALOG_IMPORT_CHUNK'] = 2
+    response = client.post(route, data='\n'.join(lines), content_type='application/x-ndjson')
+    assert response.status_code == 200
+    events = [json.loads(line) for line in response.data.decode().splitlines()]
+
+    assert events[-1] == {'resumen': {'lineas': 7, 'titulos': 3, 'episodios': 7, 'errores': 4}}
+    assert sorted(e['error']['linea'] for e in events if 'error' in e) == [2, 4, 5, 6]
+    assert len([e for e in events if 'progreso' in e]) == 3
+
+    response = client.get('/api/titulo/2/episodes')
+    assert response.get_json()['episodios'][0]['duracion'] == 90
+    response = client.get('/api/titulo/3/episodes')
+    assert len(response.get_json()['episodios']) == 3
+
+def test_analytics(app, client, auth_prod, auth, titles):
+    app.config['ANALYTICS_SAFETY_LAG'] = 0
+    auth_prod.init()
+    titles.create_series()
+    for orden in (1, 2, 3):
+        client.post(f'/api/titulo/{1}/episodes', json={'titulo': 'test', 'duracion': 30, 'orden': orden,
+                                                       'fecha_emision': date(2000, 1, 1).isoformat()})
+    auth.init()
+    titles.create_review(1, {'texto': 'test', 'puntuacion': 8})
+    client.post(f'/api/user/{'test'}/watchlist', json={'titulo_id': 1, 'cantidad_visto': 1})
+
+    with app.app_context():
+        assert actualizar_resumenes() == 1
+
+    auth.init('test2', 'test2', 'test2')
+    titles.create_review(1, {'texto': 'test', 'puntuacion': 4})
+    client.post(f'/api/user/{'test2'}/watchlist', json={'titulo_id': 1})
+    client.put(f'/api/user/{'test2'}/watchlist/{1}', json={'cantidad_visto': 3})
+    with app.app_context():
+        actualizar_resumenes()
+        actualizar_resumenes()
+
+    auth_prod.login()
+    hoy = datetime.now(timezone.utc).date().isoformat()
+    response = client.get('/api/producer/analytics')
+    assert response.status_code == 200
+    data = response.get_json()
+    esperado = {'resenias': 2, 'promedio': 6.0, 'nuevos_seguimientos': 2, 'episodios_vistos': 4}
+    assert data['hasta'] == hoy
+    assert data['totales'] == esperado
+    assert data['dias'] == [{'dia': hoy, **esperado}]
+    assert data['titulos'] == [{'titulo_id': 1, **esperado}]
+
+    assert client.get('/api/producer/analytics?desde=2000-01-01').status_code == 400
+    assert client.get('/api/producer/analytics?hasta=ayer').status_code == 400
+    data = client.get('/api/producer/analytics?desde=2000-01-01&hasta=2000-01-31').get_json()
+    assert data['totales']['resenias'] == 0 and data['totales']['promedio'] is None
+    assert data['dias'] == []
+
+    auth_prod.init('prod2', 'prod2', 'prod2')
+    assert client.get('/api/producer/analytics').get_json()['totales']['resenias'] == 0
+
+    with app.app_context():
+        reconstruir_resumenes()
+    auth_prod.login()
+    assert client.get('/api/producer/analytics').get_json()['totales'] == esperado
+
+    # Bajar el progreso no resta episodios; borrar reseñas ya sumadas si las resta.
+    auth.login('test2', 'test2')
+    client.put(f'/api/user/{'test2'}/watchlist/{1}', json={'cantidad_visto': 1})
+    client.delete(f'/api/titulo/{1}/review/{2}')
+    titles.create_review(1, {'texto': 'test', 'puntuacion': 1})
+    client.delete(f'/api/titulo/{1}/review/{3}')
+    with app.app_context():
+        actualizar_resumenes()
+    auth_prod.login()
+    esperado = {'resenias': 1, 'promedio': 8.0, 'nuevos_seguimientos': 2, 'episodios_vistos': 4}
+    assert client.get('/api/producer/analytics').get_json()['totales'] == esperado
+    with app.app_context():
+        reconstruir_resumenes()
+    assert client.get('/api/producer/analytics').get_json()['totales'] == esperado
+
+def test_analytics_safety_lag(app, client, auth_prod, auth, titles):
+    auth_prod.init()
+    titles.create_series()
+    auth.init()
+    titles.create_review(1, {'texto': 'test', 'puntuacion': 8})
+
+    with app.app_context():
+        # Los IDs recien vistos pueden tener transacciones sin confirmar por debajo.
+        assert actualizar_resumenes() == 0
+        assert actualizar_resumenes() == 0
+        hace_un_rato = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=SAFETY_LAG)
+        db.session.query(MarcaAgua).filter(MarcaAgua.nombre.like('%.visto')).update({'actualizada': hace_un_rato})
+        db.session.commit()
+        assert actualizar_resumenes() == 1
+        assert actualizar_resumenes() == 0
+
+    auth_prod.login()
+    assert client.get('/api/producer/analytics').get_json()['totales']['resenias'] == 1
@@ -1,4 +1,16 @@
+import json
 from datetime import date
+import time
+
+import numpy as np
+import pytest
+
+from models.models import ContadorImpresiones, DataBase, Episodio, EstadisticaTitulo, Impresion, TituloSimilar
+from resources.pagination import encode_cursor
+from services.recommendations import actualizar_similares, bloques, construir_matriz, reconstruir_similares, similitudes
+from services.trending import TrendingRanking
+
+db = DataBase().db
 
 def test_title_create(titles, auth_prod):
     assert titles.create_series().status_code == 401
@@ -57,6 +69,24 @@ def test_episode_create(client, titles, auth_prod):
     response = client.post(f'/api/titulo/{2}/episodes', json=ep_data)
     assert response.status_code == 200
 
+def test_episode_create_race(client, titles, auth_prod, race):
+    auth_prod.init()
+    titles.create_series()
+
+    race(Episodio, titulo='otro', duracion=30, orden=5, fecha_emision=date(2000, 1, 1), titulo_id=1)
+    response = client.post(f'/api/titulo/{1}/episodes', json={**ep_data, 'orden': 5})
+    assert response.status_code == 403
+
+def test_impression_race(client, titles, auth_prod, auth, race):
+    auth_prod.init()
+    titles.create_movie()
+    auth.init()
+    titles.create_review(1, review_data)
+
+    race(Impresion, usuario_id=1, resenia_id=1, valor=-1)
+    response = client.post(f'/api/titulo/{1}/review/{1}/impresion', json={'valor': 1})
+    assert response.status_code == 400
+
 def test_episode_get(client, titles, auth_prod):
     auth_prod.init()
     ep_route = f'/api/titulo/{1}/episodes'
@@ -73,6 +103,9 @@ def test_episode_get(client, titles, auth_prod):
     data = response.get_json()
     assert len(data['episodios']) == 2
 
+    response = client.get(ep_route + '?fields=orden,titulo')
+    assert response.get_json()['episodios'] == [{'titulo': 'test', 'orden': 1}, {'titulo': 'test2', 'orden': 2}]
+
     response = client.get(ep_route + f'/{1}')
 
     assert response.status_code == 200 
@@ -124,6 +157,10 @@ def test_review_create(client, titles, auth_prod, auth):
     response = client.post(route.format(id=1), json=review_data)
     assert response.status_code == 200
 
+    for puntuacion in ('4', 4.5, True, -1, 11, None):
+        response = client.post(route.format(id=1), json={**review_data, 'puntuacion': puntuacion})
+        assert response.status_code == 400
+
 def test_review_get(client, titles, auth_prod, auth):
     auth_prod.init()
     route = f'/api/titulo/{1}/review'
@@ -371,4 +408,271 @@ def test_impression_get_fail(client, titles, auth_prod, auth):
     titles.create_movie()
     auth.init()
 
-    assert client.get(route).status_code == 404
\ No newline at end of file
+    assert client.get(route).status_code == 404
+
+def test_review_pagination(client, titles, auth_prod, auth):
+    route = f'/api/titulo/{1}/review'
+
+    auth_prod.init()
+    titles.create_series()
+    auth.init()
+    for i in range(5):
+        client.post(route, json={'texto': f'test{i}', 'puntuacion': i})
+
+    response = client.get(route + '?limit=2')
+    data = response.get_json()
+    assert [r['texto'] for r in data['reviews']] == ['test0', 'test1']
+    assert data['next'] is not None
+
+    seen = []
+    cursor = None
+    while True:
+        query = '?limit=2' + (f'&after={cursor}' if cursor else '')
+        data = client.get(route + query).get_json()
+        seen += [r['texto'] for r in data['reviews']]
+        cursor = data['next']
+        if cursor is None:
+            break
+    assert seen == [f'test{i}' for i in range(5)]
+
+    assert client.get(route + '?limit=0').status_code == 400
+    assert client.get(route + '?after=not-a-cursor').status_code == 400
+    for value in ({'id': 1}, [1], 'x', True, 1.5):
+        assert client.get(route + f'?after={encode_cursor(value)}').status_code == 400
+
+def test_pagination_max_page_size(app, client, titles, auth_prod):
+    app.config['MAX_PAGE_SIZE'] = 2
+    auth_prod.init()
+    titles.create_series()
+    client.post(f'/api/titulo/{1}/episodes', json=ep_data)
+    client.post(f'/api/titulo/{1}/episodes', json=ep_data2)
+    client.post(f'/api/titulo/{1}/episodes', json={**ep_data2, 'orden': 3})
+
+    data = client.get(f'/api/titulo/{1}/episodes?limit=100').get_json()
+    assert [e['orden'] for e in data['episodios']] == [1, 2]
+
+    data = client.get(f'/api/titulo/{1}/episodes?after={data["next"]}').get_json()
+    assert [e['orden'] for e in data['episodios']] == [3]
+    assert data['next'] is None
+
+def test_rating_aggregates(app, client, titles, auth_prod, auth):
+    route = f'/api/titulo/{1}/review'
+
+    auth_prod.init()
+    titles.create_series()
+    assert titles.read(1).get_json()['puntuacion'] == {'cantidad': 0, 'promedio': None, 'histograma': {}}
+
+    auth.init()
+    client.post(route, json=review_data)
+    client.post(route, json=review_data2)
+    client.post(route, json=review_data2)
+    assert titles.read(1).get_json()['puntuacion'] == {
+        'cantidad': 3, 'promedio': 2.33, 'histograma': {'1': 1, '3': 2}
+    }
+
+    client.delete(route + '/2')
+    assert titles.read(1).get_json()['puntuacion'] == {
+        'cantidad': 2, 'promedio': 2.0, 'histograma': {'1': 1, '3': 1}
+    }
+
+    with app.app_context():
+        db.session.query(EstadisticaTitulo).delete()
+        db.session.commit()
+    result = app.test_cli_runner().invoke(args=['ratings', 'rebuild'])
+    assert 'Rebuilt rating aggregates for 1 titles.' in result.output
+    assert titles.read(1).get_json()['puntuacion']['cantidad'] == 2
+
+def test_impression_summary(app, client, titles, auth_prod, auth):
+    route = f'/api/titulo/{1}/review/{1}/impresion'
+
+    auth_prod.init()
+    titles.create_movie()
+    auth.init()
+    titles.create_review(1, review_data)
+    client.post(route, json={'valor': 1})
+    auth.init('test2', 'test2', 'test2')
+    client.post(route, json={'valor': -1})
+    auth.init('test3', 'test3', 'test3')
+    client.post(route, json={'valor': 1})
+
+    response = client.get(route + '?modo=resumen')
+    assert response.get_json() == {'likes': 2, 'dislikes': 1, 'mi_impresion': 1}
+
+    client.delete(route)
+    auth.login('test2', 'test2')
+    response = client.get(route + '?modo=resumen')
+    assert response.get_json() == {'likes': 1, 'dislikes': 1, 'mi_impresion': -1}
+
+    auth.logout()
+    response = client.get(route + '?modo=resumen')
+    assert response.get_json()['mi_impresion'] is None
+
+    with app.app_context():
+        db.session.query(ContadorImpresiones).delete()
+        db.session.commit()
+    result = app.test_cli_runner().invoke(args=['impressions', 'rebuild'])
+    assert 'Rebuilt impression counters for 1 reviews.' in result.output
+    assert client.get(route + '?modo=resumen').get_json()['likes'] == 1
+
+def test_title_search(client, titles, auth_prod):
+    auth_prod.init()
+    titles.create_series(titulo='Breaking Bad')
+    titles.create_movie(titulo='Bad Boys')
+    titles.create_series(titulo='The Office')
+
+    data = client.get('/api/titulo/buscar?q=bad').get_json()
+    assert sorted(t['titulo'] for t in data['titulos']) == ['Bad Boys', 'Breaking Bad']
+
+    data = client.get('/api/titulo/buscar?q=break ba').get_json()
+    assert [t['titulo'] for t in data['titulos']] == ['Breaking Bad']
+
+    data = client.get('/api/titulo/buscar?q=bad&tipo=PELICULA').get_json()
+    assert [t['titulo'] for t in data['titulos']] == ['Bad Boys']
+
+    titles.delete(3)
+    assert client.get('/api/titulo/buscar?q=office').get_json()['titulos'] == []
+
+    assert client.get('/api/titulo/buscar?q=bad&limit=1').get_json()['titulos'][0]['titulo'] in ('Bad Boys', 'Breaking Bad')
+    assert client.get('/api/titulo/buscar').status_code == 400
+    assert client.get('/api/titulo/buscar?q=bad&tipo=LIBRO').status_code == 400
+
+def test_episode_bulk_create(client, titles, auth_prod):
+    route = f'/api/titulo/{1}/episodes/bulk'
+    auth_prod.init()
+    assert client.post(route, json=[ep_data]).status_code == 404
+
+    titles.create_series()
+    client.post(f'/api/titulo/{1}/episodes', json=ep_data)
+
+    batch = [
+        ep_data,
+        ep_data2,
+        {**ep_data2, 'titulo': 'repeated'},
+        {**ep_data, 'orden': 3},
+        {'titulo': 'missing'},
+        {**ep_data, 'orden': 4, 'fecha_emision': 'never'}
+    ]
+    response = client.post(route, json=batch)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['creados'] == 2
+    assert [error['item'] for error in data['errores']] == [0, 2, 4, 5]
+
+    response = client.get(f'/api/titulo/{1}/episodes')
+    assert [e['orden'] for e in response.get_json()['episodios']] == [1, 2, 3]
+
+    assert client.post(route, json={'titulo': 'x'}).status_code == 400
+
+def test_episode_bulk_create_ndjson(app, client, titles, auth_prod):
+    route = f'/api/titulo/{1}/episodes/bulk'
+    auth_prod.init()
+    titles.create_series()
+
+    lines = [json.dumps({**ep_data, 'orden': i}) for i in range(1, 4)] + ['', '{not json']
+    response = client.post(route, data='\n'.join(lines), content_type='application/x-ndjson')
+    data = response.get_json()
+    assert data['creados'] == 3
+    assert data['errores'][0]['item'] == 5
+
+    app.config['MAX_BULK_EPISODES'] = 2
+    response = client.post(route, json=[{**ep_data, 'orden': i} for i in range(10, 13)])
+    assert response.status_code == 413
+    lines = [json.dumps({**ep_data, 'orden': i}) for i in range(10, 13)]
+    response = client.post(route, data='\n'.join(lines), content_type='application/x-ndjson')
+    assert response.status_code == 413
+
+    auth_prod.init('test2', 'test2', 'test2')
+    assert client.post(route, json=[ep_data]).status_code == 401
+
+def test_similarity_matches_dense():
+    rng = np.random.default_rng(0)
+    usuarios = rng.integers(1, 30, 300)
+    titulos = rng.integers(1, 40, 300)
+    pesos = rng.random(300)
+    matriz = construir_matriz(usuarios, titulos, pesos)
+
+    denso = np.zeros((len(matriz.usuario_ids), len(matriz.titulo_ids)))
+    np.add.at(denso, (np.searchsorted(matriz.usuario_ids, usuarios), np.searchsorted(matriz.titulo_ids, titulos)), pesos)
+    normas = np.linalg.norm(denso, axis=0)
+    esperado = denso.T @ denso / np.outer(normas, normas)
+    np.fill_diagonal(esperado, 0)
+
+    filas = np.arange(matriz.cantidad_titulos)
+    assert np.allclose(similitudes(matriz, filas), esperado)
+    assert np.allclose(similitudes(matriz, filas[5:9]), esperado[5:9])
+
+    # Cada bloque se limita por sus coocurrencias, no solo por la salida densa.
+    coocurrencias = (denso > 0).T @ (denso > 0).sum(axis=1)
+    celdas = 4 * matriz.cantidad_titulos + 400
+    partes = list(bloques(matriz, filas, celdas))
+    assert np.array_equal(np.concatenate(partes), filas)
+    for parte in partes:
+        costo = len(parte) * matriz.cantidad_titulos + coocurrencias[parte].sum()
+        assert costo <= celdas or len(parte) == 1
+    assert len(list(bloques(matriz, filas, 1))) == len(filas)
+
+def test_similares(app, client, titles, auth_prod, auth):
+    auth_prod.init()
+    for i in range(4):
+        titles.create_movie(titulo=f'test{i}')
+    assert client.get(f'/api/titulo/{9}/similares').status_code == 404
+
+    resenias = {'test': [1, 2], 'test2': [1, 2, 3], 'test3': [3, 4]}
+    for usuario, titulo_ids in resenias.items():
+        auth.init(usuario, usuario, usuario)
+        for titulo_id in titulo_ids:
+            titles.create_review(titulo_id, {'texto': 'test', 'puntuacion': 10})
+
+    assert client.get(f'/api/titulo/{1}/similares').get_json() == {'similares': []}
+    with app.app_context():
+        assert reconstruir_similares() == 4
+
+    data = client.get(f'/api/titulo/{1}/similares').get_json()
+    assert [s['titulo']['id'] for s in data['similares']] == [2, 3]
+    assert data['similares'][0]['puntaje'] == pytest.approx(1.0)
+    assert [s['titulo']['id'] for s in client.get(f'/api/titulo/{4}/similares').get_json()['similares']] == [3]
+
+    titles.create_review(1, {'texto': 'test', 'puntuacion': 10})
+    with app.app_context():
+        assert actualizar_similares() == 3
+        assert actualizar_similares() == 0
+        incremental = {row.titulo_id: row.similar_id for row in TituloSimilar.query.filter_by(posicion=0)}
+        reconstruir_similares()
+        completo = {row.titulo_id: row.similar_id for row in TituloSimilar.query.filter_by(posicion=0)}
+    assert incremental == completo
+    assert 4 in [s['titulo']['id'] for s in client.get(f'/api/titulo/{1}/similares').get_json()['similares']]
+
+def test_trending(app, client, titles, auth_prod, auth):
+    auth_prod.init()
+    for i in range(3):
+        titles.create_movie(titulo=f'test{i}')
+    auth.init()
+    titles.create_review(2, {'texto': 'test', 'puntuacion': 10})
+
+    response = client.get('/api/titulo/trending')
+    assert response.status_code == 200
+    assert [t['titulo']['id'] for t in response.get_json()['titulos']] == [2]
+
+    client.post(f'/api/user/{'test'}/watchlist', json={'titulo_id': 3})
+    client.post(f'/api/titulo/{2}/review/{1}/impresion', json={'valor': 1})
+    with app.app_context():
+        ranking = app.extensions['trending']
+        ranking.refresh()
+        assert ranking.puntajes[3] == pytest.approx(2.0 / ranking._decaimiento(time.time()), rel=1e-3)
+
+    data = client.get('/api/titulo/trending?limit=5').get_json()
+    assert [t['titulo']['id'] for t in data['titulos']] == [2, 3]
+    assert data['titulos'][1]['puntaje'] == pytest.approx(2.0, rel=1e-3)
+    assert len(client.get('/api/titulo/trending?limit=1').get_json()['titulos']) == 1
+
+def test_trending_decay():
+    ranking = TrendingRanking(half_life_hours=1)
+    ahora = time.time()
+    ranking.registrar(1, 1.0, ahora - 3600)
+    ranking.registrar(2, 1.0, ahora)
+    assert ranking.puntajes[1] * ranking._decaimiento(ahora) == pytest.approx(0.5)
+    assert ranking.puntajes[2] * ranking._decaimiento(ahora) == pytest.approx(1.0)
+
+    ranking._rebase(ahora + 100 * 3600)
+    assert ranking.referencia == ahora + 100 * 3600
+    assert ranking.puntajes[2] == pytest.approx(2 ** -100)
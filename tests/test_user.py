@@ -1,8 +1,13 @@
+import json
+import time
 from datetime import date
 import pytest
 from flask import session
+from sqlalchemy import event
 
-from models.models import EstadoTitulo
+from models.models import DataBase, EntradaFeed, EstadoTitulo, Relacion, Seguimiento, TipoActividad
+
+db = DataBase().db
 
 def test_user_signup(client, auth):
     response = client.post('/api/user/', json={})
@@ -72,6 +77,39 @@ def test_login_validate(client, auth, email, password, message):
         assert message in response.data
         assert 'auth_token' not in session
 
+def test_front_login(client, auth):
+    auth.signup()
+    auth.logout()
+
+    with client:
+        response = client.post('/user/login', json={'email': 'test', 'password': 'test'})
+        assert response.status_code == 302
+        assert response.headers['Location'] == '/user/home'
+        assert session['auth_token'] is not None
+
+    response = client.get('/user/home')
+    assert response.status_code == 200
+
+def test_front_login_invalid(client, auth):
+    auth.signup()
+    auth.logout()
+
+    with client:
+        response = client.post('/user/login', json={'email': 'test', 'password': 'a'})
+        assert response.status_code == 403
+        assert b'Login info incorrect' in response.data
+        assert 'auth_token' not in session
+
+def test_front_signup(client):
+    with client:
+        response = client.post('/user/signup', json={'email': 'test', 'username': 'test', 'password': 'test'})
+        assert response.status_code == 302
+        assert session['auth_token'] is not None
+
+    response = client.post('/user/signup', json={'email': 'test', 'username': 'test', 'password': 'test'})
+    assert response.status_code == 400
+    assert b'Email ya esta registrado' in response.data
+
 def test_logout(client, auth):
     auth.signup()
 
@@ -231,4 +269,244 @@ def test_create_watch_episodes(client, auth, auth_prod, titles):
     
     auth.init()
     response = client.post(route, json=watch_data2)
-    assert response.status_code == 200
\ No newline at end of file
+    assert response.status_code == 200
+
+def test_export_activity(app, client, auth, auth_prod, titles):
+    auth_prod.init()
+    titles.create_series()
+
+    auth.init()
+    auth.init('test2', 'test2', 'test2')
+    client.post('/api/user/follow', json={'seguido_id': 1})
+    client.post(f'/api/user/{'test2'}/watchlist', json=watch_data)
+    for i in range(3):
+        titles.create_review(1, {'texto': f'test{i}', 'puntuacion': i})
+    client.post(f'/api/titulo/{1}/review/{1}/comentario', json={'texto': 'test'})
+    client.post(f'/api/titulo/{1}/review/{1}/impresion', json={'valor': 1})
+
+    assert client.get(f'/api/user/{'test'}/export').status_code == 401
+
+    app.config['EXPORT_BATCH_SIZE'] = 2
+    response = client.get(f'/api/user/{'test2'}/export')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+
+    assert lines[0] == {'tipo': 'usuario', 'data': {'id': 2, 'nombre_usuario': 'test2'}}
+    tipos = [line['tipo'] for line in lines[1:]]
+    assert tipos == ['resenia'] * 3 + ['seguimiento', 'seguido', 'comentario', 'impresion']
+    assert [line['data']['texto'] for line in lines[1:4]] == ['test0', 'test1', 'test2']
+    assert lines[4]['data']['estado'] == EstadoTitulo.SIN_COMENZAR.value
+
+def test_profile(client, auth, auth_prod, titles):
+    assert client.get(f'/api/user/{'test'}/perfil').status_code == 404
+
+    auth_prod.init()
+    titles.create_series(titulo='serie')
+    titles.create_movie(titulo='pelicula')
+
+    auth.init()
+    client.post(f'/api/user/{'test'}/watchlist', json=watch_data)
+    client.post(f'/api/user/{'test'}/watchlist', json={**watch_data, 'titulo_id': 2})
+    titles.create_review(1, {'texto': 'test', 'puntuacion': 1})
+    titles.create_review(2, {'texto': 'test2', 'puntuacion': 2})
+
+    response = client.get(f'/api/user/{'test'}/perfil')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['usuario'] == {'nombre_usuario': 'test', 'email': 'test'}
+    assert [r['titulo'] for r in data['reseñas']] == ['serie', 'pelicula']
+    assert [(s['titulo'], s['tipo'], s['estado']) for s in data['series_vistas']] == [
+        ('serie', 'SERIE', 'SIN_COMENZAR'), ('pelicula', 'PELICULA', 'SIN_COMENZAR')
+    ]
+
+    response = client.get(f'/api/user/{'test'}/perfil?seccion=info')
+    assert response.get_json() == {'usuario': {'nombre_usuario': 'test', 'email': 'test'}}
+    assert client.get(f'/api/user/{'test'}/perfil?seccion=otra').status_code == 400
+
+def test_profile_query_count(app, client, auth, auth_prod, titles):
+    auth_prod.init()
+    for i in range(3):
+        titles.create_series(titulo=f'serie{i}')
+
+    auth.init()
+    for i in range(1, 4):
+        client.post(f'/api/user/{'test'}/watchlist', json={**watch_data, 'titulo_id': i})
+        titles.create_review(i, {'texto': 'test', 'puntuacion': i})
+
+    statements = []
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = client.get(f'/api/user/{'test'}/perfil')
+    finally:
+        event.remove(engine, 'before_cursor_execute', count)
+
+    assert response.status_code == 200
+    assert len(response.get_json()['series_vistas']) == 3
+    assert len(statements) == 3
+
+def test_feed(client, auth, auth_prod, titles):
+    auth_prod.init()
+    titles.create_series()
+
+    auth.init()
+    auth.init('test2', 'test2', 'test2')
+    client.post('/api/user/follow', json={'seguido_id': 1})
+
+    auth.login()
+    client.post(f'/api/user/{'test'}/watchlist', json=watch_data)
+    titles.create_review(1, {'texto': 'test', 'puntuacion': 4})
+    client.post(f'/api/titulo/{1}/review/{1}/comentario', json={'texto': 'test'})
+    assert client.get('/api/user/feed').get_json()['actividades'] == []
+
+    auth.login('test2', 'test2')
+    response = client.get('/api/user/feed?limit=2')
+    assert response.status_code == 200
+    data = response.get_json()
+    assert [a['tipo'] for a in data['actividades']] == [TipoActividad.COMENTARIO.value, TipoActividad.RESENIA.value]
+    assert data['actividades'][1]['detalle'] == {'puntuacion': 4}
+    assert data['actividades'][1]['usuario'] == 'test'
+    assert data['actividades'][1]['titulo'] == 'test'
+
+    data = client.get(f'/api/user/feed?after={data['next']}').get_json()
+    assert [a['tipo'] for a in data['actividades']] == [TipoActividad.SEGUIMIENTO.value]
+    assert data['next'] is None
+
+    client.delete(f'/api/user/follow/{1}')
+    assert client.get('/api/user/feed').get_json()['actividades'] == []
+
+    client.post('/api/user/follow', json={'seguido_id': 1})
+    assert len(client.get('/api/user/feed').get_json()['actividades']) == 3
+
+def test_feed_fanout_on_read(app, client, auth, auth_prod, titles):
+    app.config['FEED_FANOUT_LIMIT'] = 0
+    auth_prod.init()
+    titles.create_series()
+
+    auth.init()
+    auth.init('test2', 'test2', 'test2')
+    client.post('/api/user/follow', json={'seguido_id': 1})
+
+    auth.login()
+    titles.create_review(1, {'texto': 'test', 'puntuacion': 4})
+    with app.app_context():
+        assert EntradaFeed.query.count() == 0
+
+    auth.login('test2', 'test2')
+    data = client.get('/api/user/feed').get_json()
+    assert [a['tipo'] for a in data['actividades']] == [TipoActividad.RESENIA.value]
+
+def test_feed_stale_graph(app, client, auth, auth_prod, titles):
+    auth_prod.init()
+    titles.create_series()
+    auth.init()
+    auth.init('test2', 'test2', 'test2')
+
+    # Otro worker guardo la relacion: el grafo de este proceso no la conoce.
+    with app.app_context():
+        db.session.add(Relacion(seguidor=2, seguido=1))
+        db.session.commit()
+        assert app.extensions['follow_graph'].cantidad_seguidores(1) == 0
+
+    auth.login()
+    titles.create_review(1, {'texto': 'test', 'puntuacion': 4})
+    auth.login('test2', 'test2')
+    data = client.get('/api/user/feed').get_json()
+    assert [a['tipo'] for a in data['actividades']] == [TipoActividad.RESENIA.value]
+
+def test_create_watch_race(client, auth, auth_prod, titles, race):
+    auth_prod.init()
+    titles.create_series()
+    auth.init()
+
+    race(Seguimiento, usuario_id=1, titulo_id=1, estado=EstadoTitulo.SIN_COMENZAR, cantidad_visto=0)
+    response = client.post(f'/api/user/{'test'}/watchlist', json=watch_data)
+    assert response.status_code == 403
+
+def test_update_watch(client, auth, auth_prod, titles):
+    auth_prod.init()
+    titles.create_series()
+
+    auth.init()
+    client.post(f'/api/user/{'test'}/watchlist', json=watch_data)
+    route = f'/api/user/{'test'}/watchlist/{1}'
+    response = client.put(route, json={'estado': 'no existe'})
+    assert response.status_code == 400
+
+    for cantidad in ('x', -5, True, 1.5):
+        assert client.put(route, json={'cantidad_visto': cantidad}).status_code == 400
+    assert client.put(route, json=[1]).status_code == 400
+    assert client.put(route, data='x', content_type='application/json').status_code == 400
+
+    response = client.put(route, json={'estado': EstadoTitulo.COMPLETO.value})
+    assert response.status_code == 200
+
+def test_follow_graph(app, client, auth):
+    auth.init()
+    auth.init('test2', 'test2', 'test2')
+    auth.init('test3', 'test3', 'test3')
+    client.post('/api/user/follow', json={'seguido_id': 1})
+    client.post('/api/user/follow', json={'seguido_id': 2})
+
+    auth.login('test2', 'test2')
+    client.post('/api/user/follow', json={'seguido_id': 3})
+    response = client.post('/api/user/follow', json={'seguido_id': 3})
+    assert response.status_code == 403
+
+    response = client.get(f'/api/user/{'test3'}/follows')
+    assert response.get_json() == {'seguidores': 1, 'seguidos': 2, 'te_sigue': True, 'lo_sigues': True}
+    assert client.get(f'/api/user/{'nadie'}/follows').status_code == 404
+    assert client.get('/api/user/follow/mutuals').get_json() == {'mutuos': [3]}
+    assert client.get('/api/user/follow/suggestions').get_json() == {'sugerencias': [{'id': 1, 'en_comun': 1}]}
+
+    client.delete(f'/api/user/follow/{3}')
+    assert client.get('/api/user/follow/mutuals').get_json() == {'mutuos': []}
+    assert client.delete(f'/api/user/follow/{3}').status_code == 400
+
+    with app.app_context():
+        graph = app.extensions['follow_graph']
+        assert graph.load()
+        assert graph.seguidos(3).tolist() == [1, 2]
+        assert graph.seguidores(3).tolist() == []
+        assert graph.cantidad_seguidores(2) == 1
+
+def test_follow_stale_graph(app, client, auth):
+    auth.init()
+    auth.init('test2', 'test2', 'test2')
+
+    # Otro worker dejo de seguir al usuario: el grafo de este proceso no se entero.
+    with app.app_context():
+        app.extensions['follow_graph'].add(2, 1)
+    response = client.post('/api/user/follow', json={'seguido_id': 1})
+    assert response.status_code == 200
+    assert client.get(f'/api/user/{'test'}/follows').get_json()['lo_sigues'] is True
+
+    # Otro worker borro la relacion y este grafo todavia la tiene.
+    with app.app_context():
+        db.session.execute(db.delete(Relacion))
+        db.session.commit()
+    assert client.delete(f'/api/user/follow/{1}').status_code == 400
+    assert client.get(f'/api/user/{'test'}/follows').get_json()['lo_sigues'] is False
+
+def test_follow_graph_background_refresh(app, client, auth):
+    auth.init()
+    auth.init('test2', 'test2', 'test2')
+    with app.app_context():
+        db.session.add(Relacion(seguidor=2, seguido=1))
+        db.session.commit()
+        graph = app.extensions['follow_graph']
+        graph._next_refresh = 0
+
+    # El pedido que encuentra el grafo vencido no espera la recarga.
+    assert client.get('/api/user/follow/mutuals').status_code == 200
+    for _ in range(100):
+        if graph.sigue(2, 1):
+            break
+        time.sleep(0.05)
+    assert graph.sigue(2, 1)
+    assert graph._next_refresh > 0